@@ -1,26 +1,87 @@
-from flask import Flask, render_template, request, jsonify, session, url_for
+from flask import Flask, render_template, request, jsonify, session, url_for, Response, send_from_directory
+import hashlib
 import os
+import threading
 from werkzeug.utils import secure_filename
 import re
 # Import all necessary GSheet functions from sheet_utils
 from utils.sheet_utils import (
-    get_gsheet_client, 
     upload_session_from_excel, 
     mark_present, # This is the GSheet version!
     check_and_mark_attendance_from_feedback,
-    check_email_exists_for_feedback,
-    append_feedback as gsheet_append_feedback # Use this alias to avoid conflict if you ever define a local one
+    lookup_attendance,
+    append_feedback as gsheet_append_feedback, # Use this alias to avoid conflict if you ever define a local one
+    start_write_behind,
+    start_roster_prewarm,
+    bulk_mark_attendance,
+    lookup_session,
+    write_behind_stats,
+    checkin_timestamp,
+    UNKNOWN_SESSION_TTL_SECONDS
 )
-import pandas as pd
+from utils.jobs import upload_jobs
+from utils.exports import prepare_export, EXPORT_FORMATS, EXPORT_TABS
+from utils.qr_codes import QR_FOLDER, generate_session_qr
+from utils.delta_sync import delta_sync
+from utils.lookup_token import sign_lookup, verify_lookup
+from utils.rate_limiter import SheetsBusy
+from utils.sheets_metrics import sheets_metrics, begin_request, end_request, render_gauge, render_counter
+from utils.idempotency import submission_guard, submission_key
+from utils.session_registry import session_registry
+from utils.roster_index import normalize_email
 from datetime import datetime
 
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "supersecretkey123")
 
+# Created on first use (the upload route / QR rendering), not at startup
 UPLOAD_FOLDER = "uploads"
-QR_FOLDER = "static/qr"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(QR_FOLDER, exist_ok=True)
+# ✅ Session QR images never change once rendered, so browsers/proxies may keep them for a year
+QR_MAX_AGE_SECONDS = int(os.getenv("QR_MAX_AGE_SECONDS", str(365 * 24 * 3600)))
+
+# Attendance writes are journaled locally and flushed to Sheets in the background;
+# starting here also drains anything left in the journal by a previous process.
+start_write_behind()
+# Optionally (PREWARM_ROSTERS=1) load today's and upcoming rosters before the first scan
+start_roster_prewarm()
+# Optionally (SYNC_INTERVAL_SECONDS > 0) reconcile hand edits on the sheet in the background
+delta_sync.ensure_started()
+
+# ======================================================
+# 🔹 Sheets Call Instrumentation
+# ======================================================
+@app.before_request
+def start_sheets_tally():
+    begin_request()
+
+
+@app.after_request
+def finish_sheets_tally(response):
+    # Per-request summary of Sheets calls; also visible in the browser's timing panel
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    summary = end_request(route)
+    if summary:
+        response.headers["Server-Timing"] = (
+            f'sheets;dur={summary["sheets_seconds"] * 1000:.1f};desc="{summary["calls"]} Sheets call(s)"'
+        )
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: Sheets call latency/429s/retries, per-route I/O, queue depth."""
+    queues = write_behind_stats()
+    body = sheets_metrics.render() + render_gauge(
+        "write_queue_depth", "Items waiting in a write-behind queue.",
+        [({"queue": q["queue"]}, q["depth"]) for q in queues],
+    ) + render_gauge(
+        "write_queue_dead_letters", "Items a write-behind queue gave up on (non-retryable errors).",
+        [({"queue": q["queue"]}, q["dead_letters"]) for q in queues],
+    ) + render_counter(
+        "idempotent_repeats_absorbed_total", "Repeated submissions answered without re-running them.",
+        [({"route": route}, n) for route, n in sorted(submission_guard.absorbed.items())],
+    )
+    return Response(body, mimetype="text/plain; version=0.0.4")
 
 # NOTE: The Excel-based 'append_feedback' and 'mark_present' functions 
 # have been REMOVED from this file to eliminate the PermissionError and conflict.
@@ -48,81 +109,279 @@ def upload_session():
     if not (session_name and session_date and f):
         return render_template("uploads.html", message="⚠️ Missing session name, date, or file."), 400
 
-    fname = secure_filename(f.filename)
+    # Prefix with a timestamp: the job reads the file later, so two uploads of "roster.xlsx" must not collide
+    fname = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{secure_filename(f.filename)}"
     path = os.path.join(UPLOAD_FOLDER, fname)
     
     try:
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
         f.save(path)
-        # Calls the GSheet utility function
-        session_id = upload_session_from_excel(path, session_name, session_date) 
     except Exception as e:
-        # Handle file saving or GSheet upload errors gracefully
+        # Handle file saving errors gracefully
         return render_template("uploads.html", message=f"❌ Upload failed: {str(e)}"), 500
 
-    # Build the URLs
-    attendance_url = url_for("attendance_form", session_id=session_id, _external=True)
-    feedback_url = url_for("index", session_id=session_id, _external=True)
-
-    # --- SUCCESS MESSAGE: Styled with Buttons ---
-    success_html = f"""
-    <div style="text-align: center; margin-top: 20px;">
-        <h3>✅ Session uploaded successfully!</h3>
-        <p><b>Session Name:</b> {session_name}</p>
-        <p><b>Session Date:</b> {session_date}</p>
-        <p><b>Session ID:</b> {session_id}</p>
-        <hr style="border-top: 1px solid #ccc; margin: 20px 0;">
-        
-        <p>
-            <a href="{attendance_url}" target="_blank" class="submit-btn" 
-               style="display: inline-block; margin: 5px; background: #2980B9; width: 45%;">
-                Attendance QR/Link
-            </a>
-            
-            <a href="{feedback_url}" target="_blank" class="submit-btn" 
-               style="display: inline-block; margin: 5px; background: #C0392B; width: 45%;">
-                Feedback QR/Link
-            </a>
-        </p>
-        
-        <p style="margin-top: 20px; font-size: 0.85rem;">
-            (Links opened in a new tab)
-        </p>
-    </div>
+    # Hand the Sheets upload to the background pool so this worker is free for check-ins
+    job_id = upload_jobs.submit(_run_upload_job, path, session_name, session_date, request.url_root)
+
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"status": "success", "job_id": job_id,
+                        "status_url": url_for("upload_status", job_id=job_id)}), 202
+
+    # The page polls /admin/upload_status/<job_id> and shows the links once the roster is stored
+    return render_template("uploads.html", job_id=job_id), 202
+
+
+def _run_upload_job(path, session_name, session_date, url_root, progress):
+    """Background job body: store the roster, render the session's QR codes and report the new session."""
+    try:
+        session_id = upload_session_from_excel(path, session_name, session_date, progress=progress)
+    finally:
+        # The roster is in the sheet (or the job failed); the uploaded file is not needed again
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"⚠️ Could not delete upload {path}: {e}")
+    result = {"session_id": session_id, "session_name": session_name, "session_date": session_date}
+
+    # Render the QR images now, so projecting them later is a plain static file hit
+    try:
+        with app.test_request_context(base_url=url_root):
+            result["qr"] = generate_session_qr(session_id, {
+                "attendance": url_for("attendance_form", session_id=session_id, _external=True),
+                "feedback": url_for("index", session_id=session_id, _external=True),
+            })
+    except Exception as e:
+        print(f"⚠️ QR generation failed for {session_id}: {e}")
+    return result
+
+
+@app.route("/admin/upload_status/<job_id>")
+def upload_status(job_id):
+    """Progress of a background upload: rows processed, elapsed time, and the session links when done."""
+    job = upload_jobs.status(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown upload job."}), 404
+
+    result = job.pop("result") or {}
+    job.update(result)
+    if result.get("session_id"):
+        job["attendance_url"] = url_for("attendance_form", session_id=result["session_id"], _external=True)
+        job["feedback_url"] = url_for("index", session_id=result["session_id"], _external=True)
+    for kind, files in (job.pop("qr", None) or {}).items():
+        for fmt, filename in files.items():
+            job[f"{kind}_qr_{fmt}"] = url_for("qr_image", filename=filename)
+    return jsonify({"status": "success", **job})
+
+
+@app.route("/qr/<path:filename>")
+def qr_image(filename):
+    """Pre-rendered session QR (PNG/SVG). Served from disk with ETag + long max-age; never rendered here."""
+    response = send_from_directory(QR_FOLDER, filename, max_age=QR_MAX_AGE_SECONDS)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route("/admin/reports")
+def reports():
+    """Attendance rates (per session/business/date) and feedback score distributions."""
+    # The report engine needs pandas/numpy: load them on the first report, not at startup
+    from utils.reports import report_engine
+
+    session_id = request.args.get("session_id")
+    try:
+        report = report_engine.report(session_id=session_id)
+    except SheetsBusy:
+        return jsonify({"status": "error", "message": "Google Sheets is busy; try again shortly."}), 503
+
+    if request.args.get("format") == "json" or request.accept_mimetypes.best == "application/json":
+        return jsonify({"status": "success", **report})
+    return render_template("reports.html", report=report, session_id=session_id)
+
+
+@app.route("/admin/export/<session_id>")
+def export_session(session_id):
     """
-    
-    # Render the uploads.html template, passing the styled message
-    return render_template("uploads.html", message=success_html)
+    Download one session's attendance and feedback: ?format=xlsx (both tabs, default) or
+    ?format=csv&tab=attendance|feedback. Streamed, and re-served from cache until the session changes.
+    """
+    fmt = request.args.get("format", "xlsx").lower()
+    tab = request.args.get("tab", "attendance").lower()
+    if fmt not in EXPORT_FORMATS or tab not in EXPORT_TABS:
+        return jsonify({"status": "error", "message": "Use format=xlsx|csv and tab=attendance|feedback."}), 400
+    try:
+        export = prepare_export(session_id, fmt, tab, request.if_none_match)
+    except SheetsBusy:
+        return jsonify({"status": "error", "message": "Google Sheets is busy; try again shortly."}), 503
+    if export is None:
+        return jsonify({"status": "error", "message": "Unknown session."}), 404
+
+    headers = {"Cache-Control": "private, no-cache"}
+    if export["body"] is None:
+        response = Response(status=304, headers=headers)
+    else:
+        headers["Content-Disposition"] = f'attachment; filename="{export["filename"]}"'
+        response = Response(export["body"], mimetype=export["mimetype"], headers=headers)
+    response.set_etag(export["etag"])
+    return response
+
+
+# ✅ Largest batch /admin/bulk_mark accepts in one request
+BULK_MARK_MAX_RECORDS = int(os.getenv("BULK_MARK_MAX_RECORDS", "2000"))
+
+
+@app.route("/admin/bulk_mark", methods=["POST"])
+def bulk_mark():
+    """Kiosk/scanner batches: {"records": [{"session_id", "email", "timestamp"?}, ...]}."""
+    data = request.get_json(silent=True) or {}
+    records = data.get("records")
+    if not isinstance(records, list) or not records:
+        return jsonify({"status": "error", "message": "Expected a non-empty 'records' list."}), 400
+    if len(records) > BULK_MARK_MAX_RECORDS:
+        return jsonify({"status": "error",
+                        "message": f"At most {BULK_MARK_MAX_RECORDS} records per request."}), 413
+    for i, record in enumerate(records):
+        if not isinstance(record, dict) or not all(
+                isinstance(record.get(field), (str, type(None))) for field in ("session_id", "email")):
+            return jsonify({"status": "error",
+                            "message": f"Record {i}: 'session_id' and 'email' must be strings."}), 400
+
+    # Kiosk batches are written before answering, so the operator sees the sheet updated
+    results = bulk_mark_attendance(records, write_through=True)
+    summary = {}
+    for r in results:
+        summary[r["result"]] = summary.get(r["result"], 0) + 1
+    return jsonify({"status": "success", "summary": summary, "results": results})
+
+
+@app.route("/admin/sync", methods=["GET", "POST"])
+def sync_sheets():
+    """GET: last delta sync summary. POST: run a pass now (?full=1 re-reads everything)."""
+    if request.method == "GET":
+        return jsonify({"status": "success", "last_sync": delta_sync.last_result})
+    try:
+        result = delta_sync.run(full=request.args.get("full") == "1")
+    except SheetsBusy:
+        return jsonify({"status": "error", "message": "Google Sheets is busy; try again shortly."}), 503
+    if result is None:
+        return jsonify({"status": "error", "message": "A sync is already running."}), 409
+    return jsonify({"status": "success", "sync": result})
+
+
+@app.route("/admin/queue_stats")
+def queue_stats():
+    """Depth and last flush latency of the attendance/feedback write-behind queues."""
+    return jsonify({"status": "success", "queues": write_behind_stats()})
+
+# ======================================================
+# 🔹 Session Form Pages
+# ======================================================
+# ✅ Browsers/proxies may reuse a rendered form page this long (it only changes with its session)
+FORM_PAGE_MAX_AGE_SECONDS = int(os.getenv("FORM_PAGE_MAX_AGE_SECONDS", "300"))
+# Rendered pages kept per worker, keyed by template + session details
+PAGE_CACHE_MAX_ENTRIES = 1024
+
+_page_cache = {}
+_page_cache_lock = threading.Lock()
+
+
+def _session_from_id(session_id):
+    """Fallback when the session can't be looked up: derive (name, date) from the ID itself."""
+    # Find the index of the first four-digit number (the Year)
+    year_match = re.search(r"(\d{4})", session_id)
+    if not year_match:
+        return session_id.replace("_", " "), ""
+    # The name part is everything up to the underscore *before* the year
+    year_start_index = year_match.start() - 1
+    session_name = session_id[:year_start_index].replace("_", " ").strip()
+    # The date part starts at the year and is 10 characters long (YYYY_MM_DD)
+    session_date = session_id[year_start_index + 1 : year_start_index + 11].replace("_", "-")
+    return session_name, session_date
+
+
+def _cached_page(template, **context):
+    """Render `template` once per distinct context; answer with ETag/304 and public caching."""
+    key = (template, tuple(sorted(context.items())))
+    with _page_cache_lock:
+        cached = _page_cache.get(key)
+    if cached is None:
+        html = render_template(template, **context)
+        cached = (hashlib.blake2b(html.encode(), digest_size=10).hexdigest(), html)
+        with _page_cache_lock:
+            if len(_page_cache) >= PAGE_CACHE_MAX_ENTRIES:
+                _page_cache.clear()
+            _page_cache[key] = cached
+
+    etag, html = cached
+    response = Response(status=304) if etag in request.if_none_match else Response(html, mimetype="text/html")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = FORM_PAGE_MAX_AGE_SECONDS
+    return response
+
+
+def _session_unavailable(status, title, message):
+    response = Response(render_template("session_unavailable.html", title=title, message=message),
+                        status=status, mimetype="text/html")
+    # Short-lived: the session may be uploaded (or reopened) in the meantime
+    response.cache_control.public = True
+    response.cache_control.max_age = UNKNOWN_SESSION_TTL_SECONDS
+    return response
+
+
+def _session_form(template, session_id):
+    """
+    Attendance/feedback page for one session, rendered from the session registry (name and date
+    as uploaded). Unknown IDs get 404 and closed/expired sessions 410, before any roster work.
+    """
+    if not session_id:
+        return render_template(template, session="", session_id=session_id, session_date="")
+    try:
+        meta = lookup_session(session_id)
+    except Exception as e:
+        # Sheets busy or unreachable: still serve the form, named after the ID as before
+        print(f"⚠️ Session lookup failed for {session_id} ({e}); deriving its name from the ID")
+        session_name, session_date = _session_from_id(session_id)
+        meta = {"session_name": session_name, "session_date": session_date, "status": "open"}
+
+    if meta is None:
+        return _session_unavailable(404, "Session not found",
+                                    "This link does not match any session. Please rescan the QR code.")
+    if meta["status"] != "open":
+        return _session_unavailable(410, "Session closed",
+                                    "This session is no longer accepting responses.")
+    return _cached_page(template, session=meta["session_name"], session_id=session_id,
+                        session_date=meta["session_date"])
+
+
+def _unknown_session_response():
+    return jsonify({"status": "error", "message": "Unknown session. Please rescan the QR code."}), 404
+
 
 # ======================================================
 # 🔹 Attendance Form & Submit
 # ======================================================
 @app.route("/attendance")
 def attendance_form():
-    session_id = request.args.get("session_id")
-    session_name = ""
-    session_date = ""
-    if session_id:
-        # Find the index of the first four-digit number (the Year)
-        import re
-        year_match = re.search(r"(\d{4})", session_id)
-        
-        if year_match:
-            # The name part is everything up to the underscore *before* the year
-            # Subtract 1 to include the underscore that separates the name and date
-            year_start_index = year_match.start() - 1 
-            
-            # Extract the raw name part 
-            raw_session_name = session_id[:year_start_index]
-            
-            # Replace underscores with spaces for clean display
-            session_name = raw_session_name.replace("_", " ").strip()
-        
-        else:
-            # Fallback if no year/date structure is found
-            session_name = session_id.replace("_", " ")
+    return _session_form("attendance.html", request.args.get("session_id"))
+
+# ======================================================
+# 🔹 Idempotent Submissions
+# ======================================================
+def _submit_once(route, data, session_id, email, handler):
+    """
+    Run handler() once per identical (session, email, form) submission; double taps and
+    rescans within IDEMPOTENCY_TTL_SECONDS get the stored response and session values.
+    handler returns {"status": int, "body": dict, "session": dict of cookie-session values}.
+    """
+    response, replayed = submission_guard.run(route, submission_key(route, session_id, email, data), handler)
+    if response is None:
+        return jsonify({"status": "error", "message": "Your submission is still being processed."}), 409
+    session.update(response.get("session", {}))
+    if replayed:
+        print(f"ℹ️ Absorbed repeat {route} for {email} ({session_id})")
+    return jsonify(response["body"]), response["status"]
 
-    return render_template("attendance.html", session=session_name, session_id=session_id)
-# NOTE: Removed 'session_date' from being passed to the template.
 
 @app.route("/submit_attendance", methods=["POST"])
 def submit_attendance():
@@ -132,17 +391,91 @@ def submit_attendance():
     session_id = data.get("session_id")
     if not (email and session_id):
         return jsonify({"status":"error","message":"Missing email or session_id"}), 400
+    if session_registry.is_unknown(session_id):
+        return _unknown_session_response()
 
-    # Calls the GSheet utility function from sheet_utils.py
-    # Removed name=name, as the GSheet utility function only needs session_id and email
-    ok = mark_present(session_id, email) 
-    
-    if ok:
-        session['user_name'] = name or email.split('@')[0]
-        return jsonify({"status":"success", "redirect": url_for("thankyou_attendance")})
-    else:
+    def handle():
+        # Calls the GSheet utility function from sheet_utils.py
+        # Removed name=name, as the GSheet utility function only needs session_id and email
+        ok = mark_present(session_id, email)
+
+        if ok:
+            return {"status": 200, "body": {"status": "success", "redirect": url_for("thankyou_attendance")},
+                    "session": {"user_name": name or email.split('@')[0]}}
         # Improved error message clarity
-        return jsonify({"status":"error","message":"Email not found for this session. Check for typos."}), 404
+        return {"status": 404, "body": {"status": "error", "message": "Email not found for this session. Check for typos."}}
+
+    return _submit_once("submit_attendance", data, session_id, email, handle)
+
+
+# ✅ Most check-ins one offline-queue flush may carry
+ATTENDANCE_BATCH_MAX_MARKS = int(os.getenv("ATTENDANCE_BATCH_MAX_MARKS", "100"))
+# Batch results that end a mark's life in the client queue (and are replayed to repeats)
+_BATCH_SETTLED = {"marked", "already_present", "queued"}
+
+
+def _queued_timestamp(queued_at):
+    """Check-in time for a mark queued on a device at `queued_at` (epoch ms), or None to use now."""
+    try:
+        return checkin_timestamp(datetime.fromtimestamp(float(queued_at) / 1000))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+@app.route("/submit_attendance_batch", methods=["POST"])
+def submit_attendance_batch():
+    """
+    Flush of the attendance page's offline queue: {"marks": [{"session_id", "email", "name"?,
+    "queued_at"?}, ...]}. Idempotent per (session_id, email): a mark already settled (or still
+    being written by another request) is answered without being marked again.
+    Returns one {"session_id", "email", "result"} per mark, in order.
+    """
+    data = request.get_json(silent=True) or {}
+    marks = data.get("marks")
+    if not isinstance(marks, list) or not marks or not all(isinstance(m, dict) for m in marks):
+        return jsonify({"status": "error", "message": "Expected a non-empty 'marks' list."}), 400
+    if len(marks) > ATTENDANCE_BATCH_MAX_MARKS:
+        return jsonify({"status": "error",
+                        "message": f"At most {ATTENDANCE_BATCH_MAX_MARKS} marks per request."}), 413
+
+    ids = [(str(m.get("session_id") or "").strip(), normalize_email(str(m.get("email") or ""))) for m in marks]
+    keys = [submission_key("submit_attendance_batch", session_id, email, {}) for session_id, email in ids]
+
+    def handle(indices):
+        results, records = {}, []
+        for i in indices:
+            session_id, email = ids[i]
+            if session_registry.is_unknown(session_id):
+                # Known-bogus session: answered without a roster lookup
+                results[i] = {"session_id": session_id, "email": email, "result": "unknown_session"}
+            else:
+                records.append((i, {"session_id": session_id, "email": email,
+                                    "timestamp": _queued_timestamp(marks[i].get("queued_at"))}))
+        if records:
+            results.update(zip([i for i, _ in records], bulk_mark_attendance([r for _, r in records])))
+        return [{"status": 200 if results[i]["result"] in _BATCH_SETTLED else 422, "body": results[i]}
+                for i in indices]
+
+    results = []
+    for (session_id, email), mark, (response, _) in zip(ids, marks, submission_guard.run_batch(
+            "submit_attendance_batch", keys, handle)):
+        if response is None:
+            results.append({"session_id": session_id, "email": email, "result": "pending"})
+            continue
+        results.append(response["body"])
+        if response["status"] == 200 and mark.get("name"):
+            # The most recent mark is the person holding this device: greet them on the thank-you page
+            session["user_name"] = mark["name"]
+    return jsonify({"status": "success", "results": results, "redirect": url_for("thankyou_attendance")})
+
+
+@app.route("/sw.js")
+def service_worker():
+    """Offline service worker for the form pages; served from the root so its scope covers them."""
+    response = send_from_directory(app.static_folder, "sw.js", mimetype="application/javascript", max_age=0)
+    response.headers["Service-Worker-Allowed"] = "/"
+    response.cache_control.no_cache = True
+    return response
 # app.py
 
 # ... (after submit_attendance route)
@@ -156,15 +489,21 @@ def validate_email():
     
     if not (email and session_id):
         return jsonify({"status": "error", "message": "Missing email or session ID."}), 400
+    if session_registry.is_unknown(session_id):
+        return _unknown_session_response()
 
-    # Import the necessary utility function
-    from utils.sheet_utils import check_email_exists_for_feedback
-    
-    # Check email status using a new utility function (defined in step B)
-    exists = check_email_exists_for_feedback(session_id, email)
+    # Resolve the roster row once; the signed token lets /submit_feedback reuse it
+    # instead of reading the roster again.
+    try:
+        entry = lookup_attendance(session_id, email)
+    except SheetsBusy:
+        # Degraded mode: let the participant continue; the roster is checked when the
+        # feedback's check-in is flushed.
+        return jsonify({"status": "success", "message": "Email accepted."})
     
-    if exists:
-        return jsonify({"status": "success", "message": "Email found."})
+    if entry:
+        token = sign_lookup(app.secret_key, session_id, email, entry)
+        return jsonify({"status": "success", "message": "Email found.", "lookup_token": token})
     else:
         return jsonify({"status": "error", "message": "Email not found on the session's registration list. Please check for typos."}), 404
 
@@ -181,34 +520,7 @@ def thankyou_attendance():
 # ======================================================
 @app.route("/")
 def index():
-    session_id = request.args.get("session_id")
-    session_name = ""
-    session_date = ""
-    if session_id:
-        # Find the index of the first four-digit number (the Year)
-        import re
-        year_match = re.search(r"(\d{4})", session_id)
-        
-        if year_match:
-            # The name part is everything up to the underscore *before* the year
-            year_start_index = year_match.start() - 1 
-            
-            # Extract the raw name part
-            raw_session_name = session_id[:year_start_index]
-            
-            # Replace underscores with spaces for clean display
-            session_name = raw_session_name.replace("_", " ").strip()
-            
-            # Optional: Extract date for the hidden field
-            # The date part starts at the year and is 10 characters long (YYYY_MM_DD)
-            date_part_raw = session_id[year_start_index + 1 : year_start_index + 11]
-            session_date = date_part_raw.replace("_", "-")
-        
-        else:
-            # Fallback
-            session_name = session_id.replace("_", " ")
-
-    return render_template("index.html", session=session_name, session_id=session_id, session_date=session_date)
+    return _session_form("index.html", request.args.get("session_id"))
 
 @app.route("/submit_feedback", methods=["POST"])
 def submit_feedback_route():
@@ -227,10 +539,23 @@ def submit_feedback_route():
 
     if not session_id or not email:
         return jsonify({"status": "error", "message": "Missing session_id or email"}), 400
+    if session_registry.is_unknown(session_id):
+        return _unknown_session_response()
 
+    # A repeated identical submission replays the first response, so the feedback row is
+    # appended (and attendance checked) only once
+    return _submit_once("submit_feedback", data, session_id, email,
+                        lambda: _handle_feedback(data, session_id, session_name, session_date, name, email, phone))
+
+
+def _handle_feedback(data, session_id, session_name, session_date, name, email, phone):
     # --- STEP 1: Check/Mark attendance via utility function (Corrected call) ---
+    # A valid token from /validate_email carries the roster entry, so no second lookup is
+    # needed; a missing, expired or mismatched token falls back to a fresh lookup. The token's
+    # row is never written as-is: storage re-resolves it from the roster index.
+    entry = verify_lookup(app.secret_key, data.get("lookup_token"), session_id, email)
     attendance_info = check_and_mark_attendance_from_feedback(
-        session_id, email, name, phone, session_name, session_date
+        session_id, email, name, phone, session_name, session_date, entry=entry
     )
     attendance_marked = attendance_info['marked_now']
 
@@ -246,10 +571,8 @@ def submit_feedback_route():
     gsheet_append_feedback(session_id, session_name, session_date, feedback_data)
 
     # --- STEP 3: Thank-you redirect ---
-    session['user_name'] = name or email.split('@')[0]
-    session['attendance_marked'] = attendance_marked
-
-    return jsonify({"status": "success", "redirect": url_for("thankyou")})
+    return {"status": 200, "body": {"status": "success", "redirect": url_for("thankyou")},
+            "session": {"user_name": name or email.split('@')[0], "attendance_marked": attendance_marked}}
 @app.route("/thankyou")
 def thankyou():
     user_name = session.get('user_name', 'Participant')
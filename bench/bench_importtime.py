@@ -0,0 +1,99 @@
+"""
+Cold-start import budget for the web app. Imports `app` in fresh interpreters under
+`python -X importtime`, reports the median total and the heaviest imports, and fails
+(exit 1) if the median exceeds --budget-ms or a module a check-in worker must not load
+(pandas, numpy, ...) shows up.
+
+    python -m bench.bench_importtime --runs 5 --budget-ms 400
+
+Heavy dependencies are imported on first use instead: gspread/google-auth on the first
+Sheets call, pandas/numpy on the first roster upload or report, openpyxl on the first
+XLSX export, qrcode when an upload renders its QR codes.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Never needed to serve a QR scan or a form page
+DEFAULT_FORBIDDEN = ["pandas", "numpy", "openpyxl", "qrcode"]
+
+
+def _run_once(module, env):
+    """Import `module` in a new interpreter; return [(self_us, cumulative_us, depth, name)]."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=400.0)
+    parser.add_argument("--top", type=int, default=10, help="heaviest imports to list")
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN,
+                        help="top-level packages that must not be imported at startup")
+    parser.add_argument("--storage", choices=["sheets", "sqlite"], default="sheets")
+    args = parser.parse_args()
+
+    # Keep the app's local databases (journal, jobs, caches) out of the repo
+    tmp = tempfile.mkdtemp(prefix="bench-importtime-")
+    env = dict(os.environ, STORAGE_BACKEND=args.storage,
+               WRITE_JOURNAL_PATH=os.path.join(tmp, "write_journal.db"),
+               JOBS_DB_PATH=os.path.join(tmp, "upload_jobs.db"),
+               SQLITE_DB_PATH=os.path.join(tmp, "attendance.db"),
+               ROSTER_CACHE_PATH=os.path.join(tmp, "roster_cache.db"),
+               SYNC_STATE_PATH=os.path.join(tmp, "sync_state.db"))
+
+    totals, entries = [], []
+    for _ in range(args.runs):
+        entries = _run_once(args.module, env)
+        totals.append(next(c for _, c, depth, name in entries if name == args.module and depth == 0) / 1000)
+
+    median = statistics.median(totals)
+    print(f"import {args.module}: median {median:.1f} ms over {args.runs} run(s) "
+          f"(min {min(totals):.1f}, max {max(totals):.1f}); budget {args.budget_ms:.0f} ms")
+
+    # importtime lists children before their parent: the module's own imports are the
+    # entries between the previous top-level (depth 0) line and the module's line
+    end = next(i for i, e in enumerate(entries) if e[3] == args.module and e[2] == 0)
+    start = end
+    while start > 0 and entries[start - 1][2] > 0:
+        start -= 1
+    imported = entries[start:end]
+
+    print("\nHeaviest direct imports (cumulative, last run):")
+    for _, cumulative, _, name in sorted((e for e in imported if e[2] == 1), key=lambda e: -e[1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    loaded = {name.split(".")[0] for _, _, _, name in imported}
+    forbidden = sorted(loaded & set(args.forbid))
+
+    failed = False
+    if forbidden:
+        print(f"\n❌ Imported at startup but should load lazily: {', '.join(forbidden)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"\n❌ Over budget by {median - args.budget_ms:.1f} ms")
+        failed = True
+    if not failed:
+        print("\n✅ Within budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Compare gunicorn serving modes (sync / gthread / gevent) on the check-in endpoints against the
+local Sheets stub. Each mode gets a fresh gunicorn on a free port; the load is a burst of
+concurrent /validate_email and /submit_attendance calls.
+
+    python -m bench.bench_serving --requests 400 --concurrency 100 --latency-ms 150
+
+--uncached sets ROSTER_TTL_SECONDS=0 so every lookup goes to the (stubbed) Sheets API,
+which is the network-bound path the async modes are meant to help. Requests are spread
+over --sessions rosters so loads for different sessions can overlap.
+--roster-cache sqlite|redis shares the roster index between the gunicorn workers.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fake_sheets import bench_emails
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _post(url, payload):
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                 headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            resp.read()
+            ok = resp.status == 200
+    except urllib.error.HTTPError as e:
+        ok = e.code == 200
+    return time.perf_counter() - started, ok
+
+
+def _wait_ready(base, proc, deadline=30):
+    end = time.time() + deadline
+    while time.time() < end:
+        if proc.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            urllib.request.urlopen(base + "/admin/queue_stats", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not become ready")
+
+
+def run_mode(mode, args):
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    tmp = tempfile.mkdtemp(prefix=f"bench-{mode}-")
+    env = dict(os.environ,
+               SERVE_MODE=mode, PORT=str(port), WEB_CONCURRENCY=str(args.workers),
+               SHEETS_STUB="1", SHEETS_STUB_LATENCY_MS=str(args.latency_ms),
+               SHEETS_STUB_SESSIONS=str(args.sessions), SHEETS_STUB_PER_SESSION=str(args.per_session),
+               WRITE_JOURNAL_PATH=os.path.join(tmp, "journal.db"),
+               JOBS_DB_PATH=os.path.join(tmp, "jobs.db"),
+               ROSTER_CACHE=args.roster_cache, ROSTER_CACHE_PATH=os.path.join(tmp, "roster_cache.db"))
+    if args.uncached:
+        env["ROSTER_TTL_SECONDS"] = "0"
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:app"], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(base, proc)
+        calls = []
+        for i in range(args.requests):
+            session = i % args.sessions
+            emails = bench_emails(session, args.per_session)
+            payload = {"session_id": f"BENCH_{session}", "email": emails[(i // args.sessions) % len(emails)]}
+            path = "/validate_email" if i % 2 else "/submit_attendance"
+            calls.append((base + path, payload))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda c: _post(*c), calls))
+        wall = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    latencies = sorted(r[0] for r in results)
+    return {
+        "mode": mode,
+        "requests": len(results),
+        "errors": sum(1 for r in results if not r[1]),
+        "throughput_rps": round(len(results) / wall, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="sync,gthread,gevent")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--per-session", type=int, default=200)
+    parser.add_argument("--uncached", action="store_true")
+    parser.add_argument("--roster-cache", default="memory", choices=["memory", "sqlite", "redis"])
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        if mode == "gevent" and importlib.util.find_spec("gevent") is None:
+            print("gevent    skipped (not installed)")
+            continue
+        r = run_mode(mode, args)
+        print(f"{r['mode']:<9} {r['throughput_rps']:>8} req/s  p50 {r['p50_ms']:>8} ms  "
+              f"p95 {r['p95_ms']:>8} ms  errors {r['errors']}/{r['requests']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+In-memory stand-in for the parts of the gspread API the app uses, so the serving path can be
+exercised without Google. Every call sleeps for `latency_ms` to mimic a Sheets round-trip,
+is counted per operation, and can be rejected with a 429 APIError once the per-minute
+read/write quotas are used up (like the real Sheets API).
+"""
+import collections
+import os
+import threading
+import time
+
+import gspread
+import requests
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol
+
+from utils.storage import ATTENDANCE_HEADER
+
+READ_OPS = {"open_by_key", "worksheet", "row_values", "get_all_values", "get", "batch_get"}
+
+
+def quota_error(op):
+    """Build the APIError gspread raises when Google answers 429 RESOURCE_EXHAUSTED."""
+    response = requests.Response()
+    response.status_code = 429
+    response._content = (
+        b'{"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", '
+        b'"message": "Quota exceeded for quota metric \'' + op.encode() + b'\' (stub)"}}'
+    )
+    return gspread.exceptions.APIError(response)
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, rows=None):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.rows = [list(r) for r in (rows or [])]
+        self._lock = threading.Lock()
+
+    def _call(self, op):
+        self.spreadsheet.record(op)
+
+    def row_values(self, row):
+        self._call("row_values")
+        with self._lock:
+            return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def get_all_values(self):
+        self._call("get_all_values")
+        with self._lock:
+            return [list(r) for r in self.rows]
+
+    def get(self, range_name):
+        self._call("get")
+        grid = a1_range_to_grid_range(range_name.split("!")[-1])
+        with self._lock:
+            rows = self.rows[grid.get("startRowIndex", 0):grid.get("endRowIndex", len(self.rows))]
+            return [r[grid.get("startColumnIndex", 0):grid.get("endColumnIndex")] for r in rows]
+
+    def batch_get(self, ranges, **kwargs):
+        self._call("batch_get")
+        values = []
+        for range_name in ranges:
+            grid = a1_range_to_grid_range(range_name.split("!")[-1])
+            with self._lock:
+                rows = self.rows[grid.get("startRowIndex", 0):grid.get("endRowIndex", len(self.rows))]
+                values.append([r[grid.get("startColumnIndex", 0):grid.get("endColumnIndex")] for r in rows])
+        return values
+
+    def append_row(self, row, **kwargs):
+        return self.append_rows([row], **kwargs)
+
+    def append_rows(self, rows, **kwargs):
+        self._call("append_rows")
+        with self._lock:
+            first = len(self.rows) + 1
+            self.rows.extend([list(r) for r in rows])
+            last = len(self.rows)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{first}:Z{last}", "updatedRows": len(rows)}}
+
+    def update_cell(self, row, col, value):
+        self._call("update_cell")
+        with self._lock:
+            self._set(row, col, value)
+
+    def batch_update(self, data, **kwargs):
+        self._call("batch_update")
+        with self._lock:
+            for item in data:
+                row, col = a1_to_rowcol(item["range"].split("!")[-1].split(":")[0])
+                self._set(row, col, item["values"][0][0])
+
+    def _set(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        cells.extend([""] * (col - len(cells)))
+        cells[col - 1] = value
+
+
+class FakeSpreadsheet:
+    """
+    latency_ms: sleep per API call.
+    read_quota / write_quota: calls allowed per rolling 60 s window (None = unlimited);
+    calls beyond it raise a 429 APIError and are counted in `rejected`.
+    """
+
+    def __init__(self, latency_ms=0, read_quota=None, write_quota=None):
+        self.latency = latency_ms / 1000.0
+        self.quotas = {"read": read_quota, "write": write_quota}
+        self.worksheets = {}
+        self.calls = collections.Counter()     # op -> accepted calls
+        self.rejected = collections.Counter()  # op -> 429s
+        self._windows = {"read": collections.deque(), "write": collections.deque()}
+        self._lock = threading.Lock()
+
+    def record(self, op):
+        kind = "read" if op in READ_OPS else "write"
+        with self._lock:
+            quota = self.quotas[kind]
+            if quota is not None:
+                window = self._windows[kind]
+                now = time.monotonic()
+                while window and now - window[0] >= 60:
+                    window.popleft()
+                if len(window) >= quota:
+                    self.rejected[op] += 1
+                    raise quota_error(op)
+                window.append(now)
+            self.calls[op] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.rejected.clear()
+
+    def worksheet(self, title):
+        self.record("worksheet")
+        if title not in self.worksheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title, rows=100, cols=20):
+        self.record("add_worksheet")
+        self.worksheets[title] = FakeWorksheet(self, title)
+        return self.worksheets[title]
+
+
+class FakeClient:
+    def __init__(self, latency_ms=0, read_quota=None, write_quota=None):
+        self.spreadsheet = FakeSpreadsheet(latency_ms, read_quota, write_quota)
+
+    def open_by_key(self, key):
+        self.spreadsheet.record("open_by_key")
+        return self.spreadsheet
+
+
+def bench_emails(session_index, n):
+    return [f"user{i}.s{session_index}@example.com" for i in range(n)]
+
+
+def seed_roster(client, sessions=10, per_session=200):
+    """Fill Master_Attendance with `sessions` rosters named BENCH_0.. of `per_session` people each."""
+    rows = [ATTENDANCE_HEADER]
+    for s in range(sessions):
+        for i, email in enumerate(bench_emails(s, per_session)):
+            rows.append([f"BENCH_{s}", f"Bench {s}", "2030-01-01", f"E{i}", f"User {i}",
+                         email, "Bench", "", ""])
+    client.spreadsheet.worksheets["Master_Attendance"] = FakeWorksheet(
+        client.spreadsheet, "Master_Attendance", rows
+    )
+    return client
+
+
+def install_stub():
+    """Swap the app's Google client for a seeded stub (configured by SHEETS_STUB_* env vars)."""
+    from utils.sheet_utils import install_gsheet_client
+
+    read_quota = os.getenv("SHEETS_STUB_READ_QUOTA")
+    write_quota = os.getenv("SHEETS_STUB_WRITE_QUOTA")
+    client = FakeClient(latency_ms=float(os.getenv("SHEETS_STUB_LATENCY_MS", "150")),
+                        read_quota=int(read_quota) if read_quota else None,
+                        write_quota=int(write_quota) if write_quota else None)
+    seed_roster(client,
+                sessions=int(os.getenv("SHEETS_STUB_SESSIONS", "10")),
+                per_session=int(os.getenv("SHEETS_STUB_PER_SESSION", "200")))
+    install_gsheet_client(client)
+    return client
@@ -0,0 +1,160 @@
+"""
+Replay a check-in rush against the app in-process, with Google replaced by the Sheets stub.
+
+Scenario (times compressed by --speedup):
+  1. Morning burst: --attendees people hit /submit_attendance at random moments within
+     --window seconds; --double-tap of them submit twice and --typos use an unknown email.
+  2. End of session: --feedback of them call /validate_email then /submit_feedback.
+
+After the burst the write-behind queues are drained so their Sheets calls are counted too.
+Reports p50/p95/p99 latency per endpoint, throughput, and Sheets calls per request:
+
+    python -m bench.loadtest --attendees 200 --window 120 --speedup 20 --latency-ms 150
+    python -m bench.loadtest --read-quota 60 --write-quota 60 --json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def build_schedule(args, emails, rng):
+    """Return [(start_offset_seconds, [(path, payload), ...]), ...] for every simulated person."""
+    window = args.window / args.speedup
+    schedule = []
+    for i, email in enumerate(emails[:args.attendees]):
+        if rng.random() < args.typos:
+            email = "typo." + email
+        payload = {"session_id": "BENCH_0", "email": email, "name": f"User {i}"}
+        calls = [("/submit_attendance", payload)]
+        if rng.random() < args.double_tap:
+            calls.append(("/submit_attendance", payload))
+        schedule.append((rng.uniform(0, window), calls))
+
+    feedback_start = window
+    for i, email in enumerate(emails[:int(args.attendees * args.feedback)]):
+        answers = {f"q{q}": "Very Good" for q in range(1, 9)}
+        answers.update(q9="Takeaway", q10="Comment")
+        feedback = dict(answers, session_id="BENCH_0", session_name="Bench 0",
+                        session_date="2030-01-01", email=email, name=f"User {i}", phone="9999999999")
+        schedule.append((feedback_start + rng.uniform(0, window / 2), [
+            ("/validate_email", {"session_id": "BENCH_0", "email": email}),
+            ("/submit_feedback", feedback),
+        ]))
+    return sorted(schedule, key=lambda item: item[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attendees", type=int, default=200)
+    parser.add_argument("--window", type=float, default=120, help="burst length in real-world seconds")
+    parser.add_argument("--speedup", type=float, default=20)
+    parser.add_argument("--double-tap", type=float, default=0.1)
+    parser.add_argument("--typos", type=float, default=0.03)
+    parser.add_argument("--feedback", type=float, default=0.8)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--read-quota", type=int, default=None, help="stub reads per minute")
+    parser.add_argument("--write-quota", type=int, default=None, help="stub writes per minute")
+    parser.add_argument("--sessions", type=int, default=50, help="rosters in Master_Attendance")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    # Keep journals and job state out of the working tree
+    tmp = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ.setdefault("WRITE_JOURNAL_PATH", os.path.join(tmp, "journal.db"))
+    os.environ.setdefault("JOBS_DB_PATH", os.path.join(tmp, "jobs.db"))
+    os.environ.setdefault("SQLITE_DB_PATH", os.path.join(tmp, "attendance.db"))
+    os.environ.setdefault("ROSTER_CACHE_PATH", os.path.join(tmp, "roster_cache.db"))
+
+    from bench.fake_sheets import FakeClient, bench_emails, seed_roster
+    from utils.sheet_utils import install_gsheet_client, mark_queue, feedback_queue, sheets_export_queue
+    from app import app
+
+    client = FakeClient(args.latency_ms, args.read_quota, args.write_quota)
+    seed_roster(client, sessions=args.sessions, per_session=max(args.attendees, 1))
+    install_gsheet_client(client)
+    stub = client.spreadsheet
+
+    rng = random.Random(args.seed)
+    schedule = build_schedule(args, bench_emails(0, args.attendees), rng)
+    results = defaultdict(list)   # path -> [(seconds, status_code)]
+    results_lock = threading.Lock()
+    local = threading.local()
+
+    def person(start_offset, calls, t0):
+        delay = t0 + start_offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        http = getattr(local, "client", None)
+        if http is None:
+            http = local.client = app.test_client()
+        for path, payload in calls:
+            started = time.perf_counter()
+            status = http.post(path, json=payload).status_code
+            with results_lock:
+                results[path].append((time.perf_counter() - started, status))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for start_offset, calls in schedule:
+            pool.submit(person, start_offset, calls, t0)
+    wall = time.perf_counter() - t0
+
+    # Drain write-behind queues so their Sheets traffic is part of the bill
+    for queue in (mark_queue, feedback_queue, sheets_export_queue):
+        while queue.pending() and not queue.flush():
+            time.sleep(1)
+
+    total_requests = sum(len(v) for v in results.values())
+    report = {
+        "requests": total_requests,
+        "wall_seconds": round(wall, 2),
+        "throughput_rps": round(total_requests / wall, 1) if wall else 0.0,
+        "sheets_calls": dict(stub.calls),
+        "sheets_429s": dict(stub.rejected),
+        "sheets_calls_per_request": round(sum(stub.calls.values()) / max(total_requests, 1), 3),
+        "endpoints": {},
+    }
+    for path, samples in sorted(results.items()):
+        latencies = sorted(s for s, _ in samples)
+        report["endpoints"][path] = {
+            "count": len(samples),
+            "server_errors": sum(1 for _, status in samples if status >= 500),
+            "p50_ms": round(statistics.median(latencies) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        }
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{total_requests} requests in {report['wall_seconds']}s "
+          f"({report['throughput_rps']} req/s), stub latency {args.latency_ms} ms")
+    print(f"{'endpoint':<22}{'count':>7}{'5xx':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for path, r in report["endpoints"].items():
+        print(f"{path:<22}{r['count']:>7}{r['server_errors']:>6}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+    print(f"Sheets calls/request: {report['sheets_calls_per_request']}  by op: {report['sheets_calls']}")
+    if stub.rejected:
+        print(f"Sheets 429s: {report['sheets_429s']}")
+
+
+if __name__ == "__main__":
+    main()
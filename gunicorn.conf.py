@@ -0,0 +1,45 @@
+import importlib.util
+import os
+
+from utils.serving import ROSTER_CACHE, WEB_CONCURRENCY
+
+# ======================================================
+# 🔹 Serving modes (picked up automatically by `gunicorn app:app`)
+# ======================================================
+# SERVE_MODE=sync    -> one request per worker at a time (old behaviour)
+# SERVE_MODE=gthread -> each worker serves GUNICORN_THREADS requests concurrently (default)
+# SERVE_MODE=gevent  -> cooperative workers: gspread's HTTP calls (requests/urllib3) are
+#                       monkey-patched to yield while waiting on Google, so hundreds of
+#                       check-ins can be in flight per process. Needs `gevent` installed
+#                       (pip install gevent; not in requirements.txt).
+#                       Roster parsing in admin uploads is CPU-bound and briefly holds the
+#                       worker in this mode, so keep uploads on a separate worker if possible.
+SERVE_MODE = os.getenv("SERVE_MODE", "gthread")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# Same count the Sheets rate limiter divides the quota by (1 unless the roster cache is shared)
+workers = WEB_CONCURRENCY
+if workers > 1 and ROSTER_CACHE == "memory":
+    print(f"⚠️ {workers} workers with ROSTER_CACHE=memory: each worker keeps its own roster claims and "
+          "idempotency keys, so a double tap on two workers can be marked twice. Use sqlite or redis.")
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+
+if SERVE_MODE == "gevent":
+    if importlib.util.find_spec("gevent") is None:
+        raise RuntimeError("SERVE_MODE=gevent needs the `gevent` package (pip install gevent), "
+                           "or use SERVE_MODE=gthread")
+    worker_class = "gevent"
+    worker_connections = int(os.getenv("WORKER_CONNECTIONS", "500"))
+elif SERVE_MODE == "gthread":
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", "32"))
+else:
+    worker_class = "sync"
+
+
+def post_worker_init(worker):
+    # Benchmarks only: serve against the in-memory Sheets stub instead of Google.
+    # Runs after gevent has patched the worker, so the stub's sleeps yield like real I/O.
+    if os.getenv("SHEETS_STUB") == "1":
+        from bench.fake_sheets import install_stub
+        install_stub()
@@ -0,0 +1,58 @@
+// Offline support for the session form pages (served as /sw.js so its scope is the whole site).
+// - Form assets (stylesheet, logos) are precached and served cache-first.
+// - Form pages (/attendance, /) are fetched network-first and fall back to the last copy,
+//   so a page opened once still loads when the venue Wi-Fi drops.
+// Check-ins themselves are queued by the page (IndexedDB), not here.
+const CACHE = "ld-forms-v1";
+const ASSETS = [
+  "/static/style.css",
+  "/static/logo.jpg",
+  "/static/kbcbg.jpg"
+];
+const PAGES = ["/attendance", "/"];
+
+self.addEventListener("install", event => {
+  event.waitUntil(caches.open(CACHE).then(cache => cache.addAll(ASSETS)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener("activate", event => {
+  // Drop caches left by older versions of this worker
+  event.waitUntil(
+    caches.keys()
+      .then(names => Promise.all(names.filter(name => name !== CACHE).map(name => caches.delete(name))))
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener("fetch", event => {
+  const request = event.request;
+  const url = new URL(request.url);
+  if (request.method !== "GET" || url.origin !== self.location.origin) {
+    return;
+  }
+
+  if (url.pathname.startsWith("/static/")) {
+    event.respondWith(
+      caches.match(request).then(cached => cached || fetch(request).then(response => {
+        if (response.ok) {
+          const copy = response.clone();
+          caches.open(CACHE).then(cache => cache.put(request, copy));
+        }
+        return response;
+      }))
+    );
+    return;
+  }
+
+  if (request.mode === "navigate" && PAGES.includes(url.pathname)) {
+    event.respondWith(
+      fetch(request).then(response => {
+        if (response.ok) {
+          const copy = response.clone();
+          caches.open(CACHE).then(cache => cache.put(request, copy));
+        }
+        return response;
+      }).catch(() => caches.match(request).then(cached => cached || Response.error()))
+    );
+  }
+});
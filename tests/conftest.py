@@ -0,0 +1,54 @@
+"""
+Shared test setup: every local store (write journal, roster cache, sync state, upload jobs, exports)
+points at a throwaway directory before any app module is imported, and the Sheets client
+is the in-memory stub from bench/fake_sheets.py.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="ld-tests-")
+os.environ.update(
+    WRITE_JOURNAL_PATH=os.path.join(_TMP, "write_journal.db"),
+    ROSTER_CACHE_PATH=os.path.join(_TMP, "roster_cache.db"),
+    SYNC_STATE_PATH=os.path.join(_TMP, "sync_state.db"),
+    JOBS_DB_PATH=os.path.join(_TMP, "upload_jobs.db"),
+    EXPORT_STATE_PATH=os.path.join(_TMP, "export_state.db"),
+    EXPORT_CACHE_DIR=os.path.join(_TMP, "export_cache"),
+    ROSTER_CACHE="memory",
+    IDEMPOTENCY_STORE="memory",
+    # Tests flush the queues themselves
+    MARK_FLUSH_INTERVAL_MS="3600000",
+    FEEDBACK_FLUSH_INTERVAL_MS="3600000",
+    EXPORT_FLUSH_INTERVAL_MS="3600000",
+    # The stub has no quota; limiter behavior is tested on its own instances
+    SHEETS_READS_PER_MINUTE="6000",
+    SHEETS_WRITES_PER_MINUTE="6000",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def sheet():
+    """Master_Attendance on a fresh Sheets stub: sessions BENCH_0/BENCH_1 of four people each."""
+    from bench.fake_sheets import FakeClient, seed_roster
+    from utils.roster_index import roster_index
+    from utils.sheet_utils import export_state, install_gsheet_client, mark_queue
+
+    mark_queue.flush()
+    roster_index.invalidate()
+    export_state.invalidate()
+    client = FakeClient()
+    seed_roster(client, sessions=2, per_session=4)
+    install_gsheet_client(client)
+    return client.spreadsheet.worksheets["Master_Attendance"]
+
+
+@pytest.fixture
+def http():
+    """Flask test client for app.py (import it only after the environment above is set)."""
+    import app
+
+    return app.app.test_client()
@@ -0,0 +1,80 @@
+"""/submit_attendance_batch: the offline queue's flush is idempotent and keeps plausible device times."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.idempotency import IdempotencyStore, SubmissionGuard
+from utils.session_registry import session_registry
+from utils.sheet_utils import OFFLINE_MARK_MAX_AGE_HOURS, mark_queue
+
+URL = "/submit_attendance_batch"
+
+
+@pytest.fixture
+def guard(monkeypatch):
+    guard = SubmissionGuard(IdempotencyStore())
+    monkeypatch.setattr("app.submission_guard", guard)
+    return guard
+
+
+def _timestamp(ws, email):
+    return next(row[8] for row in ws.rows[1:] if row[5] == email)
+
+
+def _ms(when):
+    return int(when.timestamp() * 1000)
+
+
+def test_replayed_batch_is_not_marked_again(sheet, http, guard):
+    marks = [{"session_id": "BENCH_0", "email": "user1.s0@example.com", "name": "User 1"},
+             {"session_id": "BENCH_0", "email": "nobody@example.com"}]
+    first = http.post(URL, json={"marks": marks})
+    assert [r["result"] for r in first.json["results"]] == ["marked", "not_on_roster"]
+    assert mark_queue.pending() == 1
+
+    again = http.post(URL, json={"marks": marks})
+    assert again.json["results"] == first.json["results"]
+    assert mark_queue.pending() == 1
+    assert guard.absorbed == {"submit_attendance_batch": 1}
+
+
+def test_known_unknown_session_skips_the_roster(sheet, http, guard):
+    session_registry.mark_unknown("GHOST_BATCH", 60)
+    sheet.spreadsheet.reset_counters()
+    response = http.post(URL, json={"marks": [{"session_id": "GHOST_BATCH", "email": "a@example.com"}]})
+    assert response.json["results"] == [{"session_id": "GHOST_BATCH", "email": "a@example.com",
+                                         "result": "unknown_session"}]
+    assert sum(sheet.spreadsheet.calls.values()) == 0
+
+
+def test_recent_device_time_is_kept(sheet, http, guard):
+    when = (datetime.now() - timedelta(hours=1)).replace(microsecond=0)
+    http.post(URL, json={"marks": [{"session_id": "BENCH_0", "email": "user2.s0@example.com",
+                                    "queued_at": _ms(when)}]})
+    assert mark_queue.flush() is True
+    assert _timestamp(sheet, "user2.s0@example.com") == when.strftime("%Y-%m-%d %H:%M:%S")
+
+
+@pytest.mark.parametrize("queued_at", [
+    _ms(datetime.now() - timedelta(hours=OFFLINE_MARK_MAX_AGE_HOURS + 1)),
+    _ms(datetime.now() + timedelta(days=1)),
+    "soon",
+])
+def test_implausible_device_time_falls_back_to_now(sheet, http, guard, queued_at):
+    before = datetime.now().replace(microsecond=0)
+    http.post(URL, json={"marks": [{"session_id": "BENCH_0", "email": "user3.s0@example.com",
+                                    "queued_at": queued_at}]})
+    assert mark_queue.flush() is True
+    written = datetime.strptime(_timestamp(sheet, "user3.s0@example.com"), "%Y-%m-%d %H:%M:%S")
+    assert before <= written <= datetime.now()
+
+
+@pytest.mark.parametrize("body", [{}, {"marks": []}, {"marks": ["user1.s0@example.com"]}])
+def test_malformed_batch_is_rejected(http, guard, body):
+    assert http.post(URL, json=body).status_code == 400
+
+
+def test_oversized_batch_is_rejected(http, guard, monkeypatch):
+    monkeypatch.setattr("app.ATTENDANCE_BATCH_MAX_MARKS", 2)
+    marks = [{"session_id": "BENCH_0", "email": f"user{i}.s0@example.com"} for i in range(3)]
+    assert http.post(URL, json={"marks": marks}).status_code == 413
@@ -0,0 +1,53 @@
+"""/admin/bulk_mark validates each record and only keeps plausible check-in times."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.sheet_utils import OFFLINE_MARK_MAX_AGE_HOURS
+
+
+def _timestamp(ws, email):
+    return next(row[8] for row in ws.rows[1:] if row[5] == email)
+
+
+def _post(http, *records):
+    return http.post("/admin/bulk_mark", json={"records": list(records)})
+
+
+def test_marks_are_written_before_answering(sheet, http):
+    response = _post(http, {"session_id": "BENCH_0", "email": "User1.S0@example.com"},
+                     {"session_id": "BENCH_0", "email": "nobody@example.com"})
+    assert response.status_code == 200
+    assert [r["result"] for r in response.json["results"]] == ["marked", "not_on_roster"]
+    assert _timestamp(sheet, "user1.s0@example.com")
+
+
+@pytest.mark.parametrize("record", [
+    {"session_id": "BENCH_0", "email": 123},
+    {"session_id": ["BENCH_0"], "email": "user1.s0@example.com"},
+    "user1.s0@example.com",
+])
+def test_malformed_record_is_rejected(sheet, http, record):
+    response = _post(http, {"session_id": "BENCH_0", "email": "user2.s0@example.com"}, record)
+    assert response.status_code == 400
+    assert "Record 1" in response.json["message"]
+    assert _timestamp(sheet, "user2.s0@example.com") == ""
+
+
+def test_recent_timestamp_is_kept(sheet, http):
+    when = (datetime.now() - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+    _post(http, {"session_id": "BENCH_0", "email": "user1.s0@example.com", "timestamp": when})
+    assert _timestamp(sheet, "user1.s0@example.com") == when
+
+
+@pytest.mark.parametrize("timestamp", [
+    {"a": 1},
+    "yesterday-ish",
+    (datetime.now() - timedelta(hours=OFFLINE_MARK_MAX_AGE_HOURS + 1)).isoformat(),
+    (datetime.now() + timedelta(days=1)).isoformat(),
+])
+def test_implausible_timestamp_falls_back_to_now(sheet, http, timestamp):
+    before = datetime.now().replace(microsecond=0)
+    _post(http, {"session_id": "BENCH_0", "email": "user1.s0@example.com", "timestamp": timestamp})
+    written = datetime.strptime(_timestamp(sheet, "user1.s0@example.com"), "%Y-%m-%d %H:%M:%S")
+    assert before <= written <= datetime.now()
@@ -0,0 +1,97 @@
+"""Delta sync: incremental reads, and the Attendance conflict rule (queued local mark wins, else the sheet)."""
+import os
+
+import pytest
+
+from bench.fake_sheets import FakeWorksheet
+from utils.delta_sync import SYNC_STATE_PATH, DeltaSync
+from utils.roster_index import roster_index
+from utils.sheet_utils import SheetsStorage, mark_queue, sheets_export_queue
+from utils.storage import FEEDBACK_HEADER, SQLiteStorage
+
+EMAIL = "user1.s0@example.com"
+
+
+@pytest.fixture
+def sync(sheet):
+    sheets_export_queue.flush()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(SYNC_STATE_PATH + suffix):
+            os.remove(SYNC_STATE_PATH + suffix)
+    sheet.spreadsheet.worksheets["Master_Feedback"] = FakeWorksheet(sheet.spreadsheet, "Master_Feedback",
+                                                                    [FEEDBACK_HEADER])
+    return DeltaSync()
+
+
+@pytest.fixture
+def local(tmp_path, monkeypatch):
+    store = SQLiteStorage(str(tmp_path / "attendance.db"), exporter=sheets_export_queue)
+    monkeypatch.setattr("utils.storage._storage", store)
+    return store
+
+
+def _cell(sheet, email, column=7):
+    return next(row for row in sheet.rows if row[5] == email)[column]
+
+
+def test_first_pass_is_full_and_later_passes_are_incremental(sheet, sync, local):
+    result = sync.run()
+    assert result["Master_Attendance"] == {"appended": 8, "changed": 0, "full": True}
+    assert local.lookup("BENCH_0", EMAIL) == {"row": 2, "status": ""}
+
+    calls = sheet.spreadsheet.calls
+    calls.clear()
+    sheet.append_rows([["BENCH_0", "Bench 0", "2030-01-01", "E9", "New", "new@example.com", "Bench", "", ""]])
+    sheet.spreadsheet.worksheets["Master_Feedback"].append_rows(
+        [["2030-01-01 10:00:00", "BENCH_0", "Bench 0", "2030-01-01", "Ada", EMAIL, "", "Good"]])
+    result = sync.run()
+    assert result["Master_Attendance"] == {"appended": 1, "changed": 0, "full": False}
+    assert result["Master_Feedback"]["appended"] == 1
+    assert calls["get_all_values"] == 0
+    assert local.lookup("BENCH_0", "new@example.com") is not None
+
+    # The same feedback row is not folded in twice
+    sync.run(full=True)
+    feedback = list(local.export_tables("BENCH_0")[1]["feedback"])
+    assert len(feedback) == 2   # header + one row
+
+
+def test_sheet_wins_when_no_local_mark_is_queued(sheet, sync, local):
+    sync.run()
+    assert local.mark("BENCH_0", EMAIL, "2030-01-01 09:00:00") == "marked"
+    assert sheets_export_queue.flush() is True
+    assert _cell(sheet, EMAIL) == "Present"
+    sync.run()
+
+    # An admin clears the mark by hand after it reached the sheet: it stays cleared locally
+    sheet.rows[2][7] = sheet.rows[2][8] = ""
+    assert sync.run()["Master_Attendance"]["changed"] == 1
+    assert local.lookup("BENCH_0", EMAIL)["status"] == ""
+
+
+def test_queued_local_mark_wins(sheet, sync, local):
+    sync.run()
+    assert local.mark("BENCH_0", EMAIL, "2030-01-01 09:00:00") == "marked"
+    # The sheet changes that cell before the export lands
+    sheet.rows[2][7] = "Absent"
+    assert sync.run()["Master_Attendance"]["changed"] == 1
+    assert local.lookup("BENCH_0", EMAIL)["status"] == "Present"
+
+    assert sheets_export_queue.flush() is True
+    assert _cell(sheet, EMAIL) == "Present"
+
+
+def test_sheets_backend_keeps_a_queued_claim(sheet, sync):
+    storage = SheetsStorage()
+    sync.run()
+    assert storage.mark("BENCH_0", EMAIL, "2030-01-01 09:00:00") == "marked"
+    sheet.rows[2][8] = "edited"   # any change to the row's mutable cells while the mark is queued
+    sync.run()
+    assert roster_index.get("BENCH_0", EMAIL)["status"] == "Present"
+
+    assert mark_queue.flush() is True
+    sync.run()
+    # Once written, an admin clear wins
+    sheet.rows[2][7] = sheet.rows[2][8] = ""
+    sync.run()
+    assert roster_index.get("BENCH_0", EMAIL)["status"] == ""
@@ -0,0 +1,75 @@
+"""Session exports: ETags follow the session's content, and unchanged sessions cost no Sheets reads."""
+import pytest
+
+from bench.fake_sheets import READ_OPS, FakeWorksheet
+from utils.sheet_utils import append_feedback, feedback_queue, mark_present, mark_queue
+from utils.storage import FEEDBACK_HEADER
+
+URL = "/admin/export/BENCH_0?format=csv&tab=attendance"
+
+
+@pytest.fixture
+def spreadsheet(sheet):
+    feedback_queue.flush()
+    sheet.spreadsheet.worksheets["Master_Feedback"] = FakeWorksheet(sheet.spreadsheet, "Master_Feedback",
+                                                                    [FEEDBACK_HEADER])
+    return sheet.spreadsheet
+
+
+def _reads(spreadsheet):
+    return sum(spreadsheet.calls[op] for op in READ_OPS)
+
+
+def test_csv_lists_the_session_roster(spreadsheet, http):
+    response = http.get(URL)
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith("Timestamp,Session ID")
+    assert len(lines) == 5
+    assert all(",BENCH_0," in line for line in lines[1:])
+
+
+def test_unchanged_session_is_revalidated_without_reading_sheets(spreadsheet, http):
+    etag = http.get(URL).headers["ETag"]
+    before = _reads(spreadsheet)
+
+    assert http.get(URL, headers={"If-None-Match": etag}).status_code == 304
+    repeat = http.get(URL)
+    assert repeat.status_code == 200 and repeat.headers["ETag"] == etag
+    assert _reads(spreadsheet) == before
+
+
+def test_mark_changes_the_etag(spreadsheet, http):
+    etag = http.get(URL).headers["ETag"]
+    assert mark_present("BENCH_0", "user1.s0@example.com") is True
+    assert mark_queue.flush() is True
+
+    response = http.get(URL, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "user1.s0@example.com,,Present" in response.get_data(as_text=True)
+
+
+def test_feedback_changes_the_etag(spreadsheet, http):
+    etag = http.get(URL).headers["ETag"]
+    append_feedback("BENCH_0", "Bench 0", "2030-01-01", {"name": "User 1", "email": "user1.s0@example.com"})
+    assert feedback_queue.flush() is True
+
+    response = http.get(URL, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_hand_edit_is_seen_after_the_recheck_interval(spreadsheet, sheet, http, monkeypatch):
+    etag = http.get(URL).headers["ETag"]
+    sheet.rows[1][7] = "Present"   # edited on the sheet: nothing local knows
+
+    assert http.get(URL, headers={"If-None-Match": etag}).status_code == 304
+    monkeypatch.setattr("utils.sheet_utils.EXPORT_RECHECK_SECONDS", 0)
+    assert http.get(URL, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_unknown_session_is_not_found(spreadsheet, http):
+    assert http.get("/admin/export/NOPE?format=csv").status_code == 404
+    assert http.get(URL.replace("csv", "pdf")).status_code == 400
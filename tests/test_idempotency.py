@@ -0,0 +1,85 @@
+"""SubmissionGuard and its stores: begin / complete / release on every backend."""
+import pytest
+
+from utils.idempotency import (
+    DONE, NEW, PENDING, IdempotencyStore, RedisIdempotencyStore, SQLiteIdempotencyStore, SubmissionGuard,
+)
+
+OK = {"status": 200, "body": {"status": "success"}}
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return IdempotencyStore()
+    if request.param == "sqlite":
+        return SQLiteIdempotencyStore(path=str(tmp_path / "idem.db"))
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisIdempotencyStore(fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True))
+
+
+def test_store_begin_complete_release(store):
+    assert store.begin("k") == (NEW, None)
+    assert store.begin("k") == (PENDING, None)
+    store.complete("k", OK)
+    assert store.begin("k") == (DONE, OK)
+    store.release("k")
+    assert store.begin("k") == (NEW, None)
+
+
+def test_run_replays_the_first_response(store):
+    guard = SubmissionGuard(store)
+    calls = []
+
+    def handler():
+        calls.append(1)
+        return OK
+
+    assert guard.run("/submit", "k", handler) == (OK, False)
+    assert guard.run("/submit", "k", handler) == (OK, True)
+    assert len(calls) == 1
+    assert guard.absorbed == {"/submit": 1}
+
+
+def test_run_releases_errors_and_exceptions(store):
+    guard = SubmissionGuard(store)
+    rejected = {"status": 404, "body": {"status": "error"}}
+    assert guard.run("/submit", "k", lambda: rejected) == (rejected, False)
+
+    def boom():
+        raise RuntimeError("Sheets down")
+
+    with pytest.raises(RuntimeError):
+        guard.run("/submit", "k", boom)
+    # Neither the rejection nor the exception was stored, so a retry runs normally
+    assert guard.run("/submit", "k", lambda: OK) == (OK, False)
+
+
+def test_run_gives_up_on_a_pending_duplicate(store):
+    guard = SubmissionGuard(store)
+    store.begin("k")   # the first request is still running elsewhere
+    assert guard.run("/submit", "k", lambda: OK, wait=0.1) == (None, True)
+
+
+def test_run_batch(store):
+    guard = SubmissionGuard(store)
+    store.complete("done", OK)
+    store.begin("pending")
+    seen = []
+
+    def handler(indices):
+        seen.extend(indices)
+        return [{"status": 200, "body": i} if i != 3 else {"status": 400, "body": i} for i in indices]
+
+    results = guard.run_batch("/batch", ["a", "done", "pending", "b", "a"], handler)
+    assert seen == [0, 3]
+    assert results == [
+        ({"status": 200, "body": 0}, False),
+        (OK, True),
+        (None, True),
+        ({"status": 400, "body": 3}, False),
+        ({"status": 200, "body": 0}, True),
+    ]
+    # The failed item was released, the successful one is replayed
+    assert store.begin("b") == (NEW, None)
+    assert store.begin("a")[0] == DONE
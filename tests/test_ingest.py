@@ -0,0 +1,73 @@
+"""Roster ingestion: reading, cleaning and laying out an uploaded roster, then storing it."""
+import pandas as pd
+import pytest
+
+from utils.ingest import build_roster_rows, normalize_roster, read_roster
+from utils.storage import ATTENDANCE_HEADER
+
+RAW = pd.DataFrame({
+    " Email ID ": [" Ada@Example.com", "", "bob@example.com", "ADA@example.com ", "  "],
+    "Emp Code": ["E1", "E2", "E3", "E4", "E5"],
+    "Name": ["Ada", "Nobody", " Bob ", "Ada again", "Blank"],
+    "Business Unit": ["L&D", "L&D", "Ops", "L&D", "Ops"],
+})
+
+
+def test_normalize_maps_headers_and_cleans_emails():
+    df, stats = normalize_roster(RAW.copy())
+    assert {"Official Email", "Employee Code", "Employee Name", "Business"} <= set(df.columns)
+    assert df["Official Email"].tolist() == ["ada@example.com", "bob@example.com"]
+    assert df["Employee Name"].tolist() == ["Ada", "Bob"]
+    assert stats == {"rows_read": 5, "blank_emails": 2, "duplicate_emails": 1}
+
+
+def test_normalize_keeps_the_first_of_two_email_columns():
+    df, _ = normalize_roster(pd.DataFrame({"Official Email": ["a@x.com"], "Email": ["b@x.com"]}))
+    assert df["Official Email"].tolist() == ["a@x.com"]
+
+
+def test_normalize_requires_an_email_column():
+    with pytest.raises(ValueError, match="Official Email"):
+        normalize_roster(pd.DataFrame({"Name": ["Ada"]}))
+
+
+def test_build_rows_follow_the_attendance_header():
+    df, _ = normalize_roster(RAW.copy())
+    rows = build_roster_rows(df, "S1", "Onboarding", "2030-01-01")
+    assert rows[0] == ["S1", "Onboarding", "2030-01-01", "E1", "Ada", "ada@example.com", "L&D", "", ""]
+    assert all(len(row) == len(ATTENDANCE_HEADER) for row in rows)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".xlsx"])
+def test_read_roster_returns_strings(tmp_path, suffix):
+    path = tmp_path / f"roster{suffix}"
+    frame = pd.DataFrame({"Official Email": ["a@x.com", "b@x.com"], "Employee Code": ["007", ""]})
+    if suffix == ".csv":
+        frame.to_csv(path, index=False)
+    else:
+        frame.to_excel(path, index=False)
+    df = read_roster(str(path))
+    # Leading zeros survive and blanks stay blank (no NaN)
+    assert df["Employee Code"].tolist() == ["007", ""]
+
+
+def test_read_roster_rejects_other_file_types(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported"):
+        read_roster(str(tmp_path / "roster.pdf"))
+
+
+def test_upload_stores_and_indexes_the_roster(sheet, tmp_path):
+    from utils.sheet_utils import lookup_attendance, lookup_session, upload_session_from_excel
+
+    path = tmp_path / "roster.csv"
+    RAW.to_csv(path, index=False)
+    progress = []
+    session_id = upload_session_from_excel(str(path), "Onboarding Day", "2030-01-01",
+                                           progress=lambda done, total: progress.append((done, total)))
+
+    assert session_id.startswith("Onboarding_Day_2030-01-01_")
+    stored = [row for row in sheet.rows if row[0] == session_id]
+    assert [row[5] for row in stored] == ["ada@example.com", "bob@example.com"]
+    assert progress[-1] == (2, 2)
+    assert lookup_session(session_id)["session_name"] == "Onboarding Day"
+    assert lookup_attendance(session_id, "BOB@example.com") == {"row": sheet.rows.index(stored[1]) + 1, "status": ""}
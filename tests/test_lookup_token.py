@@ -0,0 +1,59 @@
+"""The signed /validate_email lookup reused by /submit_feedback: bound to its session and email, time-limited, and only a hint for the write."""
+import time
+
+import pytest
+
+from utils.lookup_token import LOOKUP_TOKEN_MAX_AGE, sign_lookup, verify_lookup
+from utils.sheet_utils import SheetsStorage, mark_queue
+from utils.storage import MARKED, QUEUED
+
+
+KEY = "test-secret"
+ENTRY = {"row": 7, "status": ""}
+
+
+def test_token_round_trip():
+    token = sign_lookup(KEY, "S1", " Ada@Example.com ", ENTRY)
+    assert verify_lookup(KEY, token, "S1", "ada@example.com") == ENTRY
+
+
+@pytest.mark.parametrize("session_id, email", [("S2", "ada@example.com"), ("S1", "bob@example.com")])
+def test_token_is_bound_to_its_session_and_email(session_id, email):
+    token = sign_lookup(KEY, "S1", "ada@example.com", ENTRY)
+    assert verify_lookup(KEY, token, session_id, email) is None
+
+
+def test_tampered_or_foreign_tokens_are_rejected():
+    token = sign_lookup(KEY, "S1", "ada@example.com", ENTRY)
+    assert verify_lookup("another-secret", token, "S1", "ada@example.com") is None
+    assert verify_lookup(KEY, token[:-2] + ("AA" if token[-2:] != "AA" else "BB"), "S1", "ada@example.com") is None
+    assert verify_lookup(KEY, "", "S1", "ada@example.com") is None
+    assert verify_lookup(KEY, None, "S1", "ada@example.com") is None
+
+
+def test_token_expires(monkeypatch):
+    issued = time.time() - LOOKUP_TOKEN_MAX_AGE - 5
+    monkeypatch.setattr(time, "time", lambda: issued)
+    token = sign_lookup(KEY, "S1", "ada@example.com", ENTRY)
+    monkeypatch.undo()
+
+    assert verify_lookup(KEY, token, "S1", "ada@example.com") is None
+    assert verify_lookup(KEY, token, "S1", "ada@example.com", max_age=LOOKUP_TOKEN_MAX_AGE + 60) == ENTRY
+
+
+def _present(ws):
+    return sorted((row[0], row[5]) for row in ws.rows[1:] if row[7] == "Present")
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_client_supplied_row_is_never_written(sheet, indexed):
+    storage = SheetsStorage()
+    if indexed:
+        storage.lookup("BENCH_0", "user0.s0@example.com")
+    # A forged /validate_email token pointing user3.s0 at user0.s0's row
+    forged = {"row": 2, "status": ""}
+    result = storage.mark("BENCH_0", "user3.s0@example.com", "2030-01-01 09:00:00", entry=forged)
+    # Without an indexed roster the mark is queued unverified and resolved by the flusher
+    assert result == (MARKED if indexed else QUEUED)
+    assert mark_queue.flush() is True
+    assert _present(sheet) == [("BENCH_0", "user3.s0@example.com")]
@@ -0,0 +1,55 @@
+"""Queued marks land on the person's current row, even when the sheet moved underneath them."""
+from utils.rate_limiter import TokenBucket, sheets_limiter
+from utils.sheet_utils import mark_present, mark_queue
+from utils.sheets_metrics import sheets_metrics
+
+
+def _present(ws):
+    return sorted((row[0], row[5]) for row in ws.rows[1:] if row[7] == "Present")
+
+
+def test_mark_is_written(sheet):
+    assert mark_present("BENCH_0", "user1.s0@example.com") is True
+    assert mark_queue.flush() is True
+    assert _present(sheet) == [("BENCH_0", "user1.s0@example.com")]
+
+
+def test_mark_follows_a_row_moved_after_queueing(sheet):
+    assert mark_present("BENCH_0", "user2.s0@example.com") is True
+    assert mark_present("BENCH_1", "user0.s1@example.com") is True
+    del sheet.rows[2]   # an admin deletes user1.s0's row: every journaled row below it is now off by one
+
+    assert mark_queue.flush() is True
+    assert _present(sheet) == [("BENCH_0", "user2.s0@example.com"), ("BENCH_1", "user0.s1@example.com")]
+    assert mark_queue.stats()["dead_letters"] == 0
+
+
+def test_mark_for_a_removed_person_is_dropped(sheet):
+    assert mark_present("BENCH_0", "user1.s0@example.com") is True
+    del sheet.rows[2]
+    assert mark_queue.flush() is True
+    assert _present(sheet) == []
+
+
+def _calls(op):
+    return sum(n for (name, _, _), n in sheets_metrics.calls.items() if name == op)
+
+
+def test_flush_reads_are_counted(sheet):
+    assert mark_present("BENCH_0", "user1.s0@example.com") is True
+    before = _calls("batch_get")
+    assert mark_queue.flush() is True
+    # The row check before writing goes through the traced handle like every other call
+    assert _calls("batch_get") == before + 1
+
+
+def test_flush_reads_are_throttled(sheet, monkeypatch):
+    assert mark_present("BENCH_0", "user1.s0@example.com") is True
+    empty = TokenBucket(0)
+    empty.tokens = 0.0
+    monkeypatch.setitem(sheets_limiter.buckets, "read", empty)
+
+    # No read budget: the flush backs off and keeps the mark journaled
+    assert mark_queue.flush() is False
+    assert mark_queue.pending() == 1
+    assert _present(sheet) == []
@@ -0,0 +1,75 @@
+"""SheetsRateLimiter budgets and retry rules: reads retry on 5xx, appends never resend an uncertain call."""
+import os
+import subprocess
+import sys
+
+import gspread
+import pytest
+import requests
+
+from utils.rate_limiter import CHECKIN, INTERACTIVE, RETRY_POLICY, SheetsRateLimiter, WriteUncertain, sheets_priority
+
+
+def _api_error(code):
+    response = requests.Response()
+    response.status_code = code
+    response._content = b'{"error": {"code": %d, "message": "stub"}}' % code
+    return gspread.exceptions.APIError(response)
+
+
+class Flaky:
+    """attempt() that fails with `errors` in turn, then returns "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    for priority in (CHECKIN, INTERACTIVE):
+        monkeypatch.setitem(RETRY_POLICY, priority, (2, 0.0, 0.0))
+    return SheetsRateLimiter(reads_per_minute=600, writes_per_minute=600)
+
+
+def test_read_is_retried_after_a_server_error(limiter):
+    attempt = Flaky(_api_error(503), requests.exceptions.Timeout("read timed out"))
+    assert limiter.call("get", attempt) == "ok"
+    assert attempt.calls == 3
+
+
+@pytest.mark.parametrize("error", [_api_error(503), requests.exceptions.Timeout("read timed out")])
+def test_uncertain_append_is_not_resent(limiter, error):
+    attempt = Flaky(error)
+    with pytest.raises(WriteUncertain):
+        limiter.call("append_rows", attempt)
+    assert attempt.calls == 1
+
+
+def test_rejected_append_is_raised_or_retried(limiter):
+    with pytest.raises(gspread.exceptions.APIError):
+        limiter.call("append_rows", Flaky(_api_error(400)))
+
+    # 429: Google refused the call outright, so sending it again cannot duplicate rows
+    attempt = Flaky(_api_error(429))
+    with sheets_priority(CHECKIN):   # the queue flushers' priority: waits out the drained bucket
+        assert limiter.call("append_rows", attempt) == "ok"
+    assert attempt.calls == 2
+
+
+@pytest.mark.parametrize("workers, budget", [("1", 60), ("3", 20)])
+def test_default_budget_splits_the_per_user_quota(workers, budget):
+    env = dict(os.environ, WEB_CONCURRENCY=workers, ROSTER_CACHE="sqlite")
+    env.pop("SHEETS_READS_PER_MINUTE", None)
+    env.pop("SHEETS_WRITES_PER_MINUTE", None)
+    out = subprocess.run(
+        [sys.executable, "-c", "from utils import rate_limiter as r; print(r.SHEETS_READS_PER_MINUTE, r.SHEETS_WRITES_PER_MINUTE)"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env, capture_output=True, text=True, check=True,
+    )
+    assert out.stdout.split() == [str(budget), str(budget)]
@@ -0,0 +1,79 @@
+"""ReportEngine: attendance/feedback aggregates over an incrementally refreshed snapshot."""
+import pytest
+
+from bench.fake_sheets import FakeWorksheet
+from utils.reports import ReportEngine
+from utils.storage import FEEDBACK_HEADER
+
+
+def _feedback(session_id, q1, q8):
+    return ["2030-01-01 10:00:00", session_id, "Bench", "2030-01-01", "Someone", "x@example.com", "",
+            q1, "Good", "Good", "Good", "Good", "Good", "Good", q8, "", ""]
+
+
+@pytest.fixture
+def tabs(sheet):
+    # BENCH_0: 3 of 4 present, L&D for two people and no business for the others; BENCH_1 (business "Bench"): nobody yet
+    for i, row in enumerate(sheet.rows[1:5]):
+        row[6] = "L&D" if i < 2 else ""
+        row[7] = "Present" if i < 3 else ""
+    feedback = FakeWorksheet(sheet.spreadsheet, "Master_Feedback", [FEEDBACK_HEADER,
+                             _feedback("BENCH_0", "Excellent", "Yes"), _feedback("BENCH_0", "Good", "No")])
+    sheet.spreadsheet.worksheets["Master_Feedback"] = feedback
+    return sheet, feedback
+
+
+def _session(report, session_id):
+    return next(s for s in report["sessions"] if s["session_id"] == session_id)
+
+
+def test_report_aggregates(tabs):
+    report = ReportEngine().report()
+    s0, s1 = _session(report, "BENCH_0"), _session(report, "BENCH_1")
+    assert (s0["registered"], s0["present"], s0["attendance_pct"]) == (4, 3, 75.0)
+    assert (s1["registered"], s1["present"], s1["responses"]) == (4, 0, 0)
+    assert (s0["responses"], s0["q1_avg"], s0["recommend_pct"]) == (2, 4.0, 50.0)
+
+    businesses = {b["business"]: (b["registered"], b["present"]) for b in report["businesses"]}
+    assert businesses == {"L&D": (2, 2), "Unspecified": (2, 1), "Bench": (4, 0)}
+    assert report["feedback_distribution"]["Q1"] == {"Excellent": 1, "Good": 1}
+    assert report["rows"] == {"attendance": 8, "feedback": 2}
+
+
+def test_report_for_one_session(tabs):
+    report = ReportEngine().report("BENCH_0")
+    assert [s["session_id"] for s in report["sessions"]] == ["BENCH_0"]
+    assert report["feedback_distribution"]["Q8"] == {"Yes": 1, "No": 1}
+    assert "session_distributions" not in report
+
+
+def test_refresh_reads_only_new_rows_and_changed_cells(tabs, monkeypatch):
+    sheet, feedback = tabs
+    engine = ReportEngine()
+    engine.report()
+    monkeypatch.setattr("utils.reports.REPORT_REFRESH_SECONDS", 0)
+    calls = sheet.spreadsheet.calls
+    calls.clear()
+
+    # Nothing changed: ranged reads only, and the cached aggregates are reused
+    assert engine.refresh() is False
+    assert calls["get_all_values"] == 0
+
+    sheet.rows[5][7] = "Present"                                  # a check-in on BENCH_1
+    feedback.rows.append(_feedback("BENCH_1", "Poor", "Yes"))     # a new feedback row
+    assert engine.refresh() is True
+    assert calls["get_all_values"] == 0
+
+    report = engine.report()
+    assert _session(report, "BENCH_1")["present"] == 1
+    assert _session(report, "BENCH_1")["q1_avg"] == 1.0
+    assert report["rows"]["feedback"] == 3
+
+
+def test_refresh_is_throttled(tabs):
+    engine = ReportEngine()
+    engine.report()
+    sheet, _ = tabs
+    sheet.spreadsheet.calls.clear()
+    engine.report()
+    assert sum(sheet.spreadsheet.calls.values()) == 0
@@ -0,0 +1,82 @@
+"""claim() flips an entry to Present exactly once, on every roster index backend."""
+import threading
+
+import pytest
+
+from utils.roster_index import RedisRosterIndex, RosterIndex, SQLiteRosterIndex
+
+SESSION = "S1"
+EMAIL = "ada@example.com"
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def index(request, tmp_path):
+    if request.param == "memory":
+        return RosterIndex()
+    if request.param == "sqlite":
+        return SQLiteRosterIndex(path=str(tmp_path / "roster.db"))
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisRosterIndex(fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True))
+
+
+def _load(index, status=""):
+    index.load_sessions({SESSION: {EMAIL: {"row": 2, "status": status},
+                                   "bob@example.com": {"row": 3, "status": "Present"}}})
+
+
+def test_claim_succeeds_once(index):
+    _load(index)
+    assert index.claim(SESSION, " Ada@Example.com ") is True
+    assert index.claim(SESSION, EMAIL) is False
+    assert index.get(SESSION, EMAIL) == {"row": 2, "status": "Present"}
+
+
+def test_claim_already_present_or_unknown(index):
+    _load(index)
+    assert index.claim(SESSION, "bob@example.com") is False
+    assert index.claim(SESSION, "nobody@example.com") is None
+    assert index.claim("OTHER", EMAIL) is None
+
+
+def test_claim_is_atomic_across_threads(index):
+    _load(index)
+    results = []
+    barrier = threading.Barrier(16)
+
+    def worker():
+        barrier.wait()
+        results.append(index.claim(SESSION, EMAIL))
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    assert results.count(False) == 15
+
+
+def test_claim_survives_reload_until_settled(index):
+    _load(index)
+    assert index.claim(SESSION, EMAIL) is True
+    # The mark is still queued, so a reload of the (unmarked) sheet must not allow a second claim
+    _load(index)
+    assert index.claim(SESSION, EMAIL) is False
+
+    index.settle_claims(SESSION, [EMAIL])
+    assert index.get(SESSION, EMAIL)["status"] == "Present"
+    # Once written, the sheet wins again: an admin clearing the cell re-opens the check-in
+    _load(index, status="")
+    assert index.claim(SESSION, EMAIL) is True
+
+
+def test_flushed_mark_settles_its_claim(sheet):
+    from utils.roster_index import roster_index
+    from utils.sheet_utils import mark_present, mark_queue
+
+    assert mark_present("BENCH_0", "user1.s0@example.com") is True
+    assert mark_queue.flush() is True
+    assert roster_index.get("BENCH_0", "user1.s0@example.com")["status"] == "Present"
+    # The claim is gone, so a reload showing the cell cleared re-opens the check-in
+    roster_index.load_sessions({"BENCH_0": {"user1.s0@example.com": {"row": 3, "status": ""}}})
+    assert roster_index.claim("BENCH_0", "user1.s0@example.com") is True
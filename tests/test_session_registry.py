@@ -0,0 +1,45 @@
+"""Unknown session IDs are answered from memory: mistyped links cannot each trigger a Sessions read."""
+import pytest
+
+from bench.fake_sheets import FakeWorksheet
+from utils.session_registry import SessionRegistry
+from utils.sheet_utils import SESSIONS_HEADER, lookup_session
+
+
+@pytest.fixture
+def registry(sheet, monkeypatch):
+    sheet.spreadsheet.worksheets["Sessions"] = FakeWorksheet(sheet.spreadsheet, "Sessions", [SESSIONS_HEADER])
+    registry = SessionRegistry()
+    monkeypatch.setattr("utils.sheet_utils.session_registry", registry)
+    monkeypatch.setattr("utils.sheet_utils._discovered_at", None)
+    sheet.spreadsheet.reset_counters()
+    return registry
+
+
+def test_mistyped_ids_share_one_reload(sheet, registry):
+    for i in range(20):
+        assert lookup_session(f"TYPO_{i}") is None
+    # One Sessions read for the first miss, plus one Master_Attendance scan for unregistered rosters
+    assert sheet.spreadsheet.calls["get_all_values"] == 2
+    assert registry.is_unknown("TYPO_7")
+
+
+def test_new_session_is_found_once_the_gap_has_passed(sheet, registry, monkeypatch):
+    assert lookup_session("TYPO_0") is None
+    # Uploaded by another worker: only this worker's registry does not know it yet
+    sheet.spreadsheet.worksheets["Sessions"].rows.append(["NEW_1", "New", "2030-01-01", "2", "5", "", "open"])
+
+    assert lookup_session("NEW_1") is None
+    monkeypatch.setattr("utils.sheet_utils.SESSIONS_FORCED_RELOAD_SECONDS", 0)
+    monkeypatch.setattr("utils.sheet_utils.UNKNOWN_SESSION_TTL_SECONDS", 0)
+    registry.mark_unknown("NEW_1", 0)
+    assert lookup_session("NEW_1")["session_name"] == "New"
+
+
+def test_reload_is_limited_per_id_and_overall():
+    registry = SessionRegistry()
+    assert registry.should_reload_for("A", 30, 5) is True
+    registry.load({})
+    assert registry.should_reload_for("B", 30, 5) is False
+    assert registry.should_reload_for("B", 30, 0) is True
+    assert registry.should_reload_for("B", 30, 0) is False
@@ -0,0 +1,165 @@
+"""JournaledQueue: leases, retries on transient errors, and dead letters for the rest."""
+import pytest
+
+from utils.rate_limiter import SheetsBusy, WriteUncertain
+from utils.write_queue import JournaledQueue, PartialWrite, is_retryable
+
+
+class APIError(Exception):
+    """Stand-in for gspread's APIError, which carries the HTTP status as .code."""
+
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class Sink:
+    """flush_fn that records what it wrote and fails on chosen items."""
+
+    def __init__(self):
+        self.written = []
+        self.fail_on = {}   # item "n" -> exception to raise whenever a batch contains it
+
+    def __call__(self, items):
+        for item in items:
+            if item["n"] in self.fail_on:
+                raise self.fail_on[item["n"]]
+        self.written.extend(item["n"] for item in items)
+
+
+@pytest.fixture
+def sink():
+    return Sink()
+
+
+@pytest.fixture
+def queue(tmp_path, sink):
+    return JournaledQueue("test", sink, flush_interval_ms=3600000, max_items=1000,
+                          journal_path=str(tmp_path / "journal.db"))
+
+
+def test_flush_writes_in_order_and_empties_the_journal(queue, sink):
+    queue.enqueue_many([{"n": n} for n in range(5)])
+    assert queue.pending() == 5
+    assert queue.flush() is True
+    assert sink.written == [0, 1, 2, 3, 4]
+    assert queue.stats()["depth"] == 0
+    assert queue.stats()["flushed_total"] == 5
+
+
+@pytest.mark.parametrize("error", [APIError(429), APIError(503), SheetsBusy("busy"), ConnectionError("reset")])
+def test_retryable_failure_keeps_the_batch(queue, sink, error):
+    assert is_retryable(error)
+    queue.enqueue_many([{"n": n} for n in range(3)])
+    sink.fail_on[1] = error
+    assert queue.flush() is False
+    assert sink.written == []
+    stats = queue.stats()
+    assert (stats["depth"], stats["dead_letters"], stats["consecutive_failures"]) == (3, 0, 1)
+
+    del sink.fail_on[1]
+    assert queue.flush() is True
+    assert sink.written == [0, 1, 2]
+    assert queue.stats()["consecutive_failures"] == 0
+
+
+@pytest.mark.parametrize("error", [APIError(400), RuntimeError("Master_Attendance is missing columns")])
+def test_non_retryable_item_is_dead_lettered_alone(queue, sink, error):
+    assert not is_retryable(error)
+    queue.enqueue_many([{"n": n} for n in range(8)])
+    sink.fail_on[5] = error
+    assert queue.flush() is True
+    assert sink.written == [0, 1, 2, 3, 4, 6, 7]
+
+    dead = queue.dead_letters()
+    assert [d["payload"] for d in dead] == [{"n": 5}]
+    assert str(error) in dead[0]["error"]
+    stats = queue.stats()
+    assert (stats["depth"], stats["dead_letters"]) == (0, 1)
+    assert stats["last_dead_letter_at"] is not None
+
+    # The poisoned item no longer blocks later writes
+    queue.enqueue({"n": 8})
+    assert queue.flush() is True
+    assert sink.written[-1] == 8
+
+
+def test_claimed_batch_is_leased_to_one_flusher(tmp_path, sink, monkeypatch):
+    path = str(tmp_path / "journal.db")
+    first = JournaledQueue("shared", sink, flush_interval_ms=3600000, journal_path=path)
+    second = JournaledQueue("shared", sink, flush_interval_ms=3600000, journal_path=path)
+    first.enqueue_many([{"n": n} for n in range(3)])
+
+    batch = first._claim()
+    assert len(batch) == 3
+    # Another worker sharing the journal does not get rows under a live lease
+    assert second._claim() == []
+
+    # ...but takes them over once the lease has run out (the first worker died mid-flush)
+    monkeypatch.setattr("utils.write_queue.CLAIM_LEASE_SECONDS", -1)
+    assert second.flush() is True
+    assert sink.written == [0, 1, 2]
+    assert first.pending() == 0
+
+
+def test_queues_sharing_a_journal_stay_separate(tmp_path, sink):
+    path = str(tmp_path / "journal.db")
+    marks = JournaledQueue("marks", sink, flush_interval_ms=3600000, journal_path=path)
+    other = JournaledQueue("other", Sink(), flush_interval_ms=3600000, journal_path=path)
+    marks.enqueue({"n": 1})
+    other.enqueue({"n": 2})
+    assert marks.flush() is True
+    assert sink.written == [1]
+    assert other.pending() == 1
+
+
+def test_uncertain_append_is_dead_lettered_without_a_resend(tmp_path):
+    calls = []
+
+    def append(items):
+        calls.append([item["n"] for item in items])
+        raise WriteUncertain("append_rows failed (read timed out); it may have been applied")
+
+    queue = JournaledQueue("appends", append, flush_interval_ms=3600000, journal_path=str(tmp_path / "j.db"))
+    queue.enqueue_many([{"n": n} for n in range(4)])
+    assert not is_retryable(WriteUncertain("x"))
+    assert queue.flush() is True
+    # Sent once, never bisected or retried: the rows may already be in the sheet
+    assert calls == [[0, 1, 2, 3]]
+    assert [d["payload"]["n"] for d in queue.dead_letters()] == [0, 1, 2, 3]
+    assert queue.pending() == 0
+
+
+def _runs(fail):
+    """flush_fn writing items in runs of two; `fail` maps a run's first item to its exception."""
+    written = []
+
+    def flush(items):
+        for start in range(0, len(items), 2):
+            run = items[start:start + 2]
+            if run[0]["n"] in fail:
+                raise PartialWrite(start, len(run), fail.pop(run[0]["n"]))
+            written.extend(item["n"] for item in run)
+
+    return flush, written
+
+
+def test_partial_write_is_not_repeated_on_retry(tmp_path):
+    flush, written = _runs({2: APIError(429)})
+    queue = JournaledQueue("runs", flush, flush_interval_ms=3600000, journal_path=str(tmp_path / "j.db"))
+    queue.enqueue_many([{"n": n} for n in range(6)])
+    assert queue.flush() is False
+    assert written == [0, 1]
+    assert queue.pending() == 4
+
+    assert queue.flush() is True
+    assert written == [0, 1, 2, 3, 4, 5]
+
+
+def test_partial_write_dead_letters_only_the_failed_run(tmp_path):
+    flush, written = _runs({2: WriteUncertain("append_rows failed (503)")})
+    queue = JournaledQueue("runs", flush, flush_interval_ms=3600000, journal_path=str(tmp_path / "j.db"))
+    queue.enqueue_many([{"n": n} for n in range(6)])
+    assert queue.flush() is True
+    assert written == [0, 1, 4, 5]
+    assert [d["payload"]["n"] for d in queue.dead_letters()] == [2, 3]
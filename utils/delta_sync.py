@@ -0,0 +1,265 @@
+"""
+Incremental reconciliation between Google Sheets and local state (SQLite store / roster index).
+
+For each tab the sync remembers how many rows it has seen and, per row, a hash of the
+"static" cells and of the cells check-ins change (Attendance, Timestamp). A regular pass reads:
+  - only rows appended since the last pass, and
+  - only the Attendance..Timestamp columns of rows already seen (Master_Feedback is append-only,
+    so it needs no re-read at all),
+and hands rows whose hashes differ to the storage backend. Every SYNC_FULL_VERIFY_SECONDS a
+full read re-hashes everything, catching edits to other columns and deleted rows.
+
+Local -> sheet changes are not pushed from here: they already travel as deltas through the
+write-behind queues (marks, feedback rows, SQLite exports).
+
+Conflict rule for Attendance/Timestamp (e.g. an admin clears a "Present" cell):
+  - while a local mark for that person is still queued for the sheet, the local value wins
+    (the sheet simply has not received it yet);
+  - otherwise the sheet wins, including clears: a mark that already reached the sheet and was
+    then removed by hand stays removed locally.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from utils.rate_limiter import at_priority, BACKGROUND
+from utils.roster_index import normalize_email
+from utils.sheet_utils import column_letter, get_worksheet, mark_queue, sheets_export_queue
+from utils.storage import ATTENDANCE_HEADER, FEEDBACK_HEADER, get_storage
+
+# ✅ Run a delta sync every N seconds in the background (0 = only on demand via /admin/sync)
+SYNC_INTERVAL_SECONDS = int(os.getenv("SYNC_INTERVAL_SECONDS", "0"))
+# ✅ Full re-read and re-hash at most this often (catches deletes and edits outside Attendance)
+SYNC_FULL_VERIFY_SECONDS = int(os.getenv("SYNC_FULL_VERIFY_SECONDS", "3600"))
+# ✅ Sync bookkeeping (row counts and hashes), shared by every worker on the host
+SYNC_STATE_PATH = os.getenv("SYNC_STATE_PATH", "sync_state.db")
+
+# A pass whose worker died is taken over after this many seconds
+SYNC_LEASE_SECONDS = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_tabs (
+    tab TEXT PRIMARY KEY, header TEXT NOT NULL, synced_rows INTEGER NOT NULL,
+    synced_at REAL NOT NULL, verified_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_rows (
+    tab TEXT NOT NULL, row INTEGER NOT NULL, session_id TEXT NOT NULL, email TEXT NOT NULL,
+    static_hash TEXT NOT NULL, mutable_hash TEXT NOT NULL,
+    PRIMARY KEY (tab, row)
+);
+CREATE TABLE IF NOT EXISTS sync_lease (
+    name TEXT PRIMARY KEY, owner TEXT NOT NULL, until REAL NOT NULL
+);
+"""
+
+
+def _hash(values):
+    return hashlib.blake2b("\x1f".join(values).encode(), digest_size=8).hexdigest()
+
+
+# -------------------- Per-Tab Delta Tracking --------------------
+class TabSync:
+    """Row-count + per-row-hash tracking for one tab. `mutable` columns are re-read every pass."""
+
+    def __init__(self, title, header, key_columns, mutable=()):
+        self.title = title
+        self.default_header = header
+        self.key_columns = key_columns   # (session id column, email column)
+        self.mutable = list(mutable)
+
+    def state(self, db):
+        row = db.execute("SELECT header, synced_rows, verified_at FROM sync_tabs WHERE tab = ?",
+                         (self.title,)).fetchone()
+        if row is None:
+            return self.default_header, 0, 0.0
+        return json.loads(row[0]), row[1], row[2]
+
+    def _split(self, header, values):
+        """Return (key, static hash, mutable hash, {name: value}) for one sheet row."""
+        values = values + [""] * (len(header) - len(values))
+        named = dict(zip(header, values))
+        mutable_values = [named.get(c, "") for c in self.mutable]
+        static_values = [v for name, v in named.items() if name not in self.mutable]
+        key = (named.get(self.key_columns[0], ""), normalize_email(named.get(self.key_columns[1], "")))
+        return key, _hash(static_values), _hash(mutable_values), named
+
+    def pull(self, db, ws, full):
+        """Read what changed on the sheet. Returns {"appended": [...], "changed": [...], "full": bool}."""
+        header, synced_rows, verified_at = self.state(db)
+        now = time.time()
+        full = full or synced_rows == 0
+        appended, changed = [], []
+        known = {row: (static, mutable) for row, static, mutable in db.execute(
+            "SELECT row, static_hash, mutable_hash FROM sync_rows WHERE tab = ?", (self.title,))}
+
+        if full:
+            values = ws.get_all_values()
+            header = values[0] if values else header
+            rows = list(enumerate(values[1:], start=2))
+            db.execute("DELETE FROM sync_rows WHERE tab = ? AND row > ?", (self.title, len(values)))
+            total_rows = len(values)
+            verified_at = now
+        else:
+            mutable_idx = [header.index(c) for c in self.mutable if c in header]
+            if mutable_idx and synced_rows > 1:
+                first, last = min(mutable_idx), max(mutable_idx)
+                cells = ws.get(f"{column_letter(first)}2:{column_letter(last)}{synced_rows}")
+                for offset in range(synced_rows - 1):
+                    row = offset + 2
+                    current = cells[offset] if offset < len(cells) else []
+                    current = current + [""] * (last - first + 1 - len(current))
+                    named = dict(zip(header[first:last + 1], current))
+                    mutable_hash = _hash([named.get(c, "") for c in self.mutable])
+                    if row in known and known[row][1] != mutable_hash:
+                        key = db.execute("SELECT session_id, email FROM sync_rows WHERE tab = ? AND row = ?",
+                                         (self.title, row)).fetchone()
+                        partial = {self.key_columns[0]: key[0], self.key_columns[1]: key[1]}
+                        partial.update({c: named.get(c, "") for c in self.mutable})
+                        changed.append({"row": row, "values": partial})
+                        db.execute("UPDATE sync_rows SET mutable_hash = ? WHERE tab = ? AND row = ?",
+                                   (mutable_hash, self.title, row))
+            tail = ws.get(f"A{synced_rows + 1}:{column_letter(len(header) - 1)}")
+            rows = list(enumerate(tail, start=synced_rows + 1))
+            total_rows = synced_rows + len(rows)
+
+        for row, values in rows:
+            key, static_hash, mutable_hash, named = self._split(header, values)
+            if known.get(row) == (static_hash, mutable_hash):
+                continue
+            (appended if row > synced_rows else changed).append({"row": row, "values": named})
+            db.execute("INSERT OR REPLACE INTO sync_rows (tab, row, session_id, email, static_hash, mutable_hash)"
+                       " VALUES (?, ?, ?, ?, ?, ?)", (self.title, row, key[0], key[1], static_hash, mutable_hash))
+
+        db.execute("INSERT OR REPLACE INTO sync_tabs (tab, header, synced_rows, synced_at, verified_at)"
+                   " VALUES (?, ?, ?, ?, ?)", (self.title, json.dumps(header), total_rows, now, verified_at))
+        return {"appended": appended, "changed": changed, "full": full}
+
+
+def record_pushed(tab, cells, path=SYNC_STATE_PATH):
+    """
+    Called by the write-behind flushers after they write mutable cells ({row: [values in
+    TabSync.mutable order]}). Keeps the sync's hashes in step with our own writes, so the next
+    pass neither re-reports them nor misses an admin clearing them afterwards.
+    """
+    if not os.path.exists(path):
+        return  # delta sync has never run here
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            conn.executemany("UPDATE sync_rows SET mutable_hash = ? WHERE tab = ? AND row = ?",
+                             [(_hash(values), tab, row) for row, values in cells.items()])
+    finally:
+        conn.close()
+
+
+# -------------------- Sync Engine --------------------
+class DeltaSync:
+    """Runs TabSync for both tabs and folds the deltas into the storage backend."""
+
+    def __init__(self, path=SYNC_STATE_PATH):
+        self.path = path
+        self.owner = uuid.uuid4().hex
+        self.attendance = TabSync("Master_Attendance", ATTENDANCE_HEADER, ("Session ID", "Official Email"),
+                                  mutable=("Attendance", "Timestamp"))
+        self.feedback = TabSync("Master_Feedback", FEEDBACK_HEADER, ("Session ID", "Email"))
+        self._thread = None
+        self._pid = None
+        self.last_result = None
+
+    def _db(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _take_lease(self, db):
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        row = db.execute("SELECT owner, until FROM sync_lease WHERE name = 'sync'").fetchone()
+        if row is not None and row[0] != self.owner and row[1] > now:
+            db.execute("ROLLBACK")
+            return False
+        db.execute("INSERT OR REPLACE INTO sync_lease (name, owner, until) VALUES ('sync', ?, ?)",
+                   (self.owner, now + SYNC_LEASE_SECONDS))
+        db.execute("COMMIT")
+        return True
+
+    @staticmethod
+    def _in_flight():
+        """(session_id, email) of marks still waiting in a write-behind queue."""
+        pending = mark_queue.pending_items() + [
+            item for item in sheets_export_queue.pending_items() if item.get("op") == "mark"
+        ]
+        return {(item["session_id"], normalize_email(item["email"])) for item in pending}
+
+    @at_priority(BACKGROUND)
+    def run(self, full=False):
+        """One sync pass. Returns a summary, or None if another worker is already syncing."""
+        import gspread
+        started = time.perf_counter()
+        db = self._db()
+        try:
+            if not self._take_lease(db):
+                return None
+            results = {}
+            for tab in (self.attendance, self.feedback):
+                try:
+                    ws = get_worksheet(tab.title)
+                except gspread.exceptions.WorksheetNotFound:
+                    continue
+                _, _, verified_at = tab.state(db)
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    results[tab.title] = tab.pull(
+                        db, ws, full or time.time() - verified_at >= SYNC_FULL_VERIFY_SECONDS
+                    )
+                    db.execute("COMMIT")
+                except Exception:
+                    db.execute("ROLLBACK")
+                    raise
+
+            storage = get_storage()
+            att = results.get("Master_Attendance")
+            if att and (att["appended"] or att["changed"]):
+                storage.apply_sheet_attendance(att["appended"] + att["changed"], self._in_flight())
+            fb = results.get("Master_Feedback")
+            if fb and fb["appended"]:
+                storage.apply_sheet_feedback(
+                    [[c["values"].get(name, "") for name in FEEDBACK_HEADER] for c in fb["appended"]]
+                )
+            db.execute("DELETE FROM sync_lease WHERE name = 'sync' AND owner = ?", (self.owner,))
+        finally:
+            db.close()
+
+        self.last_result = {
+            "seconds": round(time.perf_counter() - started, 3),
+            "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            **{title: {"appended": len(r["appended"]), "changed": len(r["changed"]), "full": r["full"]}
+               for title, r in results.items()},
+        }
+        print(f"✅ Delta sync: {self.last_result}")
+        return self.last_result
+
+    def ensure_started(self, interval=SYNC_INTERVAL_SECONDS):
+        """Start the periodic background pass (no-op when interval is 0; restarts after fork)."""
+        if interval <= 0 or (self._thread is not None and self._pid == os.getpid()):
+            return
+        self._pid = os.getpid()
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.run()
+                except Exception as e:
+                    print(f"⚠️ Delta sync failed ({e}); will retry in {interval}s")
+
+        self._thread = threading.Thread(target=loop, name="delta-sync", daemon=True)
+        self._thread.start()
+
+
+delta_sync = DeltaSync()
@@ -0,0 +1,172 @@
+import csv
+import io
+import os
+import re
+import tempfile
+
+from utils.storage import ATTENDANCE_HEADER, FEEDBACK_HEADER, get_storage, rows_fingerprint
+
+# ✅ Export column layout (same as master_attendance.xlsx / master_feedback.xlsx)
+EXPORT_ATTENDANCE_HEADER = [
+    "Timestamp", "Session ID", "Session Name", "Session Date",
+    "Employee Name", "Official Email", "Phone", "Attendance"
+]
+EXPORT_FEEDBACK_HEADER = list(FEEDBACK_HEADER)
+# ✅ Rendered exports are kept here, one file per (session, content version, format)
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", "export_cache")
+# Bytes handed to the WSGI server per chunk
+STREAM_CHUNK_BYTES = 64 * 1024
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+# tab -> (storage header, export header, XLSX sheet title)
+EXPORT_TABS = {
+    "attendance": (ATTENDANCE_HEADER, EXPORT_ATTENDANCE_HEADER, "Attendance"),
+    "feedback": (FEEDBACK_HEADER, EXPORT_FEEDBACK_HEADER, "Feedback"),
+}
+
+# Version of a session with no attendance or feedback rows at all (i.e. an unknown session)
+_EMPTY_VERSION = rows_fingerprint([ATTENDANCE_HEADER], [FEEDBACK_HEADER])
+
+
+# -------------------- Row Layout --------------------
+def _relayout(rows, tab):
+    """Yield the data rows of `rows` (storage order, header first) in the export column order."""
+    source, target, _ = EXPORT_TABS[tab]
+    positions = [source.index(name) if name in source else None for name in target]
+    rows = iter(rows)
+    next(rows, None)
+    for row in rows:
+        yield ["" if i is None or i >= len(row) or row[i] is None else str(row[i]) for i in positions]
+
+
+def _csv_chunks(rows, tab):
+    """Encode rows as CSV, yielding roughly STREAM_CHUNK_BYTES at a time."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_TABS[tab][1])
+    for row in _relayout(rows, tab):
+        writer.writerow(row)
+        if buf.tell() >= STREAM_CHUNK_BYTES:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+# -------------------- Export Cache --------------------
+def _safe_name(session_id):
+    return re.sub(r"[^A-Za-z0-9_-]", "_", session_id)
+
+
+def _cache_path(session_id, version, variant):
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    return os.path.join(EXPORT_CACHE_DIR, f"{_safe_name(session_id)}.{version}.{variant}")
+
+
+def _prune(path):
+    """Remove older versions of the same session/variant once `path` is published."""
+    directory, name = os.path.split(path)
+    prefix, variant = name.split(".", 1)[0] + ".", name.split(".", 2)[2]
+    for other in os.listdir(directory):
+        if other != name and other.startswith(prefix) and other.endswith("." + variant):
+            try:
+                os.remove(os.path.join(directory, other))
+            except OSError:
+                pass
+
+
+def _stream_file(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(STREAM_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _tee_to_cache(chunks, path):
+    """Yield `chunks` while writing them to `path`; the file is only published once complete."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    published = False
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(tmp, path)
+        published = True
+        _prune(path)
+    finally:
+        # Client went away mid-download (or the read failed): drop the partial copy
+        if not published:
+            os.remove(tmp)
+
+
+def _write_xlsx(tables, path):
+    """Render both tabs with openpyxl's write-only mode (rows go straight to disk) and publish."""
+    from openpyxl import Workbook
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    os.close(fd)
+    try:
+        wb = Workbook(write_only=True)
+        for tab, (_, header, title) in EXPORT_TABS.items():
+            ws = wb.create_sheet(title)
+            ws.append(header)
+            for row in _relayout(tables[tab], tab):
+                ws.append(row)
+        wb.save(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    _prune(path)
+
+
+def _xlsx_chunks(tables, path):
+    if not os.path.exists(path):
+        _write_xlsx(tables, path)
+    yield from _stream_file(path)
+
+
+# -------------------- Session Export --------------------
+def prepare_export(session_id, fmt="xlsx", tab="attendance", if_none_match=()):
+    """
+    Look up one session's export. Returns None for an unknown session, else
+    {"etag", "filename", "mimetype", "body"} where body is a generator of bytes: the cached
+    file when this content version was rendered before, otherwise rendered on the fly
+    (and cached). CSV holds one tab; XLSX holds both. body is None when the etag is in
+    `if_none_match` (the caller answers 304). The store is only read when the backend cannot
+    vouch for its last version (export_version), or when that version must be sent but was
+    never rendered here.
+    """
+    storage = get_storage()
+    variant = f"{tab}.csv" if fmt == "csv" else "xlsx"
+    version, tables = storage.export_version(session_id), None
+    known = version is not None and (f"{version}.{variant}" in if_none_match
+                                     or os.path.exists(_cache_path(session_id, version, variant)))
+    if version != _EMPTY_VERSION and not known:
+        version, tables = storage.export_tables(session_id)
+    if version == _EMPTY_VERSION:
+        return None
+
+    etag = f"{version}.{variant}"
+    path = _cache_path(session_id, version, variant)
+    if etag in if_none_match:
+        body = None
+    elif tables is None or os.path.exists(path):
+        body = _stream_file(path)
+    elif fmt == "csv":
+        body = _tee_to_cache(_csv_chunks(tables[tab], tab), path)
+    else:
+        body = _xlsx_chunks(tables, path)
+
+    return {
+        "etag": etag,
+        "filename": f"{_safe_name(session_id)}_{tab}.csv" if fmt == "csv" else f"{_safe_name(session_id)}.xlsx",
+        "mimetype": EXPORT_FORMATS[fmt],
+        "body": body,
+    }
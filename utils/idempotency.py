@@ -0,0 +1,260 @@
+"""
+Idempotent form submissions: a double-tapped Submit or a rescanned QR replays the first
+response instead of running the lookup/mark/append again.
+
+Each submission is keyed on (route, session_id, normalized email, hash of the form payload);
+the marks in an offline check-in batch are keyed on (session_id, email) alone.
+The first request reserves the key, runs, and stores its response for IDEMPOTENCY_TTL_SECONDS.
+Repeats inside that window get the stored response without any Sheets call; a repeat that
+arrives while the first is still running waits for its result. Only successful (2xx)
+responses are stored: errors and rejections release the key so a retry runs normally.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils.roster_index import ROSTER_CACHE_PATH, REDIS_URL, normalize_email
+from utils.serving import HAS_REDIS, ROSTER_CACHE
+from utils.sqlite_local import ThreadLocalSQLite
+
+# ✅ How long a submission's response is replayed to identical repeats
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+# ✅ Where keys live: memory / sqlite / redis (defaults to the roster cache's choice, so
+#    every gunicorn worker sees the same keys whenever the roster index is shared)
+IDEMPOTENCY_STORE = os.getenv("IDEMPOTENCY_STORE", ROSTER_CACHE)
+IDEMPOTENCY_PATH = os.getenv("IDEMPOTENCY_PATH", ROSTER_CACHE_PATH)
+# How long a repeat waits for the first request to finish before giving up
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "5"))
+
+# A reservation whose request died is taken over after this many seconds
+PENDING_LEASE_SECONDS = 60
+
+# Results of begin()
+NEW, PENDING, DONE = "new", "pending", "done"
+
+# Form fields that differ between otherwise identical submissions
+_VOLATILE_FIELDS = {"lookup_token"}
+
+
+def submission_key(route, session_id, email, payload):
+    """Key for one submission: route + session + normalized email + hash of the remaining form fields."""
+    fields = {k: v for k, v in (payload or {}).items() if k not in _VOLATILE_FIELDS}
+    digest = hashlib.blake2b(json.dumps(fields, sort_keys=True, default=str).encode(), digest_size=12)
+    return f"{route}|{session_id}|{normalize_email(email)}|{digest.hexdigest()}"
+
+
+# -------------------- In-Process Store --------------------
+class IdempotencyStore:
+    """
+    TTL map of submission key -> stored response ({"status": int, "body": ...}).
+    begin() reserves a key atomically: exactly one caller gets NEW for a given key.
+    This class keeps everything in process memory; the SQLite and Redis stores share keys
+    between gunicorn workers.
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}   # key -> (expires at, response or None while pending)
+
+    def begin(self, key):
+        """Return (NEW, None) if the caller now owns `key`, (PENDING, None) or (DONE, response)."""
+        now = time.time()
+        with self._lock:
+            if len(self._entries) > 10000:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return (DONE, entry[1]) if entry[1] is not None else (PENDING, None)
+            self._entries[key] = (now + PENDING_LEASE_SECONDS, None)
+            return NEW, None
+
+    def complete(self, key, response):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, response)
+
+    def release(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+# -------------------- Shared Store: SQLite --------------------
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY, response TEXT, expires REAL NOT NULL
+);
+"""
+
+
+class SQLiteIdempotencyStore:
+    """IdempotencyStore in a SQLite file shared by every worker on the host."""
+
+    def __init__(self, path=IDEMPOTENCY_PATH, ttl=IDEMPOTENCY_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._conns = ThreadLocalSQLite(path, _SQLITE_SCHEMA, isolation_level=None)
+        self._purged_at = 0.0
+
+    def _db(self):
+        return self._conns.connection()
+
+    def begin(self, key):
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if now - self._purged_at > 60:
+                db.execute("DELETE FROM idempotency WHERE expires < ?", (now,))
+                self._purged_at = now
+            row = db.execute("SELECT response, expires FROM idempotency WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                result = (DONE, json.loads(row[0])) if row[0] is not None else (PENDING, None)
+            else:
+                db.execute("INSERT OR REPLACE INTO idempotency (key, response, expires) VALUES (?, NULL, ?)",
+                           (key, now + PENDING_LEASE_SECONDS))
+                result = (NEW, None)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return result
+
+    def complete(self, key, response):
+        self._db().execute("INSERT OR REPLACE INTO idempotency (key, response, expires) VALUES (?, ?, ?)",
+                           (key, json.dumps(response), time.time() + self.ttl))
+
+    def release(self, key):
+        self._db().execute("DELETE FROM idempotency WHERE key = ?", (key,))
+
+
+# -------------------- Shared Store: Redis --------------------
+class RedisIdempotencyStore:
+    """IdempotencyStore on Redis: SET NX reserves a key, and Redis expiry does the cleanup."""
+
+    _PENDING = "__pending__"
+
+    def __init__(self, client, ttl=IDEMPOTENCY_TTL_SECONDS, prefix="idem:"):
+        self.redis = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url=REDIS_URL, **kwargs):
+        if not HAS_REDIS:
+            raise RuntimeError("IDEMPOTENCY_STORE=redis needs the `redis` package (pip install redis)")
+        import redis
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    def begin(self, key):
+        if self.redis.set(self.prefix + key, self._PENDING, nx=True, ex=PENDING_LEASE_SECONDS):
+            return NEW, None
+        raw = self.redis.get(self.prefix + key)
+        if raw is None:
+            # Expired between the two calls; try once more
+            return self.begin(key)
+        return (PENDING, None) if raw == self._PENDING else (DONE, json.loads(raw))
+
+    def complete(self, key, response):
+        self.redis.set(self.prefix + key, json.dumps(response), ex=self.ttl)
+
+    def release(self, key):
+        self.redis.delete(self.prefix + key)
+
+
+def make_idempotency_store(kind=IDEMPOTENCY_STORE):
+    """Build the store selected by IDEMPOTENCY_STORE (memory / sqlite / redis)."""
+    if kind == "redis":
+        return RedisIdempotencyStore.from_url()
+    if kind == "sqlite":
+        return SQLiteIdempotencyStore()
+    return IdempotencyStore()
+
+
+# -------------------- Submission Guard --------------------
+class SubmissionGuard:
+    """Runs a submission at most once per key and counts the repeats it absorbed (per route)."""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self.absorbed = {}   # route -> repeats answered from the store
+
+    def _absorb(self, route):
+        with self._lock:
+            self.absorbed[route] = self.absorbed.get(route, 0) + 1
+
+    def run(self, route, key, handler, wait=IDEMPOTENCY_WAIT_SECONDS):
+        """
+        Return (response, replayed). `handler()` returns {"status": int, "body": ...} and only
+        runs for the first submission of `key`; non-2xx responses and exceptions are not stored.
+        A repeat still PENDING after `wait` seconds gets None.
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            state, response = self.store.begin(key)
+            if state == DONE:
+                self._absorb(route)
+                return response, True
+            if state == NEW:
+                break
+            if time.monotonic() >= deadline:
+                self._absorb(route)
+                return None, True
+            time.sleep(0.05)
+
+        try:
+            response = handler()
+        except BaseException:
+            self.store.release(key)
+            raise
+        if not 200 <= response["status"] < 300:
+            self.store.release(key)
+        else:
+            self.store.complete(key, response)
+        return response, False
+
+    def run_batch(self, route, keys, handler):
+        """
+        Batch form of run() for independent items: `keys` has one key per item, and
+        `handler(indices)` gets the positions of the items seen for the first time and returns
+        their responses in that order. Returns [(response, replayed)] in input order. Items
+        another request is still running get None straight away (no waiting), and a key
+        repeated within the batch shares the response of its first occurrence.
+        """
+        results = [None] * len(keys)
+        first_at, fresh = {}, []
+        for i, key in enumerate(keys):
+            if key in first_at:
+                continue
+            first_at[key] = i
+            state, response = self.store.begin(key)
+            if state == NEW:
+                fresh.append(i)
+            else:
+                self._absorb(route)
+                results[i] = (response, True)
+
+        try:
+            responses = handler(fresh) if fresh else []
+        except BaseException:
+            for i in fresh:
+                self.store.release(keys[i])
+            raise
+        for i, response in zip(fresh, responses):
+            if not 200 <= response["status"] < 300:
+                self.store.release(keys[i])
+            else:
+                self.store.complete(keys[i], response)
+            results[i] = (response, False)
+
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                self._absorb(route)
+                results[i] = (results[first_at[key]][0], True)
+        return results
+
+
+# Process-wide guard for /submit_attendance, /submit_feedback and /submit_attendance_batch
+submission_guard = SubmissionGuard(make_idempotency_store())
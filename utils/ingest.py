@@ -0,0 +1,104 @@
+import importlib.util
+import os
+
+import pandas as pd
+
+from utils.storage import ATTENDANCE_HEADER
+
+# Optional fast engines: python-calamine (Rust) for Excel, pyarrow for CSV
+_HAS_CALAMINE = importlib.util.find_spec("python_calamine") is not None
+_HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# Roster headers people actually type, mapped onto the Master_Attendance contract
+_COLUMN_ALIASES = {
+    "email": "Official Email",
+    "email id": "Official Email",
+    "official email id": "Official Email",
+    "emp code": "Employee Code",
+    "employee id": "Employee Code",
+    "name": "Employee Name",
+    "emp name": "Employee Name",
+    "business unit": "Business",
+}
+_CONTRACT_COLUMNS = {name.lower(): name for name in ATTENDANCE_HEADER}
+
+
+# -------------------- Readers --------------------
+def _read_csv(path):
+    if _HAS_PYARROW:
+        return pd.read_csv(path, engine="pyarrow", dtype=str).fillna("")
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def _read_excel(path):
+    engine = "calamine" if _HAS_CALAMINE else None
+    return pd.read_excel(path, engine=engine, dtype=str, keep_default_na=False)
+
+
+# Reader per file extension; every reader returns all cells as strings with blanks as ""
+ROSTER_READERS = {
+    ".csv": _read_csv,
+    ".xlsx": _read_excel,
+    ".xlsm": _read_excel,
+    ".xls": _read_excel,
+}
+
+
+def read_roster(path):
+    """Read a roster file with the fastest engine available for its type."""
+    ext = os.path.splitext(path)[1].lower()
+    reader = ROSTER_READERS.get(ext)
+    if reader is None:
+        raise ValueError(f"Unsupported roster file type '{ext}' (use .xlsx or .csv)")
+    return reader(path)
+
+
+# -------------------- Normalization --------------------
+def normalize_roster(df):
+    """
+    Clean a raw roster in vectorized passes:
+    column names stripped and mapped onto the contract, emails stripped and lower-cased,
+    rows without an email dropped, and duplicate emails removed (first one wins).
+    Returns (df, stats).
+    """
+    stripped = df.columns.astype(str).str.strip()
+    lowered = stripped.str.lower()
+    df.columns = [_CONTRACT_COLUMNS.get(low) or _COLUMN_ALIASES.get(low) or name
+                  for name, low in zip(stripped, lowered)]
+    # A roster with both "Email" and "Official Email" keeps the first one
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    if "Official Email" not in df.columns:
+        raise ValueError("Roster must have an 'Official Email' column")
+
+    total = len(df)
+    df = df.astype(str).apply(lambda col: col.str.strip())
+    df["Official Email"] = df["Official Email"].str.lower()
+    df = df[df["Official Email"] != ""]
+    blank = total - len(df)
+    df = df[~df["Official Email"].duplicated(keep="first")]
+    duplicates = total - blank - len(df)
+
+    return df, {"rows_read": total, "blank_emails": blank, "duplicate_emails": duplicates}
+
+
+def build_roster_rows(df, session_id, session_name, session_date):
+    """Lay the roster out in Master_Attendance column order, stamped with the session details."""
+    n = len(df)
+    session_values = {
+        "Session ID": session_id,
+        "Session Name": session_name,
+        "Session Date": session_date,
+        "Attendance": "",
+        "Timestamp": "",
+    }
+    columns = {}
+    for name in ATTENDANCE_HEADER:
+        if name in session_values:
+            columns[name] = [session_values[name]] * n
+        elif name in df.columns:
+            columns[name] = df[name].to_numpy()
+        else:
+            columns[name] = [""] * n
+    return pd.DataFrame(columns, columns=ATTENDANCE_HEADER).values.tolist()
+
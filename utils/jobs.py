@@ -0,0 +1,111 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# ✅ Background admin uploads: a small pool so big rosters never hold a request worker
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+# Job status lives in SQLite so any gunicorn worker can answer a status poll
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "upload_jobs.db")
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+# -------------------- Upload Jobs --------------------
+class JobRunner:
+    """Runs upload jobs on a thread pool and records their progress in a shared SQLite table."""
+
+    def __init__(self, db_path=JOBS_DB_PATH, workers=UPLOAD_WORKERS):
+        self.db_path = db_path
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._conn = None
+        self._conn_pid = None
+
+    def _db(self):
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS upload_jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " state TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " started REAL,"
+                " finished REAL,"
+                " rows_processed INTEGER NOT NULL DEFAULT 0,"
+                " rows_total INTEGER,"
+                " result TEXT,"
+                " error TEXT)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            db = self._db()
+            db.execute(f"UPDATE upload_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+            db.commit()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue fn(*args, progress=..., **kwargs) and return its job ID straight away.
+        fn's return value (a JSON-serializable dict) becomes the job's result.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT INTO upload_jobs (job_id, state, created) VALUES (?, ?, ?)",
+                       (job_id, QUEUED, time.time()))
+            db.commit()
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="upload-job")
+                self._pid = os.getpid()
+            executor = self._executor
+        executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, state=RUNNING, started=time.time())
+
+        def progress(done, total):
+            self._update(job_id, rows_processed=done, rows_total=total)
+
+        try:
+            result = fn(*args, progress=progress, **kwargs)
+        except Exception as e:
+            print(f"❌ Upload job {job_id} failed: {e}")
+            self._update(job_id, state=FAILED, finished=time.time(), error=str(e))
+            return
+        self._update(job_id, state=DONE, finished=time.time(), result=json.dumps(result))
+
+    def status(self, job_id):
+        """Return the job's state, progress, elapsed seconds and result, or None if unknown."""
+        with self._lock:
+            found = self._db().execute(
+                "SELECT state, created, started, finished, rows_processed, rows_total, result, error"
+                " FROM upload_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if found is None:
+            return None
+        state, created, started, finished, rows_processed, rows_total, result, error = found
+        return {
+            "job_id": job_id,
+            "state": state,
+            "rows_processed": rows_processed,
+            "rows_total": rows_total,
+            "elapsed_seconds": round((finished or time.time()) - (started or created), 2),
+            "result": json.loads(result) if result else None,
+            "error": error,
+        }
+
+
+# Process-wide runner for admin uploads
+upload_jobs = JobRunner()
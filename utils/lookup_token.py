@@ -0,0 +1,38 @@
+import os
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from utils.roster_index import normalize_email
+
+# ✅ How long (seconds) a /validate_email result may be reused by /submit_feedback
+LOOKUP_TOKEN_MAX_AGE = int(os.getenv("LOOKUP_TOKEN_MAX_AGE", "1800"))
+
+_SALT = "feedback-roster-lookup"
+
+
+# -------------------- Signed Roster Lookup Token --------------------
+def sign_lookup(secret_key, session_id, email, entry):
+    """Sign the roster entry resolved for (session_id, email) so a later request can reuse it."""
+    payload = {
+        "sid": session_id,
+        "email": normalize_email(email),
+        "row": entry.get("row"),
+        "status": entry.get("status", ""),
+    }
+    return URLSafeTimedSerializer(secret_key, salt=_SALT).dumps(payload)
+
+
+def verify_lookup(secret_key, token, session_id, email, max_age=LOOKUP_TOKEN_MAX_AGE):
+    """
+    Return the roster entry {"row", "status"} carried by `token`, or None if the token is
+    missing, tampered with, expired, or was issued for a different session/email.
+    """
+    if not token:
+        return None
+    try:
+        payload = URLSafeTimedSerializer(secret_key, salt=_SALT).loads(token, max_age=max_age)
+    except BadSignature:  # also covers SignatureExpired
+        return None
+    if payload.get("sid") != session_id or payload.get("email") != normalize_email(email):
+        return None
+    return {"row": payload.get("row"), "status": payload.get("status", "")}
@@ -0,0 +1,51 @@
+import os
+import re
+import tempfile
+
+# ✅ Pre-rendered session QR codes (served by /qr/<filename> with long-lived cache headers)
+QR_FOLDER = os.getenv("QR_FOLDER", "static/qr")
+QR_KINDS = ("attendance", "feedback")
+QR_FORMATS = ("png", "svg")
+
+
+def qr_filename(session_id, kind, fmt):
+    """File name of one session's QR image, e.g. Induction_2025-01-10_AB12_attendance.png."""
+    return f"{re.sub(r'[^A-Za-z0-9_-]', '_', session_id)}_{kind}.{fmt}"
+
+
+def _save_atomic(image, path):
+    # Workers may render the same session at once; readers only ever see complete files
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def generate_session_qr(session_id, urls):
+    """
+    Render the QR code for each {kind: url} (attendance / feedback) as PNG and SVG into
+    QR_FOLDER, once per session. Returns {kind: {fmt: filename}}.
+    """
+    import qrcode
+    from qrcode.image.pure import PyPNGImage
+    from qrcode.image.svg import SvgPathImage
+
+    os.makedirs(QR_FOLDER, exist_ok=True)
+    files = {}
+    for kind, url in urls.items():
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=4)
+        qr.add_data(url)
+        qr.make(fit=True)
+        files[kind] = {}
+        for fmt, factory in (("png", PyPNGImage), ("svg", SvgPathImage)):
+            name = qr_filename(session_id, kind, fmt)
+            path = os.path.join(QR_FOLDER, name)
+            if not os.path.exists(path):
+                _save_atomic(qr.make_image(image_factory=factory), path)
+            files[kind][fmt] = name
+    print(f"✅ QR codes ready for {session_id} in {QR_FOLDER}")
+    return files
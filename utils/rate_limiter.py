@@ -0,0 +1,165 @@
+import contextvars
+import functools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.serving import WEB_CONCURRENCY
+from utils.sheets_metrics import record_retry
+
+# ✅ Sheets API budget for THIS process. Every call is made as one identity (token.json), so the
+#    limit that bites is Google's per-user quota of 60 reads + 60 writes per minute, not the
+#    300/min per-project one; every gunicorn worker shares it, so the default splits it by WEB_CONCURRENCY
+SHEETS_READS_PER_MINUTE = int(os.getenv("SHEETS_READS_PER_MINUTE", str(max(1, 60 // WEB_CONCURRENCY))))
+SHEETS_WRITES_PER_MINUTE = int(os.getenv("SHEETS_WRITES_PER_MINUTE", str(max(1, 60 // WEB_CONCURRENCY))))
+
+# ✅ Priorities: check-in writes first, then interactive page requests, then admin/exports
+CHECKIN = 0
+INTERACTIVE = 1
+BACKGROUND = 2
+
+# Share of the bucket each priority must leave untouched for the ones above it
+RESERVE_FRACTION = {CHECKIN: 0.0, INTERACTIVE: 0.1, BACKGROUND: 0.5}
+# How long a caller may wait for budget before giving up (a user is waiting on INTERACTIVE)
+MAX_WAIT_SECONDS = {
+    CHECKIN: 30.0,
+    INTERACTIVE: float(os.getenv("SHEETS_MAX_WAIT_SECONDS", "1")),
+    BACKGROUND: 120.0,
+}
+# Retries after a 429/5xx: (attempts, base delay, max delay) in seconds.
+# Write-behind queues already retry whole batches, so check-in flushes only retry briefly here.
+RETRY_POLICY = {
+    CHECKIN: (2, 0.5, 4.0),
+    INTERACTIVE: (2, 0.25, 2.0),
+    BACKGROUND: (4, 1.0, 16.0),
+}
+
+READ_OPS = {"open_by_key", "worksheet", "row_values", "get", "batch_get", "get_all_values"}
+# Appends are not idempotent: only retry them when Google definitely rejected the call (429)
+_APPEND_OPS = {"append_row", "append_rows"}
+
+_priority = contextvars.ContextVar("sheets_priority", default=INTERACTIVE)
+
+
+class SheetsBusy(Exception):
+    """The Sheets quota is exhausted (or Google keeps failing); the caller should degrade."""
+
+
+class WriteUncertain(Exception):
+    """An append failed without a definite answer (5xx / timeout): Google may have applied it, so never resend it blindly."""
+
+
+@contextmanager
+def sheets_priority(level):
+    """Run the enclosed Sheets calls at `level` (CHECKIN / INTERACTIVE / BACKGROUND)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def at_priority(level):
+    """Decorator form of sheets_priority (for queue flush functions and admin jobs)."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with sheets_priority(level):
+                return fn(*args, **kwargs)
+        return run
+    return wrap
+
+
+@contextmanager
+def budget_lock(lock):
+    """
+    Hold `lock` around Sheets calls, but give up (SheetsBusy) after the current priority's
+    MAX_WAIT_SECONDS: a request should not queue behind a flush that is backing off on 429s.
+    """
+    if not lock.acquire(timeout=MAX_WAIT_SECONDS[_priority.get()]):
+        raise SheetsBusy("Timed out waiting for another Sheets call")
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+# -------------------- Token Buckets --------------------
+class TokenBucket:
+    """`per_minute` tokens refilled continuously; bursts are capped at half a minute's budget."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 2.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority, timeout):
+        """Take one token, waiting up to `timeout` seconds. Raises SheetsBusy if none frees up."""
+        floor = self.capacity * RESERVE_FRACTION[priority]
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens - 1 >= floor:
+                    self.tokens -= 1
+                    return
+                wait = (floor + 1 - self.tokens) / self.rate if self.rate else timeout
+            if now + wait > deadline:
+                raise SheetsBusy("Sheets API budget exhausted")
+            time.sleep(wait)
+
+    def drain(self):
+        """Google answered 429: our view of the quota was optimistic, so start refilling from empty."""
+        with self._lock:
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+
+
+class SheetsRateLimiter:
+    """Read/write token buckets in front of every Sheets call, with jittered retries."""
+
+    def __init__(self, reads_per_minute=SHEETS_READS_PER_MINUTE, writes_per_minute=SHEETS_WRITES_PER_MINUTE):
+        self.buckets = {"read": TokenBucket(reads_per_minute), "write": TokenBucket(writes_per_minute)}
+
+    def call(self, op, attempt):
+        """Run `attempt()` (one timed Sheets call) under the budget, retrying 429/5xx with backoff."""
+        # Already loaded by whoever built the Sheets handle; kept out of the module imports
+        import gspread
+        import requests
+
+        priority = _priority.get()
+        bucket = self.buckets["read" if op in READ_OPS else "write"]
+        attempts, base, cap = RETRY_POLICY[priority]
+        for n in range(attempts + 1):
+            bucket.acquire(priority, MAX_WAIT_SECONDS[priority])
+            try:
+                return attempt()
+            except gspread.exceptions.APIError as e:
+                code = getattr(e, "code", None)
+                if code == 429:
+                    bucket.drain()
+                elif not (isinstance(code, int) and code >= 500):
+                    raise
+                elif op in _APPEND_OPS:
+                    raise WriteUncertain(f"{op} failed ({e}); it may have been applied") from e
+                if n == attempts:
+                    raise SheetsBusy(f"{op} failed after {attempts} retries ({e})") from e
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if op in _APPEND_OPS:
+                    raise WriteUncertain(f"{op} failed ({e}); it may have been applied") from e
+                if n == attempts:
+                    raise SheetsBusy(f"{op} failed after {attempts} retries ({e})") from e
+            record_retry(op)
+            time.sleep(min(cap, base * (2 ** n)) * random.uniform(0.5, 1.0))
+
+
+sheets_limiter = SheetsRateLimiter()
@@ -0,0 +1,225 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import gspread
+import numpy as np
+import pandas as pd
+
+from utils.rate_limiter import at_priority, BACKGROUND
+from utils.sheet_utils import column_letter, get_worksheet
+from utils.storage import ATTENDANCE_HEADER, FEEDBACK_HEADER
+
+# ✅ Minimum seconds between Sheets refreshes of the report snapshot (reports in between are served from memory)
+REPORT_REFRESH_SECONDS = int(os.getenv("REPORT_REFRESH_SECONDS", "60"))
+# ✅ Rebuild the snapshot from scratch this often, to pick up rows admins deleted or edited by hand
+REPORT_FULL_RELOAD_SECONDS = int(os.getenv("REPORT_FULL_RELOAD_SECONDS", "3600"))
+
+# Rating questions (Q1–Q7) score 5..1; Q8 is the Yes/Maybe/No recommendation
+RATING_SCORES = {"Excellent": 5, "Very Good": 4, "Good": 3, "Fair": 2, "Poor": 1}
+RATING_QUESTIONS = [f"Q{i}" for i in range(1, 8)]
+RECOMMEND_QUESTION = "Q8"
+
+
+# -------------------- Snapshot --------------------
+class _TabSnapshot:
+    """Local copy of one tab plus how many sheet rows (header included) it already holds."""
+
+    def __init__(self, title, header):
+        self.title = title
+        self.default_header = header
+        self.header = header
+        self.rows = []
+        self.synced_rows = 0   # sheet rows covered by self.rows (header row included)
+
+    def reset(self):
+        self.header = self.default_header
+        self.rows = []
+        self.synced_rows = 0
+
+    def frame(self):
+        width = len(self.header)
+        rows = [r[:width] + [""] * (width - len(r)) for r in self.rows]
+        return pd.DataFrame(rows, columns=self.header, dtype=str)
+
+
+class ReportEngine:
+    """
+    Attendance and feedback analytics over a locally cached snapshot of Master_Attendance and
+    Master_Feedback.
+
+    The first refresh reads both tabs; later refreshes fetch only rows appended since the last
+    run, plus the Attendance/Timestamp columns of rows already held (check-ins update those in
+    place). Every REPORT_FULL_RELOAD_SECONDS the snapshot is rebuilt from scratch.
+    Aggregates are vectorized pandas groupbys, recomputed only when the snapshot changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attendance = _TabSnapshot("Master_Attendance", ATTENDANCE_HEADER)
+        self.feedback = _TabSnapshot("Master_Feedback", FEEDBACK_HEADER)
+        self._refreshed_at = 0.0
+        self._full_at = 0.0
+        self._version = 0
+        self._report = None
+        self._report_version = -1
+
+    # ---- snapshot refresh ----
+    @at_priority(BACKGROUND)
+    def refresh(self, force=False):
+        """Bring the snapshot up to date (at most every REPORT_REFRESH_SECONDS unless forced)."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._refreshed_at < REPORT_REFRESH_SECONDS:
+                return False
+            full = force or now - self._full_at >= REPORT_FULL_RELOAD_SECONDS
+            changed = False
+            for tab in (self.attendance, self.feedback):
+                if full:
+                    tab.reset()
+                changed |= self._refresh_tab(tab)
+            if full:
+                self._full_at = now
+            self._refreshed_at = now
+            if changed or full:
+                self._version += 1
+            return changed
+
+    def _refresh_tab(self, tab):
+        try:
+            ws = get_worksheet(tab.title)
+        except gspread.exceptions.WorksheetNotFound:
+            return False
+
+        if tab.synced_rows == 0:
+            values = ws.get_all_values()
+            if values:
+                tab.header = values[0]
+                tab.rows = values[1:]
+            tab.synced_rows = len(values)
+            return bool(values)
+
+        changed = False
+        last_col = column_letter(len(tab.header) - 1)
+        if tab is self.attendance and tab.rows:
+            changed |= self._refresh_attendance_cells(ws, tab)
+
+        appended = ws.get(f"A{tab.synced_rows + 1}:{last_col}")
+        if appended:
+            tab.rows.extend(appended)
+            tab.synced_rows += len(appended)
+            changed = True
+        return changed
+
+    def _refresh_attendance_cells(self, ws, tab):
+        """Re-read the Attendance..Timestamp columns of the rows already in the snapshot."""
+        try:
+            first = tab.header.index("Attendance")
+            last = tab.header.index("Timestamp")
+        except ValueError:
+            return False
+        if last < first:
+            first, last = last, first
+        cells = ws.get(f"{column_letter(first)}2:{column_letter(last)}{tab.synced_rows}")
+        changed = False
+        for i, row in enumerate(tab.rows):
+            current = cells[i] if i < len(cells) else []
+            current = current + [""] * (last - first + 1 - len(current))
+            held = row[first:last + 1]
+            held = held + [""] * (last - first + 1 - len(held))
+            if current != held:
+                row.extend([""] * (last + 1 - len(row)))
+                row[first:last + 1] = current
+                changed = True
+        return changed
+
+    # ---- aggregates ----
+    def report(self, session_id=None):
+        """Refresh if due and return the report dict (optionally narrowed to one session)."""
+        self.refresh()
+        with self._lock:
+            if self._report is None or self._report_version != self._version:
+                self._report = self._compute(self.attendance.frame(), self.feedback.frame())
+                self._report["rows"] = {"attendance": len(self.attendance.rows),
+                                        "feedback": len(self.feedback.rows)}
+                self._report_version = self._version
+            report = dict(self._report)
+        if session_id:
+            report["sessions"] = [s for s in report["sessions"] if s["session_id"] == session_id]
+            report["feedback_distribution"] = report["session_distributions"].get(session_id, {})
+        report.pop("session_distributions")
+        return report
+
+    @staticmethod
+    def _compute(att, fb):
+        for column in ("Session ID", "Session Name", "Session Date", "Business", "Attendance"):
+            if column not in att:
+                att[column] = ""
+        att = att[att["Session ID"] != ""].copy()
+        att["present"] = att["Attendance"].str.strip().str.lower().eq("present")
+        att["Business"] = att["Business"].replace("", "Unspecified")
+
+        def rates(grouped):
+            out = grouped.agg(registered=("present", "size"), present=("present", "sum")).reset_index()
+            out["present"] = out["present"].astype(int)
+            out["attendance_pct"] = np.where(
+                out["registered"] > 0, (100.0 * out["present"] / out["registered"]).round(1), 0.0
+            )
+            return out
+
+        sessions = rates(att.groupby(["Session ID", "Session Name", "Session Date"], sort=False))
+        businesses = rates(att.groupby("Business")).sort_values("attendance_pct", ascending=False)
+        dates = rates(att.groupby("Session Date")).sort_values("Session Date")
+        dates["sessions"] = att.groupby("Session Date")["Session ID"].nunique().reindex(dates["Session Date"]).values
+
+        # Feedback scores: Q1–Q7 mapped to 5..1, Q8 as the share of "Yes"
+        for column in ["Session ID"] + RATING_QUESTIONS + [RECOMMEND_QUESTION]:
+            if column not in fb:
+                fb[column] = ""
+        scores = fb[RATING_QUESTIONS].apply(lambda col: col.map(RATING_SCORES)).astype(float)
+        scores["Session ID"] = fb["Session ID"]
+        scores["recommend"] = fb[RECOMMEND_QUESTION].eq("Yes").astype(float)
+        scores["responses"] = 1
+        per_session = scores.groupby("Session ID").agg(
+            responses=("responses", "sum"),
+            recommend_pct=("recommend", "mean"),
+            **{f"{q.lower()}_avg": (q, "mean") for q in RATING_QUESTIONS},
+        )
+        per_session["recommend_pct"] = (per_session["recommend_pct"] * 100).round(1)
+        per_session = per_session.round(2)
+
+        sessions = sessions.merge(per_session, how="left", left_on="Session ID", right_index=True)
+        sessions["responses"] = sessions["responses"].fillna(0).astype(int)
+        sessions = sessions.sort_values("Session Date", ascending=False)
+
+        # Answer counts per question, overall and per session (long format -> crosstab)
+        answers = fb.melt(id_vars=["Session ID"], value_vars=RATING_QUESTIONS + [RECOMMEND_QUESTION],
+                          var_name="question", value_name="answer")
+        answers = answers[answers["answer"] != ""]
+        overall = pd.crosstab(answers["question"], answers["answer"])
+        by_session = answers.groupby(["Session ID", "question", "answer"]).size()
+
+        session_distributions = {}
+        for (sid, question, answer), count in by_session.items():
+            session_distributions.setdefault(sid, {}).setdefault(question, {})[answer] = int(count)
+
+        def records(df, renames):
+            df = df.rename(columns=renames).astype(object)
+            return df.where(pd.notna(df), None).to_dict(orient="records")
+
+        names = {"Session ID": "session_id", "Session Name": "session_name",
+                 "Session Date": "session_date", "Business": "business"}
+        return {
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "sessions": records(sessions, names),
+            "businesses": records(businesses, names),
+            "dates": records(dates, names),
+            "feedback_distribution": {q: {a: int(n) for a, n in row.items() if n}
+                                      for q, row in overall.iterrows()},
+            "session_distributions": session_distributions,
+        }
+
+
+# Process-wide report engine (one snapshot per worker)
+report_engine = ReportEngine()
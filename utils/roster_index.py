@@ -0,0 +1,356 @@
+import json
+import os
+import threading
+import time
+
+from utils.serving import HAS_REDIS, ROSTER_CACHE
+from utils.sqlite_local import ThreadLocalSQLite
+
+# ✅ How long (seconds) a loaded session roster is trusted before the next lookup reloads it
+ROSTER_TTL_SECONDS = int(os.getenv("ROSTER_TTL_SECONDS", "300"))
+
+# ✅ Where the roster index lives (ROSTER_CACHE, read in utils.serving):
+#    memory -> per process (fine for a single worker; the default with WEB_CONCURRENCY=1)
+#    sqlite -> one file shared by every worker on the host (ROSTER_CACHE_PATH)
+#    redis  -> shared by every worker on every host (REDIS_URL; needs the `redis` package)
+ROSTER_CACHE_PATH = os.getenv("ROSTER_CACHE_PATH", "roster_cache.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Shared copies of a roster are dropped this long after their last load (Redis only)
+ROSTER_CACHE_RETENTION_SECONDS = 24 * 3600
+
+
+def normalize_email(email):
+    """Lower-case and strip an email so lookups match the sheet regardless of typing."""
+    return (email or "").strip().lower()
+
+
+# -------------------- Roster Index --------------------
+class RosterIndex:
+    """
+    In-process index of Master_Attendance keyed by (session_id, normalized email).
+
+    Each entry holds the 1-based sheet row and the current Attendance value.
+    Refresh policy:
+    - A session is loaded from the sheet on its first lookup.
+    - Loaded sessions are served from memory (hits AND misses) for ROSTER_TTL_SECONDS,
+      after which the next lookup reloads them, picking up manual edits to the sheet.
+    - Marks are recorded as claims: claim() flips an entry to Present exactly once, and
+      claims survive reloads while the mark is still queued (the sheet may not show it yet).
+      Once the flusher has written it, settle_claims() drops the claim, so later reloads
+      trust the sheet again (e.g. an admin clearing the cell by hand).
+    - invalidate() drops a session (or everything) immediately.
+
+    This class keeps everything in process memory; SQLiteRosterIndex and RedisRosterIndex
+    implement the same methods on a store shared by all gunicorn workers.
+    """
+
+    def __init__(self, ttl=ROSTER_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._sessions = {}   # session_id -> {email: {"row": int, "status": str}}
+        self._claimed = {}    # session_id -> {email} marked Present since loading
+        self._loaded_at = {}  # session_id -> time.monotonic() of last load
+
+    def is_fresh(self, session_id):
+        with self._lock:
+            loaded_at = self._loaded_at.get(session_id)
+            return loaded_at is not None and (time.monotonic() - loaded_at) < self.ttl
+
+    def load_sessions(self, sessions):
+        """Replace the entries of every session in `sessions` ({session_id: {email: entry}})."""
+        now = time.monotonic()
+        with self._lock:
+            for session_id, entries in sessions.items():
+                self._sessions[session_id] = {email: dict(entry) for email, entry in entries.items()}
+                self._loaded_at[session_id] = now
+
+    def get(self, session_id, email):
+        """Return a copy of the entry for (session_id, email), or None if not on the roster."""
+        email = normalize_email(email)
+        with self._lock:
+            entry = self._sessions.get(session_id, {}).get(email)
+            if not entry:
+                return None
+            entry = dict(entry)
+            if email in self._claimed.get(session_id, ()):
+                entry["status"] = "Present"
+            return entry
+
+    def claim(self, session_id, email):
+        """
+        Atomically mark (session_id, email) Present.
+        Returns True if this call did it, False if it was already Present, None if not indexed.
+        """
+        email = normalize_email(email)
+        with self._lock:
+            entry = self._sessions.get(session_id, {}).get(email)
+            if entry is None:
+                return None
+            claimed = self._claimed.setdefault(session_id, set())
+            if entry["status"].lower() == "present" or email in claimed:
+                return False
+            claimed.add(email)
+            return True
+
+    def settle_claims(self, session_id, emails):
+        """The marks for `emails` reached the sheet: record them as Present and drop their claims."""
+        with self._lock:
+            entries = self._sessions.get(session_id, {})
+            claimed = self._claimed.get(session_id, set())
+            for email in map(normalize_email, emails):
+                if email in entries:
+                    entries[email]["status"] = "Present"
+                claimed.discard(email)
+
+    def refresh_entry(self, session_id, email, entry, keep_claim=False):
+        """
+        Apply a row the sheet sync saw change (or appear) to an indexed session; no-op otherwise.
+        Unless `keep_claim`, a local claim is dropped so the sheet's Attendance value wins.
+        """
+        email = normalize_email(email)
+        with self._lock:
+            if session_id not in self._sessions:
+                return
+            self._sessions[session_id][email] = dict(entry)
+            if not keep_claim:
+                self._claimed.get(session_id, set()).discard(email)
+
+    def invalidate(self, session_id=None):
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+                self._claimed.clear()
+                self._loaded_at.clear()
+            else:
+                self._sessions.pop(session_id, None)
+                self._claimed.pop(session_id, None)
+                self._loaded_at.pop(session_id, None)
+
+
+# -------------------- Shared Roster Index: SQLite --------------------
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roster_entries (
+    session_id TEXT NOT NULL, email TEXT NOT NULL, row INTEGER NOT NULL, status TEXT NOT NULL,
+    PRIMARY KEY (session_id, email)
+);
+CREATE TABLE IF NOT EXISTS roster_claims (
+    session_id TEXT NOT NULL, email TEXT NOT NULL,
+    PRIMARY KEY (session_id, email)
+);
+CREATE TABLE IF NOT EXISTS roster_sessions (
+    session_id TEXT PRIMARY KEY, loaded_at REAL NOT NULL
+);
+"""
+
+
+class SQLiteRosterIndex:
+    """RosterIndex on a local SQLite file, so every worker on the host sees the same roster and marks."""
+
+    def __init__(self, path=ROSTER_CACHE_PATH, ttl=ROSTER_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._conns = ThreadLocalSQLite(path, _SQLITE_SCHEMA, isolation_level=None)
+
+    def _db(self):
+        return self._conns.connection()
+
+    def is_fresh(self, session_id):
+        row = self._db().execute(
+            "SELECT loaded_at FROM roster_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row is not None and (time.time() - row[0]) < self.ttl
+
+    def load_sessions(self, sessions):
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for session_id, entries in sessions.items():
+                db.execute("DELETE FROM roster_entries WHERE session_id = ?", (session_id,))
+                db.executemany(
+                    "INSERT INTO roster_entries (session_id, email, row, status) VALUES (?, ?, ?, ?)",
+                    [(session_id, email, e["row"], e["status"]) for email, e in entries.items()],
+                )
+                db.execute("INSERT OR REPLACE INTO roster_sessions (session_id, loaded_at) VALUES (?, ?)",
+                           (session_id, now))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def get(self, session_id, email):
+        row = self._db().execute(
+            "SELECT e.row, e.status, c.email IS NOT NULL FROM roster_entries e "
+            "LEFT JOIN roster_claims c ON c.session_id = e.session_id AND c.email = e.email "
+            "WHERE e.session_id = ? AND e.email = ?",
+            (session_id, normalize_email(email)),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"row": row[0], "status": "Present" if row[2] else row[1]}
+
+    def claim(self, session_id, email):
+        email = normalize_email(email)
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            entry = db.execute("SELECT status FROM roster_entries WHERE session_id = ? AND email = ?",
+                               (session_id, email)).fetchone()
+            if entry is None:
+                result = None
+            elif entry[0].lower() == "present":
+                result = False
+            else:
+                result = db.execute("INSERT OR IGNORE INTO roster_claims (session_id, email) VALUES (?, ?)",
+                                    (session_id, email)).rowcount == 1
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return result
+
+    def settle_claims(self, session_id, emails):
+        keys = [(session_id, normalize_email(email)) for email in emails]
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("UPDATE roster_entries SET status = 'Present' WHERE session_id = ? AND email = ?", keys)
+            db.executemany("DELETE FROM roster_claims WHERE session_id = ? AND email = ?", keys)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def refresh_entry(self, session_id, email, entry, keep_claim=False):
+        email = normalize_email(email)
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if db.execute("SELECT 1 FROM roster_sessions WHERE session_id = ?", (session_id,)).fetchone():
+                db.execute("INSERT OR REPLACE INTO roster_entries (session_id, email, row, status) VALUES (?, ?, ?, ?)",
+                           (session_id, email, entry["row"], entry["status"]))
+                if not keep_claim:
+                    db.execute("DELETE FROM roster_claims WHERE session_id = ? AND email = ?", (session_id, email))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def invalidate(self, session_id=None):
+        db = self._db()
+        for table in ("roster_entries", "roster_claims", "roster_sessions"):
+            if session_id is None:
+                db.execute(f"DELETE FROM {table}")
+            else:
+                db.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+
+
+# -------------------- Shared Roster Index: Redis --------------------
+class RedisRosterIndex:
+    """
+    RosterIndex on Redis (any server speaking the protocol; fakeredis works for local runs).
+    Keys per session: <prefix><sid> hash email -> {"row","status"} JSON, <prefix><sid>:claims set,
+    and <prefix><sid>:loaded, which expires after the TTL (its presence means "fresh").
+    """
+
+    def __init__(self, client, ttl=ROSTER_TTL_SECONDS, prefix="roster:"):
+        self.redis = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url=REDIS_URL, **kwargs):
+        if not HAS_REDIS:
+            raise RuntimeError("ROSTER_CACHE=redis needs the `redis` package (pip install redis)")
+        import redis
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    def _key(self, session_id, suffix=""):
+        return f"{self.prefix}{session_id}{suffix}"
+
+    def is_fresh(self, session_id):
+        return self.ttl > 0 and bool(self.redis.exists(self._key(session_id, ":loaded")))
+
+    def load_sessions(self, sessions):
+        pipe = self.redis.pipeline(transaction=True)
+        for session_id, entries in sessions.items():
+            key = self._key(session_id)
+            pipe.delete(key)
+            if entries:
+                pipe.hset(key, mapping={email: json.dumps(e) for email, e in entries.items()})
+            pipe.expire(key, ROSTER_CACHE_RETENTION_SECONDS)
+            pipe.expire(self._key(session_id, ":claims"), ROSTER_CACHE_RETENTION_SECONDS)
+            if self.ttl > 0:
+                pipe.set(self._key(session_id, ":loaded"), "1", ex=self.ttl)
+        pipe.execute()
+
+    def get(self, session_id, email):
+        email = normalize_email(email)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hget(self._key(session_id), email)
+        pipe.sismember(self._key(session_id, ":claims"), email)
+        raw, claimed = pipe.execute()
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        if claimed:
+            entry["status"] = "Present"
+        return entry
+
+    def claim(self, session_id, email):
+        email = normalize_email(email)
+        raw = self.redis.hget(self._key(session_id), email)
+        if raw is None:
+            return None
+        if json.loads(raw)["status"].lower() == "present":
+            return False
+        # SADD is atomic: exactly one worker sees 1 for a given email
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.sadd(self._key(session_id, ":claims"), email)
+        pipe.expire(self._key(session_id, ":claims"), ROSTER_CACHE_RETENTION_SECONDS)
+        added, _ = pipe.execute()
+        return added == 1
+
+    def settle_claims(self, session_id, emails):
+        emails = [normalize_email(email) for email in emails]
+        key = self._key(session_id)
+        raws = self.redis.hmget(key, emails) if emails else []
+        pipe = self.redis.pipeline(transaction=True)
+        for email, raw in zip(emails, raws):
+            if raw is not None:
+                pipe.hset(key, email, json.dumps(dict(json.loads(raw), status="Present")))
+        if emails:
+            pipe.srem(self._key(session_id, ":claims"), *emails)
+        pipe.execute()
+
+    def refresh_entry(self, session_id, email, entry, keep_claim=False):
+        email = normalize_email(email)
+        key = self._key(session_id)
+        if not self.redis.exists(key):
+            return
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(key, email, json.dumps(entry))
+        if not keep_claim:
+            pipe.srem(self._key(session_id, ":claims"), email)
+        pipe.execute()
+
+    def invalidate(self, session_id=None):
+        if session_id is None:
+            keys = list(self.redis.scan_iter(f"{self.prefix}*"))
+        else:
+            keys = [self._key(session_id), self._key(session_id, ":claims"), self._key(session_id, ":loaded")]
+        if keys:
+            self.redis.delete(*keys)
+
+
+def make_roster_index(kind=ROSTER_CACHE):
+    """Build the roster index selected by ROSTER_CACHE (memory / sqlite / redis)."""
+    if kind == "redis":
+        return RedisRosterIndex.from_url()
+    if kind == "sqlite":
+        return SQLiteRosterIndex()
+    return RosterIndex()
+
+
+# Process-wide index shared by all request threads (and, for sqlite/redis, all workers)
+roster_index = make_roster_index()
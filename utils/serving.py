@@ -0,0 +1,18 @@
+import importlib.util
+import os
+
+_ROSTER_CACHE = os.getenv("ROSTER_CACHE")
+
+# ✅ gunicorn worker processes. gunicorn.conf.py starts this many, and the Sheets rate limiter
+#    splits the per-user quota (all workers call Sheets as the same identity) between them,
+#    so both must read it from here.
+#    Defaults to 1 unless ROSTER_CACHE is shared (sqlite/redis): per-worker roster claims and
+#    idempotency keys would let a double tap that hits two workers be marked twice.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "2" if _ROSTER_CACHE in ("sqlite", "redis") else "1")))
+
+# ✅ Roster index backend (see utils.roster_index); shared via SQLite as soon as there is
+#    more than one worker, unless set explicitly
+ROSTER_CACHE = _ROSTER_CACHE or ("sqlite" if WEB_CONCURRENCY > 1 else "memory")
+
+# The redis-backed stores (ROSTER_CACHE / IDEMPOTENCY_STORE=redis) need the optional `redis` package
+HAS_REDIS = importlib.util.find_spec("redis") is not None
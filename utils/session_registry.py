@@ -0,0 +1,82 @@
+import threading
+import time
+
+
+# -------------------- Session Registry --------------------
+class SessionRegistry:
+    """
+    In-process view of the Sessions metadata tab: session_id -> {"session_name", "session_date",
+    "status", "first_row", "last_row"}, where the rows are the Master_Attendance range the
+    session occupies. IDs found nowhere are remembered as unknown for a while (negative cache),
+    so repeated hits on a bogus or mistyped link do no Sheets work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._unknown = {}      # session_id -> time.monotonic() until which it is known not to exist
+        self._miss_reloads = {} # session_id -> time.monotonic() of the last reload its miss triggered
+        self._loaded_at = None  # time.monotonic() of the last full load from the Sessions tab
+
+    def get(self, session_id):
+        with self._lock:
+            meta = self._sessions.get(session_id)
+            return dict(meta) if meta else None
+
+    def put(self, session_id, **meta):
+        """Merge `meta` into the entry for session_id (fields not given are kept)."""
+        with self._lock:
+            self._sessions.setdefault(session_id, {}).update(meta)
+            self._unknown.pop(session_id, None)
+
+    def mark_unknown(self, session_id, ttl):
+        """Remember for `ttl` seconds that session_id does not exist."""
+        with self._lock:
+            if len(self._unknown) > 10000:
+                now = time.monotonic()
+                self._unknown = {sid: until for sid, until in self._unknown.items() if until > now}
+            self._unknown[session_id] = time.monotonic() + ttl
+
+    def is_unknown(self, session_id):
+        with self._lock:
+            until = self._unknown.get(session_id)
+            return until is not None and until > time.monotonic()
+
+    def load(self, sessions):
+        """Merge a full read of the Sessions tab ({session_id: meta}) and note when it happened."""
+        with self._lock:
+            for session_id, meta in sessions.items():
+                self._sessions.setdefault(session_id, {}).update(meta)
+                self._unknown.pop(session_id, None)
+            self._loaded_at = time.monotonic()
+
+    def needs_reload(self, min_interval):
+        """True if the Sessions tab has not been read in the last `min_interval` seconds."""
+        with self._lock:
+            return self._loaded_at is None or (time.monotonic() - self._loaded_at) >= min_interval
+
+    def should_reload_for(self, session_id, min_interval, min_gap):
+        """
+        True if a miss on session_id should re-read the Sessions tab even though it was read
+        recently (another worker may have just uploaded it); at most once per `min_interval` per ID,
+        and never within `min_gap` seconds of the last read, whichever ID asks.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._loaded_at is not None and now - self._loaded_at < min_gap:
+                return False
+            if len(self._miss_reloads) > 10000:
+                self._miss_reloads = {sid: at for sid, at in self._miss_reloads.items() if now - at < min_interval}
+            last = self._miss_reloads.get(session_id)
+            if last is not None and now - last < min_interval:
+                return False
+            self._miss_reloads[session_id] = now
+            return True
+
+    def all(self):
+        with self._lock:
+            return {session_id: dict(meta) for session_id, meta in self._sessions.items()}
+
+
+# Process-wide registry shared by all request threads
+session_registry = SessionRegistry()
@@ -1,156 +1,1020 @@
-import gspread
-import pandas as pd
-from google.oauth2.credentials import Credentials
-from datetime import datetime
+from datetime import datetime, timedelta
 import random
 import string
+import threading
+import time
+import os
+import re
+
+from utils.roster_index import roster_index, normalize_email
+from utils.session_registry import session_registry
+from utils.sqlite_local import ThreadLocalSQLite
+from utils.write_queue import JournaledQueue, PartialWrite
+from utils.sheets_metrics import sheets_call, traced
+from utils.rate_limiter import sheets_limiter, at_priority, budget_lock, SheetsBusy, CHECKIN, BACKGROUND
+from utils.storage import (
+    StorageBackend, get_storage, iter_chunks, rows_fingerprint,
+    ATTENDANCE_HEADER, FEEDBACK_HEADER, MARKED, ALREADY_PRESENT, NOT_ON_ROSTER, QUEUED
+)
 
 # ✅ Google Sheet ID
 SPREADSHEET_ID = "16j_H3ND9BrBGucTxv5PIyvI22P5Q7xSCHsAelQbpOyY"
 
+# ✅ Sessions tab: name, date and status of each uploaded session, plus the Master_Attendance
+#    row range its roster occupies (set Status to "closed" by hand to take a session's forms down)
+SESSIONS_HEADER = ["Session ID", "Session Name", "Session Date", "First Row", "Last Row", "Created At", "Status"]
+# Minimum seconds between re-reads of the Sessions tab when an unknown session_id shows up
+SESSIONS_RELOAD_SECONDS = int(os.getenv("SESSIONS_RELOAD_SECONDS", "30"))
+# ✅ Minimum seconds between forced re-reads of the Sessions tab, across all missed IDs
+#    (a session uploaded by another worker is seen within this long)
+SESSIONS_FORCED_RELOAD_SECONDS = int(os.getenv("SESSIONS_FORCED_RELOAD_SECONDS", "5"))
+# ✅ Form pages of a session stay open this many days after its date (0 = never expire)
+SESSION_OPEN_DAYS = int(os.getenv("SESSION_OPEN_DAYS", "30"))
+# ✅ How long an unknown session_id is answered "not found" without looking again
+UNKNOWN_SESSION_TTL_SECONDS = int(os.getenv("UNKNOWN_SESSION_TTL_SECONDS", "15"))
+
+# ✅ PREWARM_ROSTERS=1: on startup, load every session dated today or later into the roster index
+PREWARM_ROSTERS = os.getenv("PREWARM_ROSTERS", "0") == "1"
+
+# ✅ Write-behind tuning for attendance marks
+MARK_FLUSH_INTERVAL_MS = int(os.getenv("MARK_FLUSH_INTERVAL_MS", "1000"))
+MARK_FLUSH_MAX_ITEMS = int(os.getenv("MARK_FLUSH_MAX_ITEMS", "50"))
+
+# ✅ Buffered feedback sink tuning (rows are appended with one append_rows per flush)
+FEEDBACK_FLUSH_INTERVAL_MS = int(os.getenv("FEEDBACK_FLUSH_INTERVAL_MS", "2000"))
+FEEDBACK_FLUSH_MAX_ITEMS = int(os.getenv("FEEDBACK_FLUSH_MAX_ITEMS", "100"))
+
+# ✅ Export queue used when SQLite is the primary store (STORAGE_BACKEND=sqlite)
+EXPORT_FLUSH_INTERVAL_MS = int(os.getenv("EXPORT_FLUSH_INTERVAL_MS", "2000"))
+EXPORT_FLUSH_MAX_ITEMS = int(os.getenv("EXPORT_FLUSH_MAX_ITEMS", "100"))
+
+# ✅ Per-session change counters behind export versions/ETags, shared by every worker on the host
+EXPORT_STATE_PATH = os.getenv("EXPORT_STATE_PATH", "export_state.db")
+# ✅ A session with no local change since its last export is re-read from the sheet at most this
+#    often (hand edits are otherwise only seen through the delta sync)
+EXPORT_RECHECK_SECONDS = int(os.getenv("EXPORT_RECHECK_SECONDS", "300"))
+
 
 # -------------------- Google Auth --------------------
+TOKEN_FILE = "token.json"
+
+# Process-wide client state: credentials are loaded once, and the gspread client keeps
+# a single pooled HTTP session (AuthorizedSession) for every request thread.
+# The client is wrapped with traced() so every Sheets call is timed (see /metrics) and
+# goes through the shared quota-aware rate limiter.
+_client_lock = threading.RLock()
+_creds = None
+_client = None
+_spreadsheet = None
+_worksheets = {}   # title -> gspread.Worksheet
+_headers = {}      # title -> {column name: 0-based index}
+
+
 def get_gsheet_client():
-    """Authorize using OAuth token.json"""
-    creds = Credentials.from_authorized_user_file("token.json")
-    return gspread.authorize(creds)
+    """Return the shared gspread client, authorizing from token.json on first use."""
+    global _creds, _client
+    with _client_lock:
+        if _client is None:
+            # gspread / google-auth load here, on the first Sheets call, not at app startup
+            import gspread
+            from google.oauth2.credentials import Credentials
+            with sheets_call("auth"):
+                _creds = Credentials.from_authorized_user_file(TOKEN_FILE)
+                _client = traced(gspread.authorize(_creds), guard=sheets_limiter.call)
+        elif _creds is not None and _creds.expired and _creds.refresh_token:
+            # Refresh up front instead of letting the next data call pay for a 401 round-trip
+            from google.auth.transport.requests import Request
+            with sheets_call("auth"):
+                _creds.refresh(Request())
+        return _client
 
 
-# -------------------- Upload Session Excel --------------------
-def upload_session_from_excel(file_path, session_name, session_date):
-    """Upload session Excel data into Master_Attendance tab"""
+def install_gsheet_client(client, creds=None):
+    """Use `client` instead of authorizing from token.json (e.g. the local Sheets stub in bench/)."""
+    global _creds, _client
+    with _client_lock:
+        _client = traced(client, guard=sheets_limiter.call)
+        _creds = creds
+    reset_gsheet_cache()
+
+
+def get_spreadsheet():
+    """Return the memoized Spreadsheet handle for SPREADSHEET_ID."""
+    global _spreadsheet
     client = get_gsheet_client()
-    sh = client.open_by_key(SPREADSHEET_ID)
+    with budget_lock(_client_lock):
+        if _spreadsheet is None:
+            _spreadsheet = client.open_by_key(SPREADSHEET_ID)
+        return _spreadsheet
+
+
+def get_worksheet(title, header=None):
+    """
+    Return the memoized worksheet `title`.
+    If it does not exist and `header` is given, the tab is created with that header row;
+    otherwise gspread.exceptions.WorksheetNotFound is raised.
+    """
+    import gspread
+    with budget_lock(_client_lock):
+        ws = _worksheets.get(title)
+        if ws is not None:
+            return ws
+        sh = get_spreadsheet()
+        try:
+            ws = sh.worksheet(title)
+        except gspread.exceptions.WorksheetNotFound:
+            if header is None:
+                raise
+            ws = sh.add_worksheet(title=title, rows="100", cols="20")
+            ws.append_row(header)
+            _headers[title] = {name: i for i, name in enumerate(header)}
+        _worksheets[title] = ws
+        return ws
+
+
+def get_header_map(title):
+    """Return the memoized {column name: 0-based index} map for worksheet `title`."""
+    with budget_lock(_client_lock):
+        header_map = _headers.get(title)
+        if header_map is None:
+            header_map = set_header_map(title, get_worksheet(title).row_values(1))
+        return header_map
+
+
+def set_header_map(title, header):
+    """Refresh the memoized header map from a header row the caller already fetched."""
+    header_map = {}
+    for i, name in enumerate(header):
+        header_map.setdefault(name, i)
+    with _client_lock:
+        _headers[title] = header_map
+    return header_map
+
+
+def reset_gsheet_cache():
+    """Forget memoized spreadsheet/worksheet handles and header maps (e.g. after tabs change)."""
+    global _spreadsheet
+    with _client_lock:
+        _spreadsheet = None
+        _worksheets.clear()
+        _headers.clear()
+
+
+def column_letter(index):
+    """A1 column letter(s) for a 0-based column index (0 -> "A", 26 -> "AA")."""
+    import gspread
+    return gspread.utils.rowcol_to_a1(1, index + 1).rstrip("1")
+
+
+# -------------------- Roster Lookup --------------------
+# Serializes cold loads per session so a burst of first scans triggers a single download,
+# while different sessions still load in parallel (striped so bogus IDs cannot grow it)
+_roster_load_locks = [threading.Lock() for _ in range(64)]
+
+
+def _roster_load_lock(session_id):
+    return _roster_load_locks[hash(session_id) % len(_roster_load_locks)]
+
+
+def _attendance_columns():
+    """Return 0-based indices of the Master_Attendance columns used for lookups, or None."""
+    header_map = get_header_map("Master_Attendance")
+    try:
+        return {
+            "session_id": header_map["Session ID"],
+            "email": header_map["Official Email"],
+            "attendance": header_map["Attendance"],
+            "timestamp": header_map["Timestamp"],
+        }
+    except KeyError as e:
+        print(f"Error: Missing column in Master_Attendance sheet: {e}")
+        return None
+
+
+def _index_rows(rows, cols, first_row):
+    """Group sheet rows into {session_id: {email: {"row", "status"}}} for the roster index."""
+    sessions = {}
+    width = max(cols.values()) + 1
+    for i, row in enumerate(rows, start=first_row):
+        if len(row) < width:
+            row = row + [""] * (width - len(row))
+        email = normalize_email(row[cols["email"]])
+        if not email:
+            continue
+        # First occurrence wins, matching the old top-to-bottom scan
+        sessions.setdefault(row[cols["session_id"]], {}).setdefault(
+            email, {"row": i, "status": row[cols["attendance"]].strip()}
+        )
+    return sessions
+
+
+def _load_session_range(ws, session_id, meta):
+    """
+    Index one session from its registered Master_Attendance row range. False if the range is
+    stale, i.e. the session's rows no longer fill it exactly (rows were inserted or deleted
+    above or inside it); the caller then rescans the whole tab, which re-registers the range.
+    """
+    import gspread
+    cols = _attendance_columns()
+    if cols is None:
+        return False
+    width = max(get_header_map("Master_Attendance").values()) + 1
+    first_row, last_row = meta["first_row"], meta["last_row"]
+    # One row past the end shows whether the session now runs beyond its range
+    values = ws.get(f"A{first_row}:{gspread.utils.rowcol_to_a1(last_row + 1, width)}")
+    size = last_row - first_row + 1
+    session_ids = [row[cols["session_id"]] if cols["session_id"] < len(row) else "" for row in values]
+    entries = _index_rows(values[:size], cols, first_row=first_row).get(session_id)
+    if len(values) < size or any(sid != session_id for sid in session_ids[:size]) \
+            or session_id in session_ids[size:] or not entries:
+        print(f"⚠️ Registered range {first_row}-{last_row} no longer matches {session_id}; rescanning")
+        return False
+    roster_index.load_sessions({session_id: entries})
+    return True
+
+
+def _load_full_roster(ws, session_id):
+    """Index every session from a full read of Master_Attendance (legacy or stale sessions)."""
+    all_values = ws.get_all_values()
+    # The header row came along for free; keep the column map in step with the sheet
+    set_header_map("Master_Attendance", all_values[0] if all_values else [])
+    cols = _attendance_columns()
+    if cols is None:
+        return
+    sessions = _index_rows(all_values[1:], cols, first_row=2)
+    # Remember where each session sits so its next reload is a range read
+    _register_sheet_sessions(all_values, sessions)
+    # The whole tab was read anyway, so refresh every session it contains
+    sessions.setdefault(session_id, {})
+    roster_index.load_sessions(sessions)
+
+
+def _register_sheet_sessions(all_values, sessions):
+    """Record name, date and row range of each indexed session found in a full Master_Attendance read."""
+    header = all_values[0] if all_values else []
+    detail_cols = {key: header.index(name) for key, name in
+                   (("session_name", "Session Name"), ("session_date", "Session Date")) if name in header}
+    for sid, entries in sessions.items():
+        rows = [entry["row"] for entry in entries.values()]
+        first = all_values[min(rows) - 1]
+        meta = {key: first[i] for key, i in detail_cols.items() if i < len(first)}
+        session_registry.put(sid, first_row=min(rows), last_row=max(rows), **meta)
+
+
+def _lookup_roster_entry(ws, session_id, email):
+    """Resolve (session_id, email) via the in-process roster index, loading the session if stale."""
+    if not roster_index.is_fresh(session_id):
+        with budget_lock(_roster_load_lock(session_id)):
+            # Another thread may have loaded it while we waited
+            if not roster_index.is_fresh(session_id):
+                meta = get_session_meta(session_id)
+                if not (meta and meta.get("first_row") and _load_session_range(ws, session_id, meta)):
+                    _load_full_roster(ws, session_id)
+    return roster_index.get(session_id, email)
+
+
+def _seed_uploaded_roster(session_id, chunks, spans):
+    """
+    Index a roster we just appended straight from its rows: the append responses say where
+    each chunk landed, so the first scans of a new session need no read at all.
+    Returns False (caller should invalidate instead) if any chunk's position is unknown.
+    """
+    email_col = ATTENDANCE_HEADER.index("Official Email")
+    entries = {}
+    for chunk, span in zip(chunks, spans):
+        if span is None or span[1] - span[0] + 1 != len(chunk):
+            return False
+        for offset, row in enumerate(chunk):
+            email = normalize_email(row[email_col])
+            if email:
+                entries.setdefault(email, {"row": span[0] + offset, "status": ""})
+    roster_index.load_sessions({session_id: entries})
+    return True
+
 
-    # ✅ Try to open Master_Attendance tab
+@at_priority(BACKGROUND)
+def prewarm_rosters():
+    """Load every session dated today or later into the roster index with one full read."""
+    ws = get_worksheet("Master_Attendance")
+    all_values = ws.get_all_values()
+    header = all_values[0] if all_values else []
+    set_header_map("Master_Attendance", header)
+    cols = _attendance_columns()
+    if cols is None or "Session Date" not in header:
+        return 0
+    date_col = header.index("Session Date")
+    today = datetime.now().strftime("%Y-%m-%d")
+    upcoming = {r[cols["session_id"]] for r in all_values[1:]
+                if len(r) > date_col and r[date_col] >= today}
+    sessions = {sid: entries for sid, entries in _index_rows(all_values[1:], cols, first_row=2).items()
+                if sid in upcoming}
+    _register_sheet_sessions(all_values, sessions)
+    roster_index.load_sessions(sessions)
+    print(f"✅ Pre-warmed {len(sessions)} session roster(s) dated {today} or later")
+    return len(sessions)
+
+
+def start_roster_prewarm():
+    """Run prewarm_rosters() in the background when PREWARM_ROSTERS=1 (startup must not block on Sheets)."""
+    if not PREWARM_ROSTERS:
+        return
+
+    def run():
+        try:
+            prewarm_rosters()
+        except Exception as e:
+            print(f"⚠️ Roster pre-warm failed ({e}); sessions will load on first scan")
+
+    threading.Thread(target=run, name="roster-prewarm", daemon=True).start()
+
+
+# -------------------- Sessions Registry Tab --------------------
+def _parse_updated_rows(response):
+    """Return (first_row, last_row) from an append_rows response, or None."""
+    updated = ((response or {}).get("updates") or {}).get("updatedRange", "")
+    match = re.search(r"!?[A-Z]+(\d+)(?::[A-Z]+(\d+))?$", updated)
+    if not match:
+        return None
+    first_row = int(match.group(1))
+    return first_row, int(match.group(2) or first_row)
+
+
+def _register_session(session_id, session_name, session_date, first_row, last_row):
+    """Record the Master_Attendance rows a freshly appended roster occupies in the Sessions tab."""
+    ws = get_worksheet("Sessions", header=SESSIONS_HEADER)
+    ws.append_row([session_id, session_name, session_date, first_row, last_row,
+                   datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "open"])
+    session_registry.put(session_id, session_name=session_name, session_date=session_date,
+                         first_row=first_row, last_row=last_row, status="open")
+
+
+def _load_session_registry(force=False):
+    """Merge the Sessions tab into the in-process registry (at most every SESSIONS_RELOAD_SECONDS unless `force`)."""
+    import gspread
+    if not force and not session_registry.needs_reload(SESSIONS_RELOAD_SECONDS):
+        return
     try:
-        ws = sh.worksheet("Master_Attendance")
+        values = get_worksheet("Sessions").get_all_values()
     except gspread.exceptions.WorksheetNotFound:
-        ws = sh.add_worksheet(title="Master_Attendance", rows="100", cols="20")
-        ws.append_row([
-            "Session ID", "Session Name", "Session Date",
-            "Employee Code", "Employee Name", "Official Email", "Business",
-            "Attendance", "Timestamp"
-        ])
+        values = []
+    sessions = {}
+    if values:
+        col = {name: i for i, name in enumerate(values[0])}
+        for row in values[1:]:
+            row = row + [""] * (len(SESSIONS_HEADER) - len(row))
+            try:
+                # Later rows win, so re-registering a session simply appends a new line
+                sessions[row[col["Session ID"]]] = {
+                    "session_name": row[col["Session Name"]],
+                    "session_date": row[col["Session Date"]],
+                    "first_row": int(row[col["First Row"]]),
+                    "last_row": int(row[col["Last Row"]]),
+                    # Tabs created before the Status column existed count as open
+                    "status": (row[col["Status"]] if "Status" in col else "").strip().lower() or "open",
+                }
+            except (KeyError, ValueError):
+                continue
+    session_registry.load(sessions)
+
+
+def get_session_meta(session_id):
+    """Return registry metadata (name, date, row range) for session_id, or None if unknown."""
+    meta = session_registry.get(session_id)
+    if meta is None:
+        _load_session_registry()
+        meta = session_registry.get(session_id)
+    return meta
+
+
+_discovery_lock = threading.Lock()
+_discovered_at = None
+
+
+def _discover_unregistered_session(session_id):
+    """
+    Look for session_id in Master_Attendance itself (rosters uploaded before the Sessions tab
+    existed). At most one full read per SESSIONS_RELOAD_SECONDS, however many IDs miss.
+    """
+    import gspread
+    global _discovered_at
+    with _discovery_lock:
+        if _discovered_at is not None and time.monotonic() - _discovered_at < SESSIONS_RELOAD_SECONDS:
+            return
+        _discovered_at = time.monotonic()
+    try:
+        ws = get_worksheet("Master_Attendance")
+    except gspread.exceptions.WorksheetNotFound:
+        return
+    with budget_lock(_roster_load_lock(session_id)):
+        _load_full_roster(ws, session_id)
+
+
+def _session_status(meta):
+    """"closed" (set in the Sessions tab), "expired" (older than SESSION_OPEN_DAYS) or "open"."""
+    if meta.get("status") == "closed":
+        return "closed"
+    if SESSION_OPEN_DAYS > 0:
+        try:
+            session_date = datetime.strptime(meta.get("session_date", ""), "%Y-%m-%d")
+        except ValueError:
+            return "open"
+        if (datetime.now() - session_date).days > SESSION_OPEN_DAYS:
+            return "expired"
+    return "open"
+
+
+def lookup_session(session_id):
+    """
+    Return {"session_id", "session_name", "session_date", "status"} for the form pages, or None
+    if the ID is unknown. Served from the in-process registry; a miss asks the storage backend
+    once, and IDs found nowhere are negatively cached for UNKNOWN_SESSION_TTL_SECONDS.
+    """
+    if not session_id or session_registry.is_unknown(session_id):
+        return None
+    meta = session_registry.get(session_id)
+    if not (meta and meta.get("session_name")):
+        found = get_storage().describe_session(session_id)
+        if found is None:
+            session_registry.mark_unknown(session_id, UNKNOWN_SESSION_TTL_SECONDS)
+            return None
+        session_registry.put(session_id, **found)
+        meta = session_registry.get(session_id)
+    return {"session_id": session_id, "session_name": meta["session_name"],
+            "session_date": meta.get("session_date", ""), "status": _session_status(meta)}
+
+
+# -------------------- Write-Behind Attendance Marks --------------------
+@at_priority(CHECKIN)
+def _write_marks(marks):
+    """Flush queued marks to Master_Attendance in a single batch_update."""
+    import gspread
+    ws = get_worksheet("Master_Attendance")
+
+    cols = _attendance_columns()
+    if cols is None:
+        raise RuntimeError("Master_Attendance is missing required columns")
+
+    # Coalesce repeats of the same row, keeping the first check-in time.
+    # Marks exported from the SQLite backend, or accepted while Sheets was over quota, carry
+    # no row yet; resolve them via the roster index.
+    by_row = {}
+    for mark in marks:
+        row = mark.get("row")
+        if row is None:
+            entry = _lookup_roster_entry(ws, mark["session_id"], mark["email"])
+            if entry is None:
+                print(f"⚠️ Skipping mark for {mark['email']}: not in Master_Attendance ({mark['session_id']})")
+                continue
+            # A deferred check-in only counts if no other request/worker marked them meanwhile
+            claimed = roster_index.claim(mark["session_id"], mark["email"])
+            if mark.get("deferred") and claimed is False:
+                continue
+            row = entry["row"]
+        by_row.setdefault(row, mark)
+    if not by_row:
+        return
+
+    # Rows may have moved since the marks were journaled: re-resolve those from a fresh read
+    moved = [by_row.pop(row) for row in _moved_rows(ws, cols, by_row)]
+    for session_id in {mark["session_id"] for mark in moved}:
+        roster_index.invalidate(session_id)
+    for mark in moved:
+        entry = _lookup_roster_entry(ws, mark["session_id"], mark["email"])
+        if entry is None:
+            print(f"⚠️ Skipping mark for {mark['email']}: no longer in Master_Attendance ({mark['session_id']})")
+            continue
+        print(f"⚠️ {mark['email']} moved to row {entry['row']} since being queued; writing there")
+        by_row.setdefault(entry["row"], mark)
+    if not by_row:
+        return
+
+    data = []
+    for row, mark in by_row.items():
+        data.append({"range": gspread.utils.rowcol_to_a1(row, cols["attendance"] + 1), "values": [["Present"]]})
+        data.append({"range": gspread.utils.rowcol_to_a1(row, cols["timestamp"] + 1),
+                     "values": [[mark["timestamp"]]]})
+    ws.batch_update(data)
+    print(f"✅ Flushed {len(by_row)} attendance mark(s) to Master_Attendance")
+    export_state.touch(mark["session_id"] for mark in by_row.values())
+
+    # The sheet now shows these marks: drop their claims so later reloads trust the sheet
+    settled = {}
+    for mark in by_row.values():
+        settled.setdefault(mark["session_id"], []).append(mark["email"])
+    for session_id, emails in settled.items():
+        roster_index.settle_claims(session_id, emails)
+
+    # Tell the delta sync these cells are ours (imported here: delta_sync builds on this module)
+    from utils.delta_sync import record_pushed
+    record_pushed("Master_Attendance", {row: ["Present", mark["timestamp"]] for row, mark in by_row.items()})
+
+
+def _moved_rows(ws, cols, by_row):
+    """
+    Return the rows of {row: mark} that no longer hold the mark's (session_id, email), e.g.
+    after an admin inserted or deleted rows by hand. One batch_get of the key cells.
+    """
+    import gspread
+    first, last = sorted((cols["session_id"], cols["email"]))
+    rows = list(by_row)
+    values = ws.batch_get([f"{gspread.utils.rowcol_to_a1(row, first + 1)}:"
+                           f"{gspread.utils.rowcol_to_a1(row, last + 1)}" for row in rows])
+    moved = []
+    for row, value in zip(rows, values):
+        cells = list(value[0]) if value else []
+        cells += [""] * (last - first + 1 - len(cells))
+        mark = by_row[row]
+        if cells[cols["session_id"] - first] != mark["session_id"] \
+                or normalize_email(cells[cols["email"] - first]) != normalize_email(mark["email"]):
+            moved.append(row)
+    return moved
+
+
+mark_queue = JournaledQueue(
+    "attendance_marks", _write_marks,
+    flush_interval_ms=MARK_FLUSH_INTERVAL_MS, max_items=MARK_FLUSH_MAX_ITEMS,
+)
+
+
+def _queue_mark(session_id, email, entry, timestamp):
+    """Journal a mark (already claimed in the roster index) for the background flusher."""
+    mark_queue.enqueue({
+        "session_id": session_id,
+        "email": normalize_email(email),
+        "row": entry["row"],
+        "timestamp": timestamp,
+    })
+
+
+def _defer_mark(session_id, email, timestamp, reason="Sheets busy"):
+    """
+    Accept a check-in without checking the roster now (degraded mode: Sheets is over quota;
+    or its session is not indexed in this process). The flusher resolves the row (and drops
+    unknown emails) once the budget allows.
+    """
+    mark_queue.enqueue({
+        "session_id": session_id,
+        "email": normalize_email(email),
+        "row": None,
+        "timestamp": timestamp,
+        "deferred": True,
+    })
+    print(f"⚠️ {reason}; queued unverified check-in for {email} ({session_id})")
+
+
+# -------------------- Write-Behind Feedback Rows --------------------
+@at_priority(CHECKIN)
+def _write_feedback_rows(rows):
+    """Flush buffered feedback rows to Master_Feedback in a single append_rows."""
+    ws = get_worksheet("Master_Feedback", header=FEEDBACK_HEADER)
+    ws.append_rows([item["row"] for item in rows])
+    print(f"✅ Flushed {len(rows)} feedback row(s) to Master_Feedback")
+    export_state.touch(item["row"][FEEDBACK_HEADER.index("Session ID")] for item in rows)
+
+
+feedback_queue = JournaledQueue(
+    "feedback_rows", _write_feedback_rows,
+    flush_interval_ms=FEEDBACK_FLUSH_INTERVAL_MS, max_items=FEEDBACK_FLUSH_MAX_ITEMS,
+)
+
+
+# -------------------- Sheets Export (SQLite primary) --------------------
+@at_priority(BACKGROUND)
+def _append_roster_rows(items):
+    """Append exported roster uploads to Master_Attendance."""
+    ws = get_worksheet("Master_Attendance", header=ATTENDANCE_HEADER)
+    # One append per roster chunk so each response tells us exactly where it landed
+    for item in items:
+        rows = item["rows"]
+        if not rows:
+            continue
+        session_id = rows[0][0]
+        span = _parse_updated_rows(ws.append_rows(rows))
+        roster_index.invalidate(session_id)
+        if span is not None:
+            # Chunks of one roster widen the range registered by the earlier ones
+            meta = session_registry.get(session_id) or {}
+            first_row = min(span[0], meta.get("first_row") or span[0])
+            last_row = max(span[1], meta.get("last_row") or span[1])
+            _register_session(session_id, rows[0][1], rows[0][2], first_row, last_row)
+        print(f"✅ Exported {len(rows)} roster row(s) to Master_Attendance ({session_id})")
 
-    # ✅ Read Excel
-    df = pd.read_excel(file_path)
-    df.columns = [str(c).strip() for c in df.columns]
+
+_EXPORT_WRITERS = {
+    "roster": _append_roster_rows,
+    "mark": _write_marks,
+    "feedback": _write_feedback_rows,
+}
+
+
+@at_priority(BACKGROUND)
+def _export_to_sheets(items):
+    """
+    Replay SQLite changes onto the sheet in journal order (a roster always lands before its marks),
+    one call per run of same-op items and one per roster chunk. If a call fails, PartialWrite tells
+    the queue which runs already landed, so a retry does not append them again.
+    """
+    written, run = 0, []
+    for item in items + [None]:
+        if run and (item is None or item["op"] != run[0]["op"] or item["op"] == "roster"):
+            try:
+                _EXPORT_WRITERS[run[0]["op"]](run)
+            except Exception as e:
+                raise PartialWrite(written, len(run), e) from e
+            written += len(run)
+            run = []
+        if item is not None:
+            run.append(item)
+
+
+sheets_export_queue = JournaledQueue(
+    "sheets_export", _export_to_sheets,
+    flush_interval_ms=EXPORT_FLUSH_INTERVAL_MS, max_items=EXPORT_FLUSH_MAX_ITEMS,
+)
+
+
+def start_write_behind():
+    """Start the background flushers (also drains anything journaled before a restart)."""
+    mark_queue.ensure_started()
+    feedback_queue.ensure_started()
+    sheets_export_queue.ensure_started()
+
+
+def write_behind_stats():
+    """Depth and last flush latency of each write-behind queue."""
+    return [mark_queue.stats(), feedback_queue.stats(), sheets_export_queue.stats()]
+
+
+# -------------------- Export Versions --------------------
+class ExportState:
+    """
+    Per-session change counter, bumped after every write this app makes to a session's rows
+    (marks, feedback, roster upload) and for every hand edit the delta sync sees. An export
+    records the counter it read the sheet at; while the counter has not moved (and for at most
+    EXPORT_RECHECK_SECONDS) that export's version is still current, so ETag checks and cached
+    downloads need no Sheets read.
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS export_state (
+        session_id TEXT PRIMARY KEY, changes INTEGER NOT NULL DEFAULT 0,
+        checked_changes INTEGER, version TEXT, checked_at REAL
+    );
+    """
+
+    def __init__(self, path=EXPORT_STATE_PATH):
+        self._local = ThreadLocalSQLite(path, self._SCHEMA)
+
+    def touch(self, session_ids):
+        db = self._local.connection()
+        with db:
+            db.executemany("INSERT INTO export_state (session_id, changes) VALUES (?, 1)"
+                           " ON CONFLICT(session_id) DO UPDATE SET changes = changes + 1",
+                           [(session_id,) for session_id in set(session_ids) if session_id])
+
+    def changes(self, session_id):
+        row = self._local.connection().execute(
+            "SELECT changes FROM export_state WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def checked(self, session_id, changes, version):
+        """Record that the sheet held `version` for session_id when its counter was `changes`."""
+        db = self._local.connection()
+        with db:
+            db.execute("INSERT INTO export_state (session_id, changes) VALUES (?, 0)"
+                       " ON CONFLICT(session_id) DO NOTHING", (session_id,))
+            db.execute("UPDATE export_state SET checked_changes = ?, version = ?, checked_at = ?"
+                       " WHERE session_id = ?", (changes, version, time.time(), session_id))
+
+    def version(self, session_id):
+        """The last exported version of session_id if nothing has changed since, else None."""
+        row = self._local.connection().execute(
+            "SELECT changes, checked_changes, version, checked_at FROM export_state WHERE session_id = ?",
+            (session_id,)).fetchone()
+        if row is None or row[0] != row[1] or time.time() - row[3] >= EXPORT_RECHECK_SECONDS:
+            return None
+        return row[2]
+
+    def invalidate(self, session_id=None):
+        """Forget recorded versions, so the next export (of session_id, or of any session) reads the sheet."""
+        db = self._local.connection()
+        with db:
+            if session_id is None:
+                db.execute("UPDATE export_state SET version = NULL, checked_changes = NULL")
+            else:
+                db.execute("UPDATE export_state SET version = NULL, checked_changes = NULL"
+                           " WHERE session_id = ?", (session_id,))
+
+
+export_state = ExportState()
+
+
+# -------------------- Google Sheets Backend --------------------
+class SheetsStorage(StorageBackend):
+    """Google Sheets as the primary store: roster index for reads, write-behind queues for writes."""
+
+    name = "sheets"
+
+    def upload_roster(self, session_id, header, rows, progress=None):
+        ws = get_worksheet("Master_Attendance", header=ATTENDANCE_HEADER)
+        chunks, spans = [], []
+        done = 0
+        for chunk in iter_chunks(rows):
+            spans.append(_parse_updated_rows(ws.append_rows(chunk)))
+            chunks.append(chunk)
+            done += len(chunk)
+            if progress:
+                progress(done, len(rows))
+        # Warm the index for the new session so the room's first scans are served from memory
+        if not _seed_uploaded_roster(session_id, chunks, spans):
+            roster_index.invalidate(session_id)
+
+        export_state.touch([session_id])
+
+        if rows and None not in spans:
+            _register_session(session_id, rows[0][1], rows[0][2],
+                              min(s[0] for s in spans), max(s[1] for s in spans))
+        elif rows:
+            print(f"⚠️ Could not determine the row range for {session_id}; lookups will scan the tab")
+        return len(rows)
+
+    def lookup(self, session_id, email):
+        import gspread
+        try:
+            ws = get_worksheet("Master_Attendance")
+        except gspread.exceptions.WorksheetNotFound:
+            print("Master_Attendance sheet not found.")
+            return None
+        return _lookup_roster_entry(ws, session_id, email)
+
+    def mark(self, session_id, email, timestamp, entry=None):
+        # A caller's entry (e.g. from a /validate_email token) is only a hint that spares the
+        # lookup; the row that gets written always comes from the roster index
+        if entry is None or roster_index.is_fresh(session_id):
+            entry = self.lookup(session_id, email)
+            if entry is None:
+                return NOT_ON_ROSTER
+        if entry["status"].lower() == "present":
+            return ALREADY_PRESENT
+        # The claim is atomic across workers when the index is shared (ROSTER_CACHE=sqlite/redis),
+        # so a double scan hitting two workers queues one mark
+        claimed = roster_index.claim(session_id, email)
+        if claimed is False:
+            return ALREADY_PRESENT
+        indexed = roster_index.get(session_id, email) if claimed else None
+        if indexed is None:
+            # Session not indexed here (or the hint names someone it doesn't list): let the
+            # flusher resolve the row against the roster, like a degraded-mode check-in
+            _defer_mark(session_id, email, timestamp, reason="Roster not indexed")
+            return QUEUED
+        # Attendance/Timestamp cells are written by the background flusher
+        _queue_mark(session_id, email, indexed, timestamp)
+        return MARKED
+
+    def mark_many(self, records, write_through=False):
+        ws = get_worksheet("Master_Attendance")
+        results, marks, seen = [], [], set()
+        loaded = set()
+        for record in records:
+            session_id, email = record["session_id"], normalize_email(record["email"])
+            try:
+                if session_id not in loaded:
+                    # One roster read per session (none if already indexed); the rest are memory hits
+                    _lookup_roster_entry(ws, session_id, email)
+                    loaded.add(session_id)
+                entry = roster_index.get(session_id, email)
+            except SheetsBusy:
+                _defer_mark(session_id, email, record["timestamp"])
+                results.append(QUEUED)
+                continue
+            if entry is None:
+                results.append(NOT_ON_ROSTER)
+            elif (session_id, email) in seen or entry["status"].lower() == "present" \
+                    or roster_index.claim(session_id, email) is False:
+                results.append(ALREADY_PRESENT)
+            else:
+                seen.add((session_id, email))
+                marks.append({"session_id": session_id, "email": email,
+                              "row": entry["row"], "timestamp": record["timestamp"]})
+                results.append(MARKED)
+        if marks:
+            # Journal first (durable); the background flusher coalesces it with other marks.
+            # write_through (admin kiosk batches) writes it now with a single batch_update;
+            # if Sheets refuses, the background flusher retries it.
+            mark_queue.enqueue_many(marks)
+            if write_through:
+                mark_queue.flush(max_items=max(len(marks), MARK_FLUSH_MAX_ITEMS))
+        return results
+
+    def append_feedback(self, row):
+        feedback_queue.enqueue({"row": row})
+
+    def describe_session(self, session_id):
+        meta = session_registry.get(session_id)
+        if not (meta and meta.get("session_name")):
+            # Another worker may have just uploaded it: re-read the Sessions tab even if this
+            # worker read it recently (at most once per SESSIONS_RELOAD_SECONDS per ID, and once
+            # per SESSIONS_FORCED_RELOAD_SECONDS overall)
+            _load_session_registry(force=session_registry.should_reload_for(
+                session_id, SESSIONS_RELOAD_SECONDS, SESSIONS_FORCED_RELOAD_SECONDS))
+            meta = session_registry.get(session_id)
+        if not (meta and meta.get("session_name")):
+            _discover_unregistered_session(session_id)
+            meta = session_registry.get(session_id)
+        if not (meta and meta.get("session_name")):
+            return None
+        return {"session_name": meta["session_name"], "session_date": meta.get("session_date", "")}
+
+    def export_version(self, session_id):
+        return export_state.version(session_id)
+
+    @at_priority(BACKGROUND)
+    def export_tables(self, session_id):
+        # Counter first: a write landing while the sheet is read makes this version stale at once
+        changes = export_state.changes(session_id)
+        attendance = _read_session_rows("Master_Attendance", ATTENDANCE_HEADER, session_id,
+                                        get_session_meta(session_id))
+        # Master_Feedback has no per-session row ranges, so it is filtered from one full read
+        feedback = _read_session_rows("Master_Feedback", FEEDBACK_HEADER, session_id)
+        tables = {"attendance": [ATTENDANCE_HEADER] + attendance, "feedback": [FEEDBACK_HEADER] + feedback}
+        version = rows_fingerprint(*tables.values())
+        export_state.checked(session_id, changes, version)
+        return version, tables
+
+    def apply_sheet_attendance(self, changes, in_flight):
+        # The sheet is the store; only the roster index needs to catch up with hand edits
+        for change in changes:
+            values = change["values"]
+            session_id, email = values["Session ID"], normalize_email(values["Official Email"])
+            if session_id and email and "Attendance" in values:
+                roster_index.refresh_entry(
+                    session_id, email, {"row": change["row"], "status": values["Attendance"].strip()},
+                    keep_claim=(session_id, email) in in_flight,
+                )
+        export_state.touch(change["values"]["Session ID"] for change in changes)
+
+    def apply_sheet_feedback(self, rows):
+        export_state.touch(row[FEEDBACK_HEADER.index("Session ID")] for row in rows)
+
+
+def _read_session_rows(title, header, session_id, meta=None):
+    """
+    Return the rows of tab `title` that belong to session_id, re-laid out in `header` order.
+    With registry `meta` only the session's row range is read; a stale or missing range
+    falls back to a full read of the tab.
+    """
+    import gspread
+    try:
+        ws = get_worksheet(title)
+    except gspread.exceptions.WorksheetNotFound:
+        return []
+    header_map = get_header_map(title)
+    if "Session ID" not in header_map:
+        return []
+    sid_col = header_map["Session ID"]
+    positions = [header_map.get(name) for name in header]
+    width = max(header_map.values()) + 1
+
+    def pick(values):
+        rows = []
+        for row in values:
+            if sid_col < len(row) and row[sid_col] == session_id:
+                rows.append([row[i] if i is not None and i < len(row) else "" for i in positions])
+        return rows
+
+    if meta and meta.get("first_row"):
+        # Trusted only if the session's rows fill the range exactly (see _load_session_range)
+        values = ws.get(f"A{meta['first_row']}:{gspread.utils.rowcol_to_a1(meta['last_row'] + 1, width)}")
+        size = meta["last_row"] - meta["first_row"] + 1
+        rows = pick(values[:size])
+        if len(rows) == size and not pick(values[size:]):
+            return rows
+    return pick(ws.get_all_values()[1:])
+
+
+# -------------------- Upload Session Excel --------------------
+@at_priority(BACKGROUND)
+def upload_session_from_excel(file_path, session_name, session_date, progress=None):
+    """
+    Upload a session roster (.xlsx or .csv) into Master_Attendance.
+    progress(rows_done, rows_total) is called after each chunk is stored.
+    """
+    # pandas is only needed here (admin uploads); check-in workers never import it
+    from utils.ingest import read_roster, normalize_roster, build_roster_rows
+
+    # ✅ Read and clean the roster (vectorized; duplicate emails dropped)
+    df, stats = normalize_roster(read_roster(file_path))
 
     # ✅ Generate unique Session ID (avoid conflicts)
     rand_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
     session_id = f"{session_name.strip().replace(' ', '_')}_{session_date}_{rand_suffix}"
 
-    # ✅ Add session details automatically
-    df.insert(0, "Session Date", session_date)
-    df.insert(0, "Session Name", session_name)
-    df.insert(0, "Session ID", session_id)
-    df["Attendance"] = ""
-    df["Timestamp"] = ""
+    # ✅ Lay rows out in Master_Attendance column order with the session details filled in
+    rows = build_roster_rows(df, session_id, session_name, session_date)
+
+    # ✅ Store the roster in chunks (Master_Attendance, or the local DB when SQLite is primary)
+    count = get_storage().upload_roster(session_id, ATTENDANCE_HEADER, rows, progress=progress)
 
-    # ✅ Append data into Master_Attendance
-    ws.append_rows(df.values.tolist())
+    # Form pages for the new session render from the registry straight away
+    session_registry.put(session_id, session_name=session_name, session_date=session_date, status="open")
 
-    print(f"✅ Uploaded {len(df)} employees to Master_Attendance ({session_id})")
+    print(f"✅ Uploaded {count} employees to Master_Attendance ({session_id}); "
+          f"skipped {stats['blank_emails']} blank and {stats['duplicate_emails']} duplicate email(s)")
     return session_id
 
 
-# -------------------- Mark Attendance --------------------
-# -------------------- Mark Attendance (for QR scan/morning check-in) --------------------
 # -------------------- Mark Attendance (for QR scan/morning check-in) --------------------
 def mark_present(session_id, email):
     """Mark 'Present' for given email in Master_Attendance if record exists and not marked."""
-    client = get_gsheet_client()
-    sh = client.open_by_key(SPREADSHEET_ID)
-    
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     try:
-        ws = sh.worksheet("Master_Attendance")
-    except gspread.exceptions.WorksheetNotFound:
-        print("Master_Attendance sheet not found.")
+        result = get_storage().mark(session_id, email, timestamp)
+    except SheetsBusy:
+        # Accept and queue rather than failing the check-in during a rush
+        _defer_mark(session_id, email, timestamp)
+        return True
+
+    if result == NOT_ON_ROSTER:
+        print(f"❌ Email '{email}' not found for Session ID '{session_id}' in attendance list.")
         return False
 
-    # 1. Get header row to find column indices dynamically
-    header = ws.row_values(1) # This returns a list of values from row 1 (the headers)
-    
+    if result == ALREADY_PRESENT:
+        print(f"ℹ️ Attendance already marked for: {email}")
+        return True # Already present, no need to update
+
+    print(f"✅ Attendance marked for: {email}")
+    return True
+
+
+# ✅ A check-in time recorded on a device or kiosk is kept if it is at most this old
+OFFLINE_MARK_MAX_AGE_HOURS = int(os.getenv("OFFLINE_MARK_MAX_AGE_HOURS", "12"))
+
+
+def checkin_timestamp(when):
+    """
+    Sheet timestamp for a check-in a device or kiosk says happened at `when` (a datetime), or
+    None if that is older than OFFLINE_MARK_MAX_AGE_HOURS or more than 5 minutes ahead.
+    Times slightly ahead (clock skew) are clamped to now.
+    """
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
+    now = datetime.now()
+    if not now - timedelta(hours=OFFLINE_MARK_MAX_AGE_HOURS) <= when <= now + timedelta(minutes=5):
+        return None
+    return min(when, now).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _record_timestamp(value):
+    """checkin_timestamp() of an ISO-format time string ("2030-01-01 09:00:00"), or None."""
+    if not isinstance(value, str):
+        return None
     try:
-        # Find 0-based index of columns and convert to 1-based index for gspread update_cell
-        # Index() returns the 0-based list index, so we add 1 for gspread's 1-based column index.
-        attendance_col = header.index("Attendance") + 1
-        email_col = header.index("Official Email") + 1
-        timestamp_col = header.index("Timestamp") + 1
-        session_id_col = header.index("Session ID") + 1
-    except ValueError as e:
-        # This catches if a column name is not found (e.g., a typo)
-        print(f"Error: Missing column in Master_Attendance sheet: {e}")
-        return False
+        return checkin_timestamp(datetime.fromisoformat(value.strip()))
+    except ValueError:
+        return None
+
+
+def bulk_mark_attendance(records, write_through=False):
+    """
+    Mark a kiosk/scanner batch of {"session_id", "email", "timestamp"?} records.
+    Returns one {"session_id", "email", "result"} per record (result: marked / already_present /
+    not_on_roster / queued / invalid), in input order. A timestamp that does not parse or is
+    out of range (see checkin_timestamp) is replaced by the current time. `write_through` writes
+    the marks to the sheet before returning instead of leaving them to the background flusher.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    valid, results = [], []
+    for record in records:
+        record = record if isinstance(record, dict) else {}
+        session_id, email = record.get("session_id"), record.get("email")
+        session_id = session_id.strip() if isinstance(session_id, str) else ""
+        email = normalize_email(email) if isinstance(email, str) else ""
+        results.append({"session_id": session_id, "email": email, "result": "invalid"})
+        if session_id and email:
+            valid.append((len(results) - 1, {"session_id": session_id, "email": email,
+                                             "timestamp": _record_timestamp(record.get("timestamp")) or now}))
+
+    outcomes = get_storage().mark_many([r for _, r in valid], write_through=write_through) if valid else []
+    for (i, _), outcome in zip(valid, outcomes):
+        results[i]["result"] = outcome
+    counts = {}
+    for r in results:
+        counts[r["result"]] = counts.get(r["result"], 0) + 1
+    print(f"✅ Bulk mark of {len(records)} record(s): {counts}")
+    return results
+
 
-    # 2. Get all row values for comparison
-    # We use get_all_values() to get rows as lists, which is better for direct indexing.
-    all_values = ws.get_all_values() 
-    
-    # Iterate over rows starting from the second row (index 1 in all_values list)
-    # The actual GSheet row number (i) starts at 2 (since header is row 1)
-    for i, row in enumerate(all_values[1:], start=2): 
-        
-        # Check Session ID and Email
-        # We use the 0-based list index here: [col_index - 1]
-        session_match = row[session_id_col - 1] == session_id 
-        email_match = row[email_col - 1].strip().lower() == email.strip().lower()
-        
-        if session_match and email_match:
-            
-            # Check current attendance status using 0-based list index
-            current_status = row[attendance_col - 1].strip().lower()
-            
-            if current_status == "present":
-                print(f"ℹ️ Attendance already marked for: {email}")
-                return True # Already present, no need to update
-
-            # 3. Mark Present and Timestamp (using 1-based column index)
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Update Attendance column
-            ws.update_cell(i, attendance_col, "Present") 
-            
-            # Update Timestamp column
-            ws.update_cell(i, timestamp_col, timestamp)
-            
-            print(f"✅ Attendance marked for: {email} (Row {i})")
-            return True
-            
-    print(f"❌ Email '{email}' not found for Session ID '{session_id}' in attendance list.")
-    return False
 def check_email_exists_for_feedback(session_id, email):
     """Checks if the email exists on the Master_Attendance list for the given session."""
-    client = get_gsheet_client()
-    sh = client.open_by_key(SPREADSHEET_ID)
-    try:
-        ws = sh.worksheet("Master_Attendance")
-    except gspread.exceptions.WorksheetNotFound:
-        return False # Treat as not found if sheet is missing
+    return lookup_attendance(session_id, email) is not None
 
-    header = ws.row_values(1)
-    
-    try:
-        email_col = header.index("Official Email") + 1
-        session_id_col = header.index("Session ID") + 1
-    except ValueError:
-        print("Error: Missing required columns for email check.")
-        return False
-        
-    all_values = ws.get_all_values()
-    
-    for row in all_values[1:]: # Start from row 2
-        # Check if the record matches Session ID and Email
-        if (row[session_id_col - 1] == session_id and
-            row[email_col - 1].strip().lower() == email.strip().lower()):
-            
-            return True # Email found!
 
-    return False # Email not found
+def lookup_attendance(session_id, email):
+    """Return the roster entry {"row", "status"} for (session_id, email), or None if not listed."""
+    return get_storage().lookup(session_id, email)
 
 # -------------------- Mark Attendance (for Feedback check-in) --------------------
-def check_and_mark_attendance_from_feedback(session_id, email, name, phone, session_name, session_date):
+def check_and_mark_attendance_from_feedback(session_id, email, name, phone, session_name, session_date, entry=None):
     """
     Checks Master_Attendance:
     1. If Email is found AND Attendance is empty, mark 'Present'.
@@ -158,91 +1022,39 @@ def check_and_mark_attendance_from_feedback(session_id, email, name, phone, sess
     3. If Email is NOT found, you mentioned: 'new row (rare case)' in app.py logic, but that
        is usually only if the email wasn't in the original uploaded list. For safety, 
        we will stick to updating ONLY employees in the original list.
+    `entry` is the roster entry resolved by /validate_email (carried in its signed token);
+    when given, the second lookup is skipped. It is only a hint: the row written is always
+    resolved from the roster index, and an unresolvable one is queued as unverified.
     """
-    client = get_gsheet_client()
-    sh = client.open_by_key(SPREADSHEET_ID)
+    storage = get_storage()
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    marked = False
     try:
-        ws = sh.worksheet("Master_Attendance")
-    except gspread.exceptions.WorksheetNotFound:
-        return {'marked_now': False, 'status': 'Sheet not found'}
+        if entry is None:
+            entry = storage.lookup(session_id, email)
+        if entry is not None and entry["status"] == "":
+            marked = storage.mark(session_id, email, timestamp, entry=entry) in (MARKED, QUEUED)
+    except SheetsBusy:
+        _defer_mark(session_id, email, timestamp)
+        return {'marked_now': True, 'status': 'Queued'}
 
-    header = ws.row_values(1)
-    
-    # Safely get column indices
-    try:
-        attendance_col = header.index("Attendance") + 1
-        email_col = header.index("Official Email") + 1
-        timestamp_col = header.index("Timestamp") + 1
-        session_id_col = header.index("Session ID") + 1
-    except ValueError:
-        print("Error: Missing required columns in Master_Attendance sheet.")
-        return {'marked_now': False, 'status': 'Missing columns'}
-        
-    all_values = ws.get_all_values()
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    for i, row in enumerate(all_values[1:], start=2): # Start from row 2 (index 1 in all_values[1:])
-        
-        # Check if the record matches Session ID and Email
-        if (row[session_id_col - 1] == session_id and
-            row[email_col - 1].strip().lower() == email.strip().lower()):
-            
-            current_status = row[attendance_col - 1].strip()
-            
-            if current_status == "":
-                # Found the row, attendance is EMPTY -> Mark Present!
-                ws.update_cell(i, attendance_col, "Present")
-                ws.update_cell(i, timestamp_col, timestamp)
+    if entry is not None:
+        if entry["status"] == "":
+            # Found the row, attendance is EMPTY -> Mark Present!
+            if marked:
                 print(f"✅ Attendance marked late via feedback for: {email}")
                 return {'marked_now': True, 'status': 'Marked Present'}
-            else:
-                # Found the row, attendance is ALREADY MARKED -> Do nothing
-                print(f"ℹ️ Attendance already marked for: {email}")
-                return {'marked_now': False, 'status': 'Already Present'}
-            print(f"❌ Email '{email}' not found on the master attendance list for Session ID '{session_id}'.")
-    
+        # Found the row, attendance is ALREADY MARKED -> Do nothing
+        print(f"ℹ️ Attendance already marked for: {email}")
+        return {'marked_now': False, 'status': 'Already Present'}
+
+    print(f"❌ Email '{email}' not found on the master attendance list for Session ID '{session_id}'.")
     # Return a specific error status for app.py to handle (STRICT VALIDATION)
     return {'marked_now': False, 'status': 'Email not on master list'}
 
-    # If loop finishes, email was not on the original list for this session
-    # Based on your request, we should not add a new row here as the initial 
-    # list is loaded from Excel. The logic in app.py has a 'rare case' to append,
-    # but the goal is to only mark attendance for people *expected* to attend.
-    # To satisfy the "Not found -> new row" part of your app.py logic, 
-    # we'll add the new row here.
-    
-    # New row for a person not on the original list but giving feedback
-    new_row = [
-        session_id, session_name, session_date,
-        "",  # Employee Code
-        name,
-        email,
-        "",  # Business
-        "Present",
-        timestamp
-    ]
-    ws.append_row(new_row, value_input_option="USER_ENTERED")
-    print(f"⚠️ New employee added and marked present via feedback: {email}")
-    return {'marked_now': True, 'status': 'New Entry Marked Present'}
-
-
 # -------------------- Append Feedback --------------------
 def append_feedback(session_id, session_name, session_date, data):
-    """Append feedback row into Master_Feedback"""
-    client = get_gsheet_client()
-    sh = client.open_by_key(SPREADSHEET_ID)
-
-    # ✅ Try to open Master_Feedback tab
-    try:
-        ws = sh.worksheet("Master_Feedback")
-    except gspread.exceptions.WorksheetNotFound:
-        ws = sh.add_worksheet(title="Master_Feedback", rows="100", cols="20")
-        ws.append_row([
-            "Timestamp", "Session ID", "Session Name", "Session Date",
-            "Employee Name", "Email", "Phone",
-            "Q1", "Q2", "Q3", "Q4", "Q5", "Q6", "Q7", "Q8", "Q9", "Q10"
-        ])
-
+    """Store a feedback row (Master_Feedback is written by the background flusher)"""
     # ✅ Build feedback row
     row = [
         datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -254,5 +1066,5 @@ def append_feedback(session_id, session_name, session_date, data):
     for i in range(1, 11):
         row.append(data.get(f"Q{i}", ""))
 
-    ws.append_row(row)
-    print(f"✅ Feedback added for {session_name} ({session_id})")
+    get_storage().append_feedback(row)
+    print(f"✅ Feedback queued for {session_name} ({session_id})")
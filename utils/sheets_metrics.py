@@ -0,0 +1,220 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# ✅ Latency histogram buckets (seconds) for individual Sheets API calls and per-request I/O
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# ✅ Buckets for "Sheets calls made while serving one request"
+CALLS_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 5, 10, 25)
+
+# gspread methods that hit the network; everything else on a handle passes straight through
+TRACED_OPS = {
+    "open_by_key", "worksheet", "add_worksheet", "row_values", "get_all_values", "get", "batch_get",
+    "append_row", "append_rows", "update_cell", "batch_update",
+}
+# Calls that return another handle worth tracing (spreadsheet / worksheet)
+_HANDLE_OPS = {"open_by_key", "worksheet", "add_worksheet"}
+
+
+# -------------------- Metric Primitives --------------------
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+def _labels(**labels):
+    return ",".join(f'{k}="{v}"' for k, v in labels.items())
+
+
+class SheetsMetrics:
+    """Process-wide counters and histograms for Sheets API calls and the requests that made them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}              # (op, worksheet, outcome) -> count
+        self.latency = {}            # (op, worksheet) -> _Histogram
+        self.rate_limited = {}       # (op, worksheet) -> 429 count
+        self.retries = {}            # source -> count
+        self.request_calls = {}      # route -> _Histogram of Sheets calls per request
+        self.request_io = {}         # route -> _Histogram of Sheets seconds per request
+        self.request_duration = {}   # route -> _Histogram of total seconds per request
+
+    def record_call(self, op, worksheet, seconds, outcome):
+        with self._lock:
+            key = (op, worksheet, outcome)
+            self.calls[key] = self.calls.get(key, 0) + 1
+            hist = self.latency.get((op, worksheet))
+            if hist is None:
+                hist = self.latency[(op, worksheet)] = _Histogram(LATENCY_BUCKETS)
+            hist.observe(seconds)
+            if outcome == "429":
+                self.rate_limited[(op, worksheet)] = self.rate_limited.get((op, worksheet), 0) + 1
+
+    def record_retry(self, source):
+        with self._lock:
+            self.retries[source] = self.retries.get(source, 0) + 1
+
+    def record_request(self, route, calls, io_seconds, duration):
+        with self._lock:
+            for table, buckets, value in (
+                (self.request_calls, CALLS_PER_REQUEST_BUCKETS, calls),
+                (self.request_io, LATENCY_BUCKETS, io_seconds),
+                (self.request_duration, LATENCY_BUCKETS, duration),
+            ):
+                hist = table.get(route)
+                if hist is None:
+                    hist = table[route] = _Histogram(buckets)
+                hist.observe(value)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+
+        def counter(name, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in samples:
+                lines.append(f"{name}{{{labels}}} {value}")
+
+        def histogram(name, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in samples:
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f"{name}_sum{{{labels}}} {round(hist.total, 6)}")
+                lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+        with self._lock:
+            counter("sheets_api_calls_total", "Sheets API calls by operation, worksheet and outcome.",
+                    [(_labels(op=op, worksheet=ws, outcome=outcome), n)
+                     for (op, ws, outcome), n in sorted(self.calls.items())])
+            histogram("sheets_api_call_seconds", "Sheets API call latency.",
+                      [(_labels(op=op, worksheet=ws), h) for (op, ws), h in sorted(self.latency.items())])
+            counter("sheets_api_rate_limited_total", "Sheets API calls rejected with 429.",
+                    [(_labels(op=op, worksheet=ws), n) for (op, ws), n in sorted(self.rate_limited.items())])
+            counter("sheets_api_retries_total", "Sheets writes scheduled for retry after a failure.",
+                    [(_labels(source=source), n) for source, n in sorted(self.retries.items())])
+            histogram("http_request_sheets_calls", "Sheets API calls made while serving one request.",
+                      [(_labels(route=r), h) for r, h in sorted(self.request_calls.items())])
+            histogram("http_request_sheets_seconds", "Time spent in Sheets API calls per request.",
+                      [(_labels(route=r), h) for r, h in sorted(self.request_io.items())])
+            histogram("http_request_duration_seconds", "Total request handling time.",
+                      [(_labels(route=r), h) for r, h in sorted(self.request_duration.items())])
+        return "\n".join(lines) + "\n"
+
+
+sheets_metrics = SheetsMetrics()
+
+# Per-request tally: {"calls": int, "seconds": float, "started": float}; None outside a request
+_request_tally = contextvars.ContextVar("sheets_request_tally", default=None)
+
+
+# -------------------- Call Timing --------------------
+@contextmanager
+def sheets_call(op, worksheet="-"):
+    """Time one Sheets API call and record it globally and against the current request."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception as e:
+        # gspread's APIError carries the HTTP status as .code (gspread itself is not imported here)
+        outcome = "429" if getattr(e, "code", None) == 429 else "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        sheets_metrics.record_call(op, worksheet, seconds, outcome)
+        tally = _request_tally.get()
+        if tally is not None:
+            tally["calls"] += 1
+            tally["seconds"] += seconds
+
+
+def record_retry(source):
+    sheets_metrics.record_retry(source)
+
+
+def render_counter(name, help_text, samples):
+    """Format running totals [(labels dict, value)] as a Prometheus counter."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    lines += [f"{name}{{{_labels(**labels)}}} {value}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+
+def render_gauge(name, help_text, samples):
+    """Format point-in-time values [(labels dict, value)] as a Prometheus gauge."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines += [f"{name}{{{_labels(**labels)}}} {value}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+
+class TracedHandle:
+    """
+    Wraps a gspread client / spreadsheet / worksheet so every network method in TRACED_OPS
+    is timed. Handles returned by open_by_key / worksheet / add_worksheet are wrapped too,
+    labelled with their worksheet title.
+    `guard(op, attempt)`, if given, decides how each call runs (rate limiting, retries);
+    it must call `attempt()`, which performs and times a single try.
+    """
+
+    def __init__(self, target, worksheet="-", guard=None):
+        self._target = target
+        self._worksheet = worksheet
+        self._guard = guard
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name not in TRACED_OPS or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            # spreadsheet.worksheet(title) is labelled with the tab it looks up
+            label = str(args[0]) if name == "worksheet" and args else self._worksheet
+
+            def attempt():
+                with sheets_call(name, label):
+                    return attr(*args, **kwargs)
+
+            result = self._guard(name, attempt) if self._guard else attempt()
+            if name in _HANDLE_OPS:
+                title = getattr(result, "title", "-") if name != "open_by_key" else "-"
+                return TracedHandle(result, title, self._guard)
+            return result
+
+        return call
+
+
+def traced(target, worksheet="-", guard=None):
+    """Return `target` wrapped for Sheets call timing (no-op if already wrapped)."""
+    if target is None or isinstance(target, TracedHandle):
+        return target
+    return TracedHandle(target, worksheet, guard)
+
+
+# -------------------- Per-Request Summary --------------------
+def begin_request():
+    _request_tally.set({"calls": 0, "seconds": 0.0, "started": time.perf_counter()})
+
+
+def end_request(route):
+    """Close the current request's tally, record it under `route`, and return the summary."""
+    tally = _request_tally.get()
+    if tally is None:
+        return None
+    _request_tally.set(None)
+    duration = time.perf_counter() - tally["started"]
+    sheets_metrics.record_request(route, tally["calls"], tally["seconds"], duration)
+    return {"calls": tally["calls"], "sheets_seconds": tally["seconds"], "duration": duration}
@@ -0,0 +1,30 @@
+import os
+import sqlite3
+import threading
+
+
+# -------------------- Per-Thread SQLite Connections --------------------
+class ThreadLocalSQLite:
+    """
+    One connection per thread (and per process after fork) to a WAL-mode SQLite file, so
+    every gunicorn worker and request thread can share the file without sharing a connection.
+    `schema` runs on each new connection; extra keyword arguments go to sqlite3.connect
+    (e.g. isolation_level=None for explicit BEGIN/COMMIT).
+    """
+
+    def __init__(self, path, schema, **connect_kwargs):
+        self.path = path
+        self.schema = schema
+        self.connect_kwargs = connect_kwargs
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, **self.connect_kwargs)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.schema)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
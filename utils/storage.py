@@ -0,0 +1,348 @@
+import hashlib
+import os
+import threading
+
+from utils.roster_index import normalize_email
+from utils.sqlite_local import ThreadLocalSQLite
+
+# ✅ Which store serves check-in: "sheets" (Google Sheets is primary) or "sqlite" (local DB is
+# primary and Google Sheets becomes an asynchronous export target)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sheets").strip().lower()
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "attendance.db")
+# Set SHEETS_EXPORT=0 to run the SQLite backend fully offline (e.g. load tests)
+SHEETS_EXPORT = os.getenv("SHEETS_EXPORT", "1") == "1"
+# ✅ Rows per append call when storing a roster (keeps each Sheets request well under size limits)
+ROSTER_CHUNK_ROWS = int(os.getenv("ROSTER_CHUNK_ROWS", "2000"))
+
+# ✅ Column contract shared by every backend (Master_Attendance / Master_Feedback tabs)
+ATTENDANCE_HEADER = [
+    "Session ID", "Session Name", "Session Date",
+    "Employee Code", "Employee Name", "Official Email", "Business",
+    "Attendance", "Timestamp"
+]
+FEEDBACK_HEADER = [
+    "Timestamp", "Session ID", "Session Name", "Session Date",
+    "Employee Name", "Email", "Phone",
+    "Q1", "Q2", "Q3", "Q4", "Q5", "Q6", "Q7", "Q8", "Q9", "Q10"
+]
+
+# Results of StorageBackend.mark()
+MARKED = "marked"
+ALREADY_PRESENT = "already_present"
+NOT_ON_ROSTER = "not_on_roster"
+# Accepted unverified while Sheets was over quota; checked against the roster when flushed
+QUEUED = "queued"
+
+
+def rows_fingerprint(*tables):
+    """Short hash of every row in `tables` (iterables of rows); equal hashes mean equal content."""
+    digest = hashlib.blake2b(digest_size=10)
+    for rows in tables:
+        for row in rows:
+            digest.update("\x1f".join("" if v is None else str(v) for v in row).encode())
+            digest.update(b"\x1e")
+        digest.update(b"\x1d")
+    return digest.hexdigest()
+
+
+def iter_chunks(rows, size=ROSTER_CHUNK_ROWS):
+    """Yield consecutive slices of `rows` of at most `size` items."""
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+# -------------------- Storage Interface --------------------
+class StorageBackend:
+    """
+    Data access used by the routes: roster upload, lookup, mark, feedback append and export.
+    Rows are plain lists in ATTENDANCE_HEADER / FEEDBACK_HEADER order.
+    """
+
+    name = "base"
+
+    def upload_roster(self, session_id, header, rows, progress=None):
+        """
+        Store roster `rows` (columns named by `header`) for a new session in chunks of
+        ROSTER_CHUNK_ROWS, calling progress(rows_done, rows_total) after each; returns the row count.
+        """
+        raise NotImplementedError
+
+    def lookup(self, session_id, email):
+        """Return {"row": ..., "status": <Attendance value>} for (session_id, email), or None."""
+        raise NotImplementedError
+
+    def mark(self, session_id, email, timestamp, entry=None):
+        """
+        Mark (session_id, email) Present; returns MARKED, ALREADY_PRESENT or NOT_ON_ROSTER.
+        `entry` is a lookup() result the caller already holds (e.g. from a signed token);
+        backends where a lookup costs a round-trip may use it instead of looking up again.
+        """
+        raise NotImplementedError
+
+    def mark_many(self, records, write_through=False):
+        """
+        Mark a batch of {"session_id", "email", "timestamp"} records; returns one result
+        (MARKED / ALREADY_PRESENT / NOT_ON_ROSTER) per record, in order. With `write_through`,
+        backends that write behind push the batch out before returning.
+        """
+        return [self.mark(r["session_id"], r["email"], r["timestamp"]) for r in records]
+
+    def append_feedback(self, row):
+        """Store one feedback row (FEEDBACK_HEADER order)."""
+        raise NotImplementedError
+
+    def describe_session(self, session_id):
+        """Return {"session_name", "session_date"} for a stored session, or None if there is none."""
+        raise NotImplementedError
+
+    def export_version(self, session_id):
+        """
+        Return the version export_tables() would report for session_id if that is known without
+        reading the store (e.g. nothing changed since the last export), else None.
+        """
+        return None
+
+    def export_tables(self, session_id):
+        """
+        Return (version, {"attendance": rows, "feedback": rows}) for one session. `version`
+        fingerprints the session's current content; each rows value is an iterable starting
+        with the header (ATTENDANCE_HEADER / FEEDBACK_HEADER) that backends may read lazily,
+        so a caller holding a copy of this version can skip reading them at all.
+        """
+        raise NotImplementedError
+
+    def export(self, session_id):
+        """Return {"attendance": [rows], "feedback": [rows]} for one session, header rows first."""
+        _, tables = self.export_tables(session_id)
+        return {name: [list(r) for r in rows] for name, rows in tables.items()}
+
+    def apply_sheet_attendance(self, changes, in_flight):
+        """
+        Fold Master_Attendance rows the delta sync saw appear or change into local state.
+        changes: [{"row": sheet row, "values": {ATTENDANCE_HEADER name: value}}] (values may be
+        partial but always carry Session ID and Official Email).
+        in_flight: {(session_id, normalized email)} marks still queued for the sheet; for those
+        the local Attendance/Timestamp win, otherwise the sheet does.
+        """
+        raise NotImplementedError
+
+    def apply_sheet_feedback(self, rows):
+        """Fold Master_Feedback rows appended on the sheet (FEEDBACK_HEADER order) into local state."""
+        raise NotImplementedError
+
+
+# -------------------- SQLite Backend --------------------
+# SQLite column for each Master_Attendance / Master_Feedback header
+_ATTENDANCE_COLUMNS = [
+    "session_id", "session_name", "session_date",
+    "employee_code", "employee_name", "official_email", "business",
+    "attendance", "timestamp"
+]
+_FEEDBACK_COLUMNS = [
+    "timestamp", "session_id", "session_name", "session_date",
+    "employee_name", "email", "phone",
+    "q1", "q2", "q3", "q4", "q5", "q6", "q7", "q8", "q9", "q10"
+]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS attendance (
+    {", ".join(f"{c} TEXT NOT NULL DEFAULT ''" for c in _ATTENDANCE_COLUMNS)},
+    email_key TEXT NOT NULL,
+    PRIMARY KEY (session_id, email_key)
+);
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    {", ".join(f"{c} TEXT NOT NULL DEFAULT ''" for c in _FEEDBACK_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS feedback_session ON feedback (session_id);
+"""
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Local SQLite store, keyed on (session_id, normalized email).
+    If an `exporter` queue is given, every change is also journaled for Google Sheets
+    ({"op": "roster" | "mark" | "feedback", ...}) and written there in the background.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_DB_PATH, exporter=None):
+        self.path = path
+        self.exporter = exporter
+        # WAL lets readers run alongside writers
+        self._conns = ThreadLocalSQLite(path, _SCHEMA)
+
+    def _db(self):
+        return self._conns.connection()
+
+    def _export(self, item):
+        if self.exporter is not None:
+            self.exporter.enqueue(item)
+
+    def upload_roster(self, session_id, header, rows, progress=None):
+        positions = {name: i for i, name in reversed(list(enumerate(header)))}
+
+        def value(row, name):
+            i = positions.get(name)
+            return "" if i is None or i >= len(row) or row[i] is None else str(row[i])
+
+        db = self._db()
+        done = 0
+        for chunk in iter_chunks(rows):
+            records = []
+            for row in chunk:
+                values = [value(row, name) for name in ATTENDANCE_HEADER]
+                values[0] = session_id
+                records.append(values + [normalize_email(values[5])])
+            with db:
+                # Duplicate emails within a roster: first one wins, like the sheet lookup
+                db.executemany(
+                    f"INSERT OR IGNORE INTO attendance ({', '.join(_ATTENDANCE_COLUMNS)}, email_key)"
+                    f" VALUES ({', '.join('?' * (len(_ATTENDANCE_COLUMNS) + 1))})",
+                    records,
+                )
+            self._export({"op": "roster", "rows": chunk})
+            done += len(chunk)
+            if progress:
+                progress(done, len(rows))
+        return len(rows)
+
+    def lookup(self, session_id, email):
+        found = self._db().execute(
+            "SELECT rowid, attendance FROM attendance WHERE session_id = ? AND email_key = ?",
+            (session_id, normalize_email(email)),
+        ).fetchone()
+        return {"row": found[0], "status": found[1].strip()} if found else None
+
+    def mark(self, session_id, email, timestamp, entry=None):
+        db = self._db()
+        with db:
+            # Single conditional UPDATE: concurrent workers cannot both mark the same person
+            updated = db.execute(
+                "UPDATE attendance SET attendance = 'Present', timestamp = ?"
+                " WHERE session_id = ? AND email_key = ? AND lower(trim(attendance)) != 'present'",
+                (timestamp, session_id, normalize_email(email)),
+            ).rowcount
+        if updated:
+            self._export({"op": "mark", "session_id": session_id,
+                          "email": normalize_email(email), "timestamp": timestamp})
+            return MARKED
+        return ALREADY_PRESENT if self.lookup(session_id, email) else NOT_ON_ROSTER
+
+    def append_feedback(self, row):
+        values = [("" if v is None else str(v)) for v in row[:len(_FEEDBACK_COLUMNS)]]
+        values += [""] * (len(_FEEDBACK_COLUMNS) - len(values))
+        db = self._db()
+        with db:
+            db.execute(
+                f"INSERT INTO feedback ({', '.join(_FEEDBACK_COLUMNS)})"
+                f" VALUES ({', '.join('?' * len(_FEEDBACK_COLUMNS))})",
+                values,
+            )
+        self._export({"op": "feedback", "row": row})
+
+    def _iter_session(self, table, columns, header, session_id):
+        """Yield `header`, then the session's rows straight off the cursor (constant memory)."""
+        yield header
+        order = "rowid" if table == "attendance" else "id"
+        yield from self._db().execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE session_id = ? ORDER BY {order}",
+            (session_id,),
+        )
+
+    def describe_session(self, session_id):
+        found = self._db().execute(
+            "SELECT session_name, session_date FROM attendance WHERE session_id = ? LIMIT 1", (session_id,)
+        ).fetchone()
+        return {"session_name": found[0], "session_date": found[1]} if found else None
+
+    def export_tables(self, session_id):
+        def tables():
+            return {
+                "attendance": self._iter_session("attendance", _ATTENDANCE_COLUMNS, ATTENDANCE_HEADER, session_id),
+                "feedback": self._iter_session("feedback", _FEEDBACK_COLUMNS, FEEDBACK_HEADER, session_id),
+            }
+        # One pass to fingerprint; the rows are only read again if the caller needs them
+        version = rows_fingerprint(*tables().values())
+        return version, tables()
+
+    def apply_sheet_attendance(self, changes, in_flight):
+        # Sheet-side changes are not exported back: they came from there
+        db = self._db()
+        columns = dict(zip(ATTENDANCE_HEADER, _ATTENDANCE_COLUMNS))
+        with db:
+            for change in changes:
+                values = change["values"]
+                session_id = values["Session ID"]
+                email_key = normalize_email(values["Official Email"])
+                if not (session_id and email_key):
+                    continue
+                if (session_id, email_key) in in_flight:
+                    values = {k: v for k, v in values.items() if k not in ("Attendance", "Timestamp")}
+                updates = {columns[k]: v for k, v in values.items() if k in columns}
+                exists = db.execute(
+                    "SELECT 1 FROM attendance WHERE session_id = ? AND email_key = ?", (session_id, email_key)
+                ).fetchone()
+                if exists:
+                    db.execute(
+                        f"UPDATE attendance SET {', '.join(f'{c} = ?' for c in updates)}"
+                        " WHERE session_id = ? AND email_key = ?",
+                        list(updates.values()) + [session_id, email_key],
+                    )
+                else:
+                    db.execute(
+                        f"INSERT INTO attendance ({', '.join(updates)}, email_key)"
+                        f" VALUES ({', '.join('?' * (len(updates) + 1))})",
+                        list(updates.values()) + [email_key],
+                    )
+
+    def apply_sheet_feedback(self, rows):
+        db = self._db()
+        with db:
+            for row in rows:
+                values = [("" if v is None else str(v)) for v in row[:len(_FEEDBACK_COLUMNS)]]
+                values += [""] * (len(_FEEDBACK_COLUMNS) - len(values))
+                # Rows this store exported come back on the next sync; keep one copy
+                if db.execute(
+                    "SELECT 1 FROM feedback WHERE timestamp = ? AND session_id = ? AND email = ? LIMIT 1",
+                    (values[0], values[1], values[5]),
+                ).fetchone():
+                    continue
+                db.execute(
+                    f"INSERT INTO feedback ({', '.join(_FEEDBACK_COLUMNS)})"
+                    f" VALUES ({', '.join('?' * len(_FEEDBACK_COLUMNS))})",
+                    values,
+                )
+
+
+# -------------------- Backend Selection --------------------
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Return the process-wide backend selected by STORAGE_BACKEND."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == "sqlite":
+                    exporter = None
+                    if SHEETS_EXPORT:
+                        from utils.sheet_utils import sheets_export_queue
+                        exporter = sheets_export_queue
+                    _storage = SQLiteStorage(SQLITE_DB_PATH, exporter=exporter)
+                elif STORAGE_BACKEND == "sheets":
+                    from utils.sheet_utils import SheetsStorage
+                    _storage = SheetsStorage()
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND!r}")
+    return _storage
+
+
+def set_storage(backend):
+    """Swap the process-wide backend (benchmarks and load tests)."""
+    global _storage
+    with _storage_lock:
+        _storage = backend
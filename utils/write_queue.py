@@ -0,0 +1,288 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from utils.rate_limiter import SheetsBusy, WriteUncertain
+from utils.sheets_metrics import record_retry
+
+# ✅ Local journal shared by every write-behind queue (survives process restarts)
+JOURNAL_PATH = os.getenv("WRITE_JOURNAL_PATH", "write_journal.db")
+
+# A claimed batch whose owner died (worker killed mid-flush) is retried after this many seconds
+CLAIM_LEASE_SECONDS = 60
+
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 60.0
+
+
+def is_retryable(exc):
+    """
+    429 / 5xx from Google, connection errors and local quota back-pressure: worth retrying.
+    An append that failed that way arrives as WriteUncertain instead, which is not retried.
+    """
+    # requests' ConnectionError / Timeout are OSErrors; gspread's APIError carries the status as .code
+    if isinstance(exc, (SheetsBusy, OSError)):
+        return True
+    code = getattr(exc, "code", None)
+    return code == 429 or (isinstance(code, int) and code >= 500)
+
+
+class PartialWrite(Exception):
+    """
+    Raised by a flush_fn that wrote the first `written` items of its batch before the next
+    `failed` items failed with `cause` (the items after those were not attempted).
+    """
+
+    def __init__(self, written, failed, cause):
+        super().__init__(f"{written} item(s) written, then {failed} failed: {cause}")
+        self.written = written
+        self.failed = failed
+        self.cause = cause
+
+
+# -------------------- Journaled Write-Behind Queue --------------------
+class JournaledQueue:
+    """
+    Durable write-behind queue.
+
+    enqueue() commits the payload to a local SQLite journal and returns immediately.
+    A background flusher hands pending payloads to `flush_fn` in batches, every
+    `flush_interval_ms` or as soon as `max_items` are waiting, and deletes them only once
+    `flush_fn` returns. Retryable failures (429 / 5xx / connection errors) keep the batch in
+    the journal and are retried with jittered exponential backoff. Any other failure is
+    narrowed down by bisecting the batch: the items that fail on their own are moved to the
+    `dead_letter` table (see stats()) so they cannot block the queue. An append that may have
+    landed (WriteUncertain) is dead-lettered as a whole, never resent: retrying it could add the
+    rows twice. A flush_fn that writes in several calls raises PartialWrite so the part already
+    written is not written again. Rows are claimed with a lease, so
+    several gunicorn workers can share one journal without writing the same batch twice,
+    and anything left over from a previous process is flushed on the next start.
+    """
+
+    def __init__(self, name, flush_fn, flush_interval_ms=1000, max_items=50, journal_path=JOURNAL_PATH):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_items = max_items
+        self.journal_path = journal_path
+        self._lock = threading.Lock()         # guards the SQLite connection
+        self._flush_lock = threading.Lock()   # one flush at a time per process
+        self._wake = threading.Event()
+        self._conn = None
+        self._conn_pid = None
+        self._thread = None
+        self._pid = None
+        self._failures = 0
+        self._unflushed = 0
+        self._last_flush_seconds = None
+        self._last_flush_items = 0
+        self._last_flush_at = None
+        self._flushed_total = 0
+
+    # ---- journal ----
+    def _db(self):
+        if self._conn is None or self._conn_pid != os.getpid():
+            # Never reuse a connection inherited across fork()
+            self._conn = sqlite3.connect(self.journal_path, timeout=30, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS journal ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " queue TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " claimed_by TEXT,"
+                " claimed_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS journal_queue_id ON journal (queue, id)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letter ("
+                " id INTEGER PRIMARY KEY,"
+                " queue TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " failed_at REAL NOT NULL,"
+                " error TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def enqueue(self, payload):
+        """Durably journal `payload` (a JSON-serializable dict) and schedule it for flushing."""
+        self.enqueue_many([payload])
+
+    def enqueue_many(self, payloads):
+        rows = [(self.name, json.dumps(p), time.time()) for p in payloads]
+        with self._lock:
+            db = self._db()
+            db.executemany("INSERT INTO journal (queue, payload, created) VALUES (?, ?, ?)", rows)
+            db.commit()
+            self._unflushed += len(rows)
+            wake = self._unflushed >= self.max_items
+        self.ensure_started()
+        if wake:
+            self._wake.set()
+
+    def pending(self):
+        """Number of journaled items not yet written."""
+        with self._lock:
+            return self._db().execute(
+                "SELECT COUNT(*) FROM journal WHERE queue = ?", (self.name,)
+            ).fetchone()[0]
+
+    def dead_letters(self):
+        """Items that failed with a non-retryable error: [{"id", "payload", "failed_at", "error"}]."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT id, payload, failed_at, error FROM dead_letter WHERE queue = ? ORDER BY id", (self.name,)
+            ).fetchall()
+        return [{"id": row_id, "payload": json.loads(payload), "failed_at": failed_at, "error": error}
+                for row_id, payload, failed_at, error in rows]
+
+    def pending_items(self):
+        """Payloads journaled but not yet written (including batches being flushed right now)."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT payload FROM journal WHERE queue = ? ORDER BY id", (self.name,)
+            ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def _claim(self, limit=None):
+        token = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "UPDATE journal SET claimed_by = ?, claimed_at = ? WHERE id IN ("
+                " SELECT id FROM journal WHERE queue = ?"
+                " AND (claimed_by IS NULL OR claimed_at < ?)"
+                " ORDER BY id LIMIT ?)",
+                (token, now, self.name, now - CLAIM_LEASE_SECONDS, limit or self.max_items),
+            )
+            db.commit()
+            return db.execute(
+                "SELECT id, payload FROM journal WHERE claimed_by = ? ORDER BY id", (token,)
+            ).fetchall()
+
+    def _finish(self, batch, done):
+        ids = [(row_id,) for row_id, _ in batch]
+        with self._lock:
+            db = self._db()
+            if done:
+                db.executemany("DELETE FROM journal WHERE id = ?", ids)
+            else:
+                db.executemany("UPDATE journal SET claimed_by = NULL, claimed_at = NULL WHERE id = ?", ids)
+            db.commit()
+
+    def _dead_letter(self, batch, error):
+        ids = [(time.time(), str(error)[:1000], row_id) for row_id, _ in batch]
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                "INSERT INTO dead_letter (id, queue, payload, created, failed_at, error)"
+                " SELECT id, queue, payload, created, ?, ? FROM journal WHERE id = ?", ids
+            )
+            db.executemany("DELETE FROM journal WHERE id = ?", [(row_id,) for _, _, row_id in ids])
+            db.commit()
+        print(f"❌ {self.name}: moved {len(batch)} item(s) to the dead-letter table ({error})")
+
+    def _write(self, batch):
+        """
+        Hand `batch` to flush_fn and delete what was written. A non-retryable failure is
+        bisected until the failing items are alone, and those are dead-lettered.
+        Returns the number of items written; raises the first retryable failure.
+        """
+        try:
+            self.flush_fn([json.loads(payload) for _, payload in batch])
+        except Exception as e:
+            written, failed, error = (e.written, e.failed, e.cause) if isinstance(e, PartialWrite) else (0, len(batch), e)
+            if written:
+                self._finish(batch[:written], done=True)
+            if is_retryable(error):
+                raise error
+            failing, rest = batch[written:written + failed], batch[written + failed:]
+            if isinstance(error, WriteUncertain):
+                self._dead_letter(failing, f"{error} (check the sheet before replaying)")
+            elif len(failing) == 1:
+                self._dead_letter(failing, error)
+            else:
+                mid = len(failing) // 2
+                # In journal order, so e.g. a roster export still lands before its marks
+                written += self._write(failing[:mid]) + self._write(failing[mid:])
+            return written + (self._write(rest) if rest else 0)
+        self._finish(batch, done=True)
+        return len(batch)
+
+    # ---- flushing ----
+    def flush(self, max_items=None):
+        """
+        Write pending items batch by batch (of `max_items`, default the queue's own size).
+        Returns False if a batch failed and was kept.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._unflushed = 0
+            while True:
+                batch = self._claim(max_items)
+                if not batch:
+                    return True
+                started = time.perf_counter()
+                try:
+                    written = self._write(batch)
+                except Exception as e:
+                    # Whatever part of the batch is still journaled is released for the retry
+                    self._finish(batch, done=False)
+                    self._failures += 1
+                    record_retry(self.name)
+                    print(f"⚠️ {self.name}: flush of {len(batch)} item(s) failed ({e}); will retry")
+                    return False
+                self._failures = 0
+                self._last_flush_seconds = time.perf_counter() - started
+                self._last_flush_items = written
+                self._last_flush_at = time.time()
+                self._flushed_total += written
+
+    def stats(self):
+        """Queue depth, dead letters and flush health, for the admin status endpoint."""
+        with self._lock:
+            dead = self._db().execute(
+                "SELECT COUNT(*), MAX(failed_at) FROM dead_letter WHERE queue = ?", (self.name,)
+            ).fetchone()
+        return {
+            "queue": self.name,
+            "depth": self.pending(),
+            "dead_letters": dead[0],
+            "last_dead_letter_at": dead[1],
+            "last_flush_seconds": self._last_flush_seconds,
+            "last_flush_items": self._last_flush_items,
+            "last_flush_at": self._last_flush_at,
+            "flushed_total": self._flushed_total,
+            "consecutive_failures": self._failures,
+        }
+
+    def _retry_delay(self):
+        delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** (self._failures - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if not self.flush():
+                # Back off before touching the API again (quota errors need breathing room)
+                time.sleep(self._retry_delay())
+
+    def ensure_started(self):
+        """Start the background flusher in this process (again after a fork)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-flusher", daemon=True)
+            self._thread.start()